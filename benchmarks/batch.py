@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+"""Compares rendering a batch of contexts with make() called in a loop and with render_many().
+"""
+
+import sys
+import timeit
+
+import muspyche
+
+
+N = (int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
+
+template = '\n'.join([
+    'Dear {{name}},',
+    '',
+    'your invoice #{{invoice.number}} for {{invoice.total}} {{invoice.currency}} is due on {{invoice.due}}.',
+    '{{#invoice.items}}',
+    '  * {{title}}: {{price}}',
+    '{{/invoice.items}}',
+    '{{^paid}}Please pay on time.{{/paid}}',
+    '',
+    '{{company}}',
+    ])
+contexts = [{'name': 'customer #{0}'.format(i),
+             'company': 'Company & Co.',
+             'paid': bool(i % 3),
+             'invoice': {'number': i, 'total': i * 10, 'currency': 'EUR', 'due': '2020-01-01',
+                         'items': [{'title': 'item #{0}'.format(j), 'price': j} for j in range(3)]},
+             } for i in range(N)]
+
+assert [muspyche.api.make(template, context) for context in contexts[:100]] == muspyche.api.render_many(template, contexts[:100])
+
+cases = [
+    ('make() loop', lambda: [muspyche.api.make(template, context) for context in contexts]),
+    ('make(compiled=True) loop', lambda: [muspyche.api.make(template, context, compiled=True) for context in contexts]),
+    ('render_many(compiled=False)', lambda: muspyche.api.render_many(template, contexts, compiled=False)),
+    ('render_many()', lambda: muspyche.api.render_many(template, contexts)),
+    ]
+
+print('contexts: {0}'.format(N))
+baseline = None
+for name, function in cases:
+    took = min(timeit.repeat(function, number=1, repeat=3))
+    baseline = (baseline or took)
+    print('{0:<28} {1:.3f}s  ({2:.2f}x)'.format(name, took, baseline / took))
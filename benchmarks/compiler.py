@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+"""Compares render throughput of tree-walking renderer and compiled templates.
+"""
+
+import sys
+import timeit
+
+import muspyche
+from muspyche.context import ContextStack
+
+
+ROWS = (int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
+
+template = '\n'.join([
+    '<table>',
+    '{{#rows}}',
+    '<tr>',
+    '<td class="id">{{id}}</td>',
+    '<td class="name">{{name}}</td>',
+    '{{#active}}<td class="state">active</td>{{/active}}',
+    '{{^active}}<td class="state">inactive</td>{{/active}}',
+    '</tr>',
+    '{{/rows}}',
+    '</table>',
+    ])
+context = {'rows': [{'id': i, 'name': 'row #{0}'.format(i), 'active': bool(i % 2)} for i in range(ROWS)]}
+
+
+tree = muspyche.parser.parse(template)
+compiled = muspyche.compiler.Template(tree)
+
+assert muspyche.renderer.render(tree, ContextStack(context), []) == compiled.render(ContextStack(context), [])
+
+n = 5
+interpreting = min(timeit.repeat(lambda: muspyche.renderer.render(tree, ContextStack(context), []), number=n, repeat=3)) / n
+compiling = min(timeit.repeat(lambda: compiled.render(ContextStack(context), []), number=n, repeat=3)) / n
+
+print('rows:        {0}'.format(ROWS))
+print('interpreted: {0:.6f}s per render'.format(interpreting))
+print('compiled:    {0:.6f}s per render'.format(compiling))
+print('speedup:     {0:.2f}x'.format(interpreting / compiling))
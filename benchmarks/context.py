@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+
+"""Measures time of single lookups in context stack.
+"""
+
+import sys
+import timeit
+
+from muspyche.context import ContextStack
+
+
+N = (int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
+
+context = {'a': {'b': {'c': {'d': 'value'}}}, 'name': 'value', 'items': [{'x': 1}, {'x': 2}]}
+for i in range(20): context['key{0}'.format(i)] = i
+
+stack = ContextStack(context)
+cases = [
+    ('name', lambda: stack.get('name')),
+    ('a.b.c.d', lambda: stack.get('a.b.c.d')),
+    ('items[1].x', lambda: stack.get('items[1].x')),
+    ('::name', lambda: stack.get('::name')),
+    ]
+
+for name, function in cases:
+    took = min(timeit.repeat(function, number=N, repeat=3)) / N
+    print('get({0}): {1:>10.3f}us'.format(repr(name), took * 1e6))
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+"""Measures time of getting escaped values from context stack: plain and safe strings, numbers,
+memoized escaping and escaping with `str.translate()`.
+"""
+
+import sys
+import timeit
+
+import muspyche
+from muspyche.context import ContextStack
+
+
+N = (int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
+
+text = '<a href="x?a=1&b=2">\'quoted\' text of a link</a>'
+context = {'text': text, 'safe': muspyche.util.SafeString(text), 'number': 123456, 'float': 2.5}
+
+plain = ContextStack(context)
+memoized = ContextStack(context, memo=True)
+translated = ContextStack(context, escape=muspyche.util.translate)
+cases = [
+    ('text', plain),
+    ('text (memo)', memoized),
+    ('text (translate)', translated),
+    ('safe', plain),
+    ('number', plain),
+    ('float', plain),
+    ]
+
+for name, stack in cases:
+    key = name.split()[0]
+    took = min(timeit.repeat(lambda: stack.get(key), number=N, repeat=3)) / N
+    print('get({0}): {1:>10.3f}us'.format(repr(name), took * 1e6))
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+"""Reports memory taken by parsed templates (node trees and flat trees), measured with tracemalloc.
+"""
+
+import gc
+import sys
+import tracemalloc
+
+import muspyche
+
+
+N = (int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
+
+line = '<li class="{{class}}">{{#item}}<a href="{{url}}">{{{name}}}</a>{{/item}}{{^item}}none{{/item}}</li>\n'
+template = line * N
+
+
+def measure(function):
+    """Returns (result of function, bytes allocated by it and still alive).
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = function()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+tree, nodes = measure(lambda: muspyche.parser.parse(template))
+flat, flattened = measure(lambda: muspyche.flat.flatten(tree))
+
+print('lines:         {0}'.format(N))
+print('template:      {0} bytes'.format(len(template)))
+print('nodes:         {0} bytes ({1:.1f} per line)'.format(nodes, nodes / N))
+print('flat tree:     {0} bytes ({1:.1f} per line), {2} nodes, {3} strings'.format(flattened, flattened / N, len(flat), len(flat.table)))
+print('saved:         {0} bytes per template ({1:.1f}x smaller)'.format(nodes - flattened, nodes / flattened))
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+"""Measures throughput of process-pool rendering for growing numbers of workers.
+"""
+
+import os
+import sys
+import time
+
+import muspyche
+
+
+N = (int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
+
+template = '\n'.join([
+    '<h1>{{title}}</h1>',
+    '{{#rows}}',
+    '<tr><td>{{id}}</td><td>{{name}}</td><td>{{#active}}yes{{/active}}{{^active}}no{{/active}}</td></tr>',
+    '{{/rows}}',
+    ])
+contexts = [{'title': 'document #{0}'.format(i),
+             'rows': [{'id': j, 'name': 'row <{0}>'.format(j), 'active': bool(j % 2)} for j in range(20)],
+             } for i in range(N)]
+
+
+def measure(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+print('contexts: {0}, cpus: {1}'.format(N, os.cpu_count()))
+single = measure(lambda: muspyche.api.render_many(template, contexts))
+print('{0:<12} {1:>8.3f}s  {2:>10.0f} docs/s'.format('in-process', single, N / single))
+workers = 1
+while workers <= os.cpu_count():
+    took = measure(lambda: muspyche.parallel.render_many(template, contexts, workers=workers))
+    print('{0:<12} {1:>8.3f}s  {2:>10.0f} docs/s  ({3:.2f}x)'.format('{0} worker(s)'.format(workers), took, N / took, single / took))
+    workers *= 2
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+"""Measures time of parsing (parser.parse()) of spec and atom templates, and of a large synthetic template.
+Spec templates are read from the `spec/` submodule, if it is checked out.
+"""
+
+import glob
+import json
+import os
+import sys
+import timeit
+
+import muspyche
+
+
+root = os.path.normpath(os.path.join(os.path.split(__file__)[0], '..'))
+
+
+def spectemplates():
+    templates = []
+    for path in sorted(glob.glob(os.path.join(root, 'spec', 'specs', '*.json'))):
+        with open(path) as ifstream: spec = json.loads(ifstream.read())
+        templates.extend((test['template'], []) for test in spec['tests'])
+    return templates
+
+def atomtemplates():
+    templates = []
+    for path in sorted(glob.glob(os.path.join(root, 'tests', 'atoms', '*', 'template.mustache'))):
+        templates.append((muspyche.util.read(path), [os.path.dirname(path)]))
+    return templates
+
+def synthetic(lines):
+    chunk = '\n'.join([
+        '<h2>{{title}}</h2>',
+        '{{! listing of items }}',
+        '{{#items}}',
+        '  <li class="{{cls}}">',
+        '    {{#link}}<a href="{{href}}">{{/link}}{{name}}{{#link}}</a>{{/link}}',
+        '    {{^price}}free{{/price}}',
+        '  </li>',
+        '{{/items}}',
+        '',
+        ])
+    return chunk * (lines // chunk.count('\n'))
+
+def measure(templates, number):
+    return min(timeit.repeat(lambda: [muspyche.parser.parse(template, list(lookup)) for template, lookup in templates], number=number, repeat=3)) / number
+
+
+lines = (int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
+specs = spectemplates()
+atoms = atomtemplates()
+if specs: print('spec templates ({0}):  {1:.6f}s'.format(len(specs), measure(specs, 20)))
+else: print('spec templates:       spec/ submodule is not checked out')
+print('atom templates ({0}):   {1:.6f}s'.format(len(atoms), measure(atoms, 200)))
+print('synthetic ({0} lines): {1:.6f}s'.format(lines, measure([(synthetic(lines), [])], 1)))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+"""Compares loading templates from source with loading them from precompiled file.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+import muspyche
+
+
+N = (int(sys.argv[1]) if len(sys.argv) > 1 else 500)
+
+template = '\n'.join([
+    '<h1>{{title}}</h1>',
+    '{{#items}}',
+    '  <div class="item">',
+    '    <a href="{{url}}">{{name}}</a> {{#tags}}<span>{{.}}</span>{{/tags}}',
+    '    {{^tags}}no tags{{/tags}}',
+    '    {{! comment }}',
+    '  </div>',
+    '{{/items}}',
+    '<footer>{{::site.name}} - {{::site.year}}</footer>',
+    ])
+
+directory = tempfile.mkdtemp()
+artifact = os.path.join(directory, 'templates.muspyche')
+try:
+    paths = []
+    for i in range(N):
+        path = os.path.join(directory, 'template{0}.mustache'.format(i))
+        with open(path, 'w') as ofstream: ofstream.write('<!-- {0} -->\n'.format(i) + template * 3)
+        paths.append(path)
+    muspyche.precompiled.write([directory], artifact)
+
+    def fromsource():
+        return [muspyche.compiler.Template(muspyche.parser.parse(muspyche.util.read(path))) for path in paths]
+
+    def fromartifact():
+        loaded = muspyche.precompiled.read(artifact)
+        return [loaded.load(path) for path in paths]
+
+    n = 3
+    source = min(timeit.repeat(fromsource, number=n, repeat=3)) / n
+    precompiled = min(timeit.repeat(fromartifact, number=n, repeat=3)) / n
+    print('templates:     {0}'.format(N))
+    print('from source:   {0:.4f}s'.format(source))
+    print('precompiled:   {0:.4f}s'.format(precompiled))
+    print('speedup:       {0:.2f}x'.format(source / precompiled))
+finally:
+    shutil.rmtree(directory)
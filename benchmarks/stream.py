@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+"""Compares peak memory of rendering to a string and streaming rendered output to a file.
+
+Context is kept small (the same row is repeated) so that peak memory
+is dominated by rendered output.
+"""
+
+import os
+import sys
+import tracemalloc
+
+import muspyche
+
+
+template = '{{#rows}}<tr><td>{{id}}</td><td>{{name}}</td><td>{{text}}</td></tr>\n{{/rows}}'
+row = {'id': 42, 'name': 'row name', 'text': 'x' * 200}
+
+
+def stream(ofstream, context):
+    for chunk in muspyche.api.stream(template, context):
+        ofstream.write(chunk)
+
+
+def peak(function):
+    tracemalloc.start()
+    function()
+    _, top = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return top
+
+
+sizes = ([int(n) for n in sys.argv[1:]] or [1000, 4000, 16000])
+print('{0:>8}  {1:>14}  {2:>14}  {3:>14}'.format('rows', 'make()', 'render_to()', 'stream()'))
+for n in sizes:
+    context = {'rows': [row] * n}
+    with open(os.devnull, 'w') as ofstream:
+        making = peak(lambda: ofstream.write(muspyche.api.make(template, context)))
+        writing = peak(lambda: muspyche.api.render_to(ofstream, template, context))
+        streaming = peak(lambda: stream(ofstream, context))
+    print('{0:>8}  {1:>12.1f}KB  {2:>12.1f}KB  {3:>12.1f}KB'.format(n, making / 1024, writing / 1024, streaming / 1024))
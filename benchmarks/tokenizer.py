@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+"""Measures how time of tokenizing (parser.rawparse()) scales with size of the template.
+Time per kilobyte should stay roughly the same for all sizes, both for templates made of
+many short lines and for minified templates that are a single long line.
+"""
+
+import gc
+import sys
+import time
+
+import muspyche
+
+
+chunk = '\n'.join([
+    '<tr class="{{cls}}">',
+    '    <td>{{#item}}{{name}}{{/item}}</td>',
+    '    <td>{{{html}}} {{&raw}} {{^empty}}-{{/empty}}</td>',
+    '    {{! comment }}{{>row}}',
+    '</tr>',
+    '',
+    ])
+
+sizes = [10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024]
+if '--quick' in sys.argv: sizes = sizes[:3]
+
+# the same markup with newlines removed, as in minified templates
+minified = chunk.replace('\n', '')
+
+print('{0:>10} {1:>12} {2:>12} {3:>10} {4:>14}'.format('lines', 'size', 'nodes', 'seconds', 'us per KB'))
+for name, piece in (('many', chunk), ('single', minified)):
+    for size in sizes:
+        template = piece * (size // len(piece))
+        elapsed = None
+        for _ in range(3):
+            nodes = None
+            gc.collect()
+            start = time.perf_counter()
+            nodes = muspyche.parser.rawparse(template)
+            took = time.perf_counter() - start
+            elapsed = (took if elapsed is None else min(elapsed, took))
+        print('{0:>10} {1:>12} {2:>12} {3:>10.4f} {4:>14.2f}'.format(name, len(template), len(nodes), elapsed, elapsed / (len(template) / 1024) * 1e6))
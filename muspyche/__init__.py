@@ -1,9 +1,18 @@
 from . import util
 from . import context
 from . import models
+from . import resolver
 from . import parser
 from . import renderer
+from . import cache
+from . import compiler
 from . import api
+from . import parallel
+from . import precompiled
+from . import profiler
+from . import flat
+from . import incremental
+from . import watcher
 
 
 __version__ = '0.1.0.6'
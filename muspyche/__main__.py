@@ -0,0 +1,33 @@
+"""Command line interface of Muspyche.
+
+Usage:
+
+    python -m muspyche compile [-o OUTPUT] [--suffix SUFFIX] DIRECTORY...
+"""
+
+import argparse
+import sys
+
+from . import precompiled
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(prog='python -m muspyche')
+    commands = argparser.add_subparsers(dest='command')
+    compiling = commands.add_parser('compile', help='precompile templates found in directories')
+    compiling.add_argument('directories', nargs='+', metavar='DIRECTORY')
+    compiling.add_argument('-o', '--output', default='templates.muspyche', help='path of precompiled file (default: %(default)s)')
+    compiling.add_argument('--suffix', default=precompiled.SUFFIX, help='suffix of template files (default: %(default)s)')
+    args = argparser.parse_args(argv)
+    if args.command == 'compile':
+        n, skipped = precompiled.write(args.directories, args.output, args.suffix)
+        for path in skipped: print('skipped (uses injections): {0}'.format(path))
+        print('{0}: {1} template(s)'.format(args.output, n))
+    else:
+        argparser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
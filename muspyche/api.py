@@ -3,20 +3,103 @@ Use it if you do not want to deal with separate
 parsing, expanding and rendering of templates.
 """
 
-from . import parser, renderer
+from . import cache, compiler, renderer, resolver, util
 from .context import ContextStack
 
 
-def make(template, context, lookup=[], missing=False):
+def make(template, context, lookup=(), missing=False, compiled=False, memoize=False, fragments=None, base=None, escape=None, memo=None):
     """This function will *make the template rendered*.
 
     * `template` - a string containing Mustache template,
     * `context` - a dictionary containing context for given template,
-    * `lookup` - list of diretories to look partials and injections up in,
+    * `lookup` - list of diretories to look partials and injections up in (or a `resolver.Resolver`),
     * `missing` - boolean, if true missing partials and injections will coerce to empty strings,
+    * `compiled` - boolean, if true template is compiled to Python code before rendering,
+    * `memoize` - boolean, if true output of sections and partials rendered again in a sub-context with equal values
+      is reused from `cache.outputs` (a `cache.OutputCache` may be given instead); compiled templates do not memoize output,
+    * `fragments` - store of rendered fragments (`{{*name keys}}...{{/name}}` tags), `cache.fragments` by default,
+    * `base` - mapping with context shared by many renders (e.g. site-wide values), keys missing in `context` are
+      looked up in it; neither of them is copied,
+    * `escape` - function escaping values of variables, `context.ESCAPE` by default,
+    * `memo` - boolean, if true escaped values are remembered so values rendered many times are escaped only once
+      (default is `context.MEMO`),
+
+    Parsed templates are kept in `cache.templates` (and compiled ones in `compiler.templates`)
+    so rendering the same template many times parses it only once.
 
     It returns string containg template rendered against given context.
     """
-    parsed = parser.parse(template, lookup, missing)
-    context = ContextStack(context)
+    context = ContextStack(context, outputs=(memoize if isinstance(memoize, cache.OutputCache) else (cache.outputs if memoize else None)), fragments=fragments, base=base, escape=escape, memo=memo)
+    lookup = resolver.get(lookup)
+    if compiled:
+        return compiler.templates.get(template, lookup, missing).render(context, lookup, missing)
+    parsed = cache.templates.get(template, lookup, missing)
     return renderer.render(parsed, context, lookup, missing)
+
+
+async def make_async(template, context, lookup=(), missing=False, compiled=False, base=None, escape=None, memo=None):
+    """This function is asynchronous version of `make()`.
+
+    Values of the context may be awaitables (e.g. coroutines); they are awaited only if
+    rendering reaches them, and awaitables reached independently of each other are awaited concurrently.
+    Partials are loaded from disk in executor threads.
+    Parameters have the same meaning as for `make()`.
+    """
+    context = ContextStack(context, base=base, escape=escape, memo=memo)
+    lookup = resolver.get(lookup)
+    if compiled:
+        return await compiler.templates.get(template, lookup, missing).render_async(context, lookup, missing)
+    parsed = cache.templates.get(template, lookup, missing)
+    return await renderer.render_async(parsed, context, lookup, missing)
+
+
+def render_many(template, contexts, lookup=(), missing=False, compiled=True, stream=False, base=None, escape=None, memo=None):
+    """This function renders one template against many contexts.
+
+    * `contexts` - iterable of dictionaries, one for each rendering of the template,
+    * `compiled` - boolean, if true (the default) template is compiled to Python code before rendering,
+    * `stream` - boolean, if true a generator yielding rendered templates is returned instead of a list,
+
+    Other parameters have the same meaning as for `make()`.
+    Template is parsed (and compiled) and partials are looked up only once for whole batch, and
+    results are returned in order of contexts.
+    """
+    lookup = resolver.get(lookup)
+    if compiled:
+        render = compiler.templates.get(template, lookup, missing).render
+    else:
+        parsed = cache.templates.get(template, lookup, missing)
+        render = lambda context, lookup, missing: renderer.render(parsed, context, lookup, missing)
+    rendered = (render(ContextStack(context, base=base, escape=escape, memo=memo), lookup, missing) for context in contexts)
+    return (rendered if stream else list(rendered))
+
+
+def stream(template, context, lookup=(), missing=False, base=None, escape=None, memo=None):
+    """This function renders the template piece by piece.
+
+    Parameters have the same meaning as for `make()`.
+    It returns generator yielding chunks of rendered template, so
+    output can be sent away before the whole template is rendered.
+    """
+    context = ContextStack(context, base=base, escape=escape, memo=memo)
+    lookup = resolver.get(lookup)
+    parsed = cache.templates.get(template, lookup, missing)
+    return renderer.render_iter(parsed, context, lookup, missing)
+
+
+def render_to(fileobj, template, context, lookup=(), missing=False, compiled=False, buffersize=util.BUFFER_SIZE, encoding='utf-8', base=None, escape=None, memo=None):
+    """This function renders the template into a file object.
+
+    * `fileobj` - text or binary stream to write to,
+    * `buffersize` - number of characters collected before they are written to the stream,
+    * `encoding` - encoding used for binary streams,
+
+    Other parameters have the same meaning as for `make()`.
+    It returns number of characters written.
+    """
+    context = ContextStack(context, base=base, escape=escape, memo=memo)
+    lookup = resolver.get(lookup)
+    if compiled:
+        return compiler.templates.get(template, lookup, missing).render_to(fileobj, context, lookup, missing, buffersize=buffersize, encoding=encoding)
+    parsed = cache.templates.get(template, lookup, missing)
+    return renderer.render_to(fileobj, parsed, context, lookup, missing, buffersize=buffersize, encoding=encoding)
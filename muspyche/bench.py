@@ -0,0 +1,234 @@
+"""Benchmark suite of Muspyche.
+
+Usage:
+
+    python -m muspyche.bench [--quick] [--repeat N] [--only NAME...] [--output FILE]
+                             [--baseline FILE] [--threshold FRACTION]
+
+Every scenario is run `repeat` times and the best and median times are reported as JSON.
+If a baseline (JSON written by an earlier run) is given, times are compared with it and
+the exit code is 1 if any scenario got slower by more than `threshold` (e.g. 0.1 for 10%).
+Times depend on the machine, so no baseline is shipped; record one on the machine the comparison
+is run on (e.g. `--output baseline.json` before a change, `--baseline baseline.json` after it).
+Scenarios missing from the baseline are reported as new and never count as regressions.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from . import api
+from . import cache
+from . import parser
+from . import renderer
+from . import __version__
+from .context import ContextStack
+
+
+# registered scenarios: name -> function preparing the scenario
+SCENARIOS = {}
+
+def scenario(function):
+    """Registers a scenario.
+    Scenario functions accept a scale (1.0 for full runs, less for quick ones) and a temporary directory,
+    and return a callable that is timed.
+    """
+    SCENARIOS[function.__name__] = function
+    return function
+
+def _n(scale, n):
+    return max(1, int(n * scale))
+
+def _write(directory, name, text):
+    with open(os.path.join(directory, name), 'w') as ofstream: ofstream.write(text)
+
+
+@scenario
+def parse_flat(scale, directory):
+    """Parsing a large template without sections.
+    """
+    template = ''.join('<p class="{{class}}">{{text}} {{{raw}}} {{! comment }}</p>\n' for _ in range(_n(scale, 20000)))
+    return lambda: parser.parse(template)
+
+@scenario
+def render_flat(scale, directory):
+    """Rendering a large template without sections.
+    """
+    template = ''.join('<p class="{{class}}">{{text}} {{{raw}}}</p>\n' for _ in range(_n(scale, 20000)))
+    context = {'class': 'para', 'text': 'some text', 'raw': '<b>bold</b>'}
+    api.make(template, context)
+    return lambda: api.make(template, context)
+
+@scenario
+def deep_nesting(scale, directory):
+    """Rendering deeply nested sections.
+    """
+    depth = 100
+    template = ''.join('{{#level}}<{{n}}>' for _ in range(depth)) + '{{n}}' + ''.join('{{/level}}' for _ in range(depth))
+    context = {'n': 'bottom'}
+    for i in range(depth): context = {'n': i, 'level': context}
+    contexts = [context] * _n(scale, 200)
+    return lambda: api.render_many(template, contexts, compiled=False)
+
+@scenario
+def list_section(scale, directory):
+    """Rendering a section over a list of 100k items.
+    """
+    template = '{{#items}}<li id="{{id}}">{{name}}</li>\n{{/items}}'
+    context = {'items': [{'id': i, 'name': 'item'} for i in range(_n(scale, 100000))]}
+    return lambda: api.make(template, context)
+
+@scenario
+def list_section_compiled(scale, directory):
+    """Rendering a section over a list of 100k items with compiled template.
+    """
+    template = '{{#items}}<li id="{{id}}">{{name}}</li>\n{{/items}}'
+    context = {'items': [{'id': i, 'name': 'item'} for i in range(_n(scale, 100000))]}
+    return lambda: api.make(template, context, compiled=True)
+
+@scenario
+def generator_section(scale, directory):
+    """Rendering a section over a generator of 100k items.
+    """
+    template = '{{#items}}<li id="{{id}}">{{name}}</li>\n{{/items}}'
+    n = _n(scale, 100000)
+    return lambda: api.make(template, {'items': ({'id': i, 'name': 'item'} for i in range(n))})
+
+@scenario
+def partials_loop(scale, directory):
+    """Rendering a partial for every item of a list.
+    """
+    _write(directory, 'row.mustache', '<tr><td>{{id}}</td>{{> cell}}</tr>\n')
+    _write(directory, 'cell.mustache', '<td>{{name}}</td>')
+    template = '<table>\n{{#rows}}{{> row}}{{/rows}}</table>\n'
+    context = {'rows': [{'id': i, 'name': 'row'} for i in range(_n(scale, 20000))]}
+    return lambda: api.make(template, context, lookup=[directory])
+
+@scenario
+def injections(scale, directory):
+    """Parsing templates with injections.
+    """
+    _write(directory, 'layout.mustache', '<html>\n<body>\n{{@body}}\n</body>\n</html>\n')
+    templates = ['{{<layout:body}}\n<h1>{{title}}</h1> #' + str(i) + '\n{{/layout:body}}\n' for i in range(_n(scale, 2000))]
+    return lambda: [parser.parse(template, [directory]) for template in templates]
+
+@scenario
+def dotted_lookups(scale, directory):
+    """Getting dotted keys from context.
+    """
+    stack = ContextStack({'a': {'b': {'c': {'d': 'value'}}}})
+    n = _n(scale, 200000)
+    def run():
+        get = stack.get
+        for _ in range(n): get('a.b.c.d')
+    return run
+
+@scenario
+def global_lookups(scale, directory):
+    """Getting `::` keys from inside sections.
+    """
+    template = '{{#items}}{{::site.name}} {{::site.url}} {{name}}\n{{/items}}'
+    context = {'site': {'name': 'site', 'url': 'http://example.com'}, 'items': [{'name': 'item'} for _ in range(_n(scale, 30000))]}
+    return lambda: api.make(template, context)
+
+@scenario
+def escaping(scale, directory):
+    """Rendering output that needs escaping.
+    """
+    template = '{{#items}}<td>{{text}}</td><td>{{number}}</td>\n{{/items}}'
+    context = {'items': [{'text': '<a href="x?a=1&b=2">\'quoted\'</a>', 'number': i} for i in range(_n(scale, 30000))]}
+    return lambda: api.make(template, context)
+
+@scenario
+def escaping_memo(scale, directory):
+    """Rendering output that needs escaping, with escaped values memoized.
+    """
+    template = '{{#items}}<td>{{text}}</td><td>{{number}}</td>\n{{/items}}'
+    context = {'items': [{'text': '<a href="x?a=1&b=2">\'quoted\'</a>', 'number': i} for i in range(_n(scale, 30000))]}
+    parsed = cache.templates.get(template)
+    return lambda: renderer.render(parsed, ContextStack(context, memo=True), ())
+
+@scenario
+def memoized_sections(scale, directory):
+    """Rendering a section repeating the same body for items with equal sub-contexts, with memoized output.
+    """
+    template = '{{#items}}<li>{{#badge}}<span class="{{kind}}">{{label}} {{price}}</span><i>{{rating}}</i>{{/badge}}</li>\n{{/items}}'
+    badges = [{'kind': 'sale', 'label': 'Sale', 'price': i, 'rating': '*' * (i % 5)} for i in range(50)]
+    context = {'items': [{'id': i, 'badge': badges[i % 50]} for i in range(_n(scale, 30000))]}
+    return lambda: api.make(template, context, memoize=cache.OutputCache())
+
+
+def run(names=None, repeat=5, scale=1.0):
+    """Runs scenarios and returns dictionary with results.
+    """
+    results = {}
+    for name in (names or sorted(SCENARIOS)):
+        directory = tempfile.mkdtemp()
+        try:
+            function = SCENARIOS[name](scale, directory)
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                function()
+                times.append(time.perf_counter() - start)
+        finally:
+            shutil.rmtree(directory)
+        results[name] = {'best': min(times), 'median': statistics.median(times), 'repeat': repeat}
+    return {'muspyche': __version__,
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'scale': scale,
+            'results': results,
+            }
+
+def compare(results, baseline, threshold):
+    """Compares best times of results with baseline.
+    Returns list of (name, baseline time, current time, ratio, regressed) tuples.
+    """
+    compared = []
+    for name, result in sorted(results['results'].items()):
+        if name not in baseline.get('results', {}): continue
+        before, now = baseline['results'][name]['best'], result['best']
+        ratio = now / before
+        compared.append((name, before, now, ratio, ratio > 1 + threshold))
+    return compared
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(prog='python -m muspyche.bench')
+    argparser.add_argument('--quick', action='store_true', help='run scaled down scenarios')
+    argparser.add_argument('--repeat', type=int, default=5, help='how many times each scenario is run (default: %(default)s)')
+    argparser.add_argument('--only', nargs='+', choices=sorted(SCENARIOS), metavar='NAME', help='run only given scenarios')
+    argparser.add_argument('--output', help='write JSON results to a file instead of standard output')
+    argparser.add_argument('--baseline', help='JSON results to compare with')
+    argparser.add_argument('--threshold', type=float, default=0.1, help='allowed slowdown against baseline (default: %(default)s)')
+    args = argparser.parse_args(argv)
+
+    results = run(args.only, args.repeat, (0.1 if args.quick else 1.0))
+    dumped = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as ofstream: ofstream.write(dumped + '\n')
+    else:
+        print(dumped)
+
+    if args.baseline is None: return 0
+    with open(args.baseline) as ifstream: baseline = json.load(ifstream)
+    if baseline.get('scale') != results['scale']:
+        print('warning: baseline was run with scale {0}, current run with {1}'.format(baseline.get('scale'), results['scale']), file=sys.stderr)
+    regressed = False
+    for name in sorted(set(results['results']) - set(baseline.get('results', {}))):
+        print('{0:<24} not in baseline'.format(name), file=sys.stderr)
+    for name, before, now, ratio, slower in compare(results, baseline, args.threshold):
+        print('{0:<24} {1:>10.4f}s -> {2:>10.4f}s  {3:>6.2f}x{4}'.format(name, before, now, ratio, ('  REGRESSION' if slower else '')), file=sys.stderr)
+        regressed = regressed or slower
+    return (1 if regressed else 0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,413 @@
+"""This module contains caches used by Muspyche to avoid
+doing the same work (e.g. parsing the same template) over and over again.
+"""
+
+import collections
+import dbm
+import threading
+import time
+
+from . import parser
+from . import resolver
+from . import util
+
+
+class TemplateCache:
+    """Process-wide, bounded cache of parsed templates.
+
+    Entries are keyed by template source, lookup directories and the `missing` flag, and
+    evicted in least-recently-used order when the cache grows over `maxsize` entries.
+    Setting `maxsize` to `None` makes the cache unbounded, setting it to `0` disables caching.
+    """
+    def __init__(self, loader, maxsize=128):
+        self._loader = loader
+        self._maxsize = maxsize
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits, self.misses = 0, 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, template):
+        return any(key[0] == template for key in self._entries)
+
+    def _key(self, template, lookup, missing):
+        return (template, tuple(lookup), bool(missing))
+
+    def _evict(self):
+        """Removes least recently used entries until cache fits in its max size.
+        """
+        if self._maxsize is None: return
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, template, lookup=(), missing=False):
+        """Returns template loaded from cache, loading it on a miss.
+        """
+        key = self._key(template, lookup, missing)
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+        loaded = self._loader(template, lookup, missing)
+        with self._lock:
+            self._entries[key] = loaded
+            self._evict()
+        return loaded
+
+    def resize(self, maxsize):
+        """Sets new max size of the cache, evicting entries that no longer fit.
+        """
+        with self._lock:
+            self._maxsize = maxsize
+            self._evict()
+
+    def keys(self):
+        """Returns list of (template, lookup, missing) keys of cached entries.
+        """
+        with self._lock:
+            return list(self._entries)
+
+    def discard(self, key):
+        """Removes entry with given key (as returned by `keys()`) from cache.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate(self, template=None):
+        """Removes entries for given template source (for all lookups and `missing` settings)
+        from cache.
+        If no template is given, whole cache is cleared.
+        """
+        with self._lock:
+            if template is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] == template]:
+                del self._entries[key]
+
+    def stats(self):
+        """Returns a dictionary with cache statistics.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self._maxsize}
+
+
+class PartialCache:
+    """Cache of partials, keyed by path the partial is resolved to.
+
+    Loaded partials are revalidated by comparing modification time and size of their files every time
+    they are looked up.
+    If `interval` is given, partials are revalidated no more often than every `interval` seconds, so a partial
+    rendered in a loop does not hit the filesystem on every iteration, but edits are noticed only after the interval.
+    If `revalidate` is false partials are never revalidated - once loaded they are used until
+    the cache is invalidated.
+    Missing partials are revalidated by checking whether their file was created, without refreshing
+    the index of lookup directories (which is refreshed only when the file appears).
+
+    Loaded partials and resolved names are evicted in least-recently-used order when there are more
+    than `maxsize` of them; `None` makes the cache unbounded.
+
+    If `precompiled` is set, it is called with path and stamp of the partial before the partial is loaded;
+    if it returns anything else than None, it is used instead of loading the partial from source
+    (see `precompiled.install()`).
+    """
+    def __init__(self, loader, revalidate=True, interval=0, maxsize=1024):
+        self._loader = loader
+        self._maxsize = maxsize
+        self.revalidate = revalidate
+        self.interval = interval
+        self.precompiled = None
+        # (name, lookup, missing) -> (found, path)
+        self._paths = collections.OrderedDict()
+        # path -> [stamp, time of last check, loaded partial]
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits, self.misses, self.reloads = 0, 0, 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _stamp(self, path):
+        return util.stamp(path)
+
+    def _evict(self, entries):
+        """Removes least recently used entries from given dict until it fits in max size of the cache.
+        """
+        if self._maxsize is None: return
+        while len(entries) > self._maxsize:
+            entries.popitem(last=False)
+
+    def _resolve(self, name, lookup, missing):
+        key = (name, tuple(lookup), bool(missing))
+        if key in self._paths:
+            self._paths.move_to_end(key)
+            return self._paths[key]
+        resolved = self._paths[key] = resolver.get(lookup).resolve(name, missing)
+        self._evict(self._paths)
+        return resolved
+
+    def _load(self, found, path):
+        stamp = (self._stamp(path) if found else None)
+        loaded = None
+        if found and self.precompiled is not None: loaded = self.precompiled(path, stamp)
+        if loaded is None: loaded = self._loader(util.read(path) if found else '')
+        return [stamp, time.monotonic(), loaded]
+
+    def _forget(self, path):
+        self._entries.pop(path, None)
+        for key in [key for key, value in self._paths.items() if value[1] == path]: del self._paths[key]
+
+    def _isstale(self, entry, found, path, name, lookup):
+        """Returns true if loaded partial must be reloaded.
+        Missing partials become stale when they appear in one of lookup directories.
+        """
+        now = time.monotonic()
+        if not self.revalidate or now - entry[1] < self.interval: return False
+        entry[1] = now
+        if found: return self._stamp(path) != entry[0]
+        return resolver.get(lookup).probe(name) is not None
+
+    def get(self, name, lookup=(), missing=False):
+        """Returns loaded partial with given name.
+        Parameters have the same meaning as for `parser._findpath()`, `lookup` may also be a resolver.Resolver.
+        """
+        with self._lock:
+            found, path = self._resolve(name, lookup, missing)
+            entry = self._entries.get(path)
+            if entry is None:
+                self.misses += 1
+            elif self._isstale(entry, found, path, name, lookup):
+                self.reloads += 1
+                # file may have been removed (or a new one created), so path must be resolved again
+                self._forget(path)
+                resolver.get(lookup).refresh()
+                found, path = self._resolve(name, lookup, missing)
+            else:
+                self.hits += 1
+                self._entries.move_to_end(path)
+                return entry[2]
+            entry = self._entries[path] = self._load(found, path)
+            self._evict(self._entries)
+            return entry[2]
+
+    def invalidate(self, path=None):
+        """Removes partial loaded from given path from cache.
+        If no path is given, whole cache is cleared.
+        """
+        with self._lock:
+            if path is None:
+                self._paths.clear()
+                self._entries.clear()
+                return
+            self._forget(path)
+
+    def paths(self):
+        """Returns list of paths of loaded partials.
+        """
+        with self._lock:
+            return list(self._entries)
+
+    def refresh(self):
+        """Drops resolved paths of partials, so they are resolved again (e.g. after files were
+        created in or removed from lookup directories).
+        Loaded partials are kept.
+        """
+        with self._lock:
+            self._paths.clear()
+
+    def stats(self):
+        """Returns a dictionary with cache statistics.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'reloads': self.reloads, 'size': len(self._entries)}
+
+
+class OutputCache:
+    """Bounded cache of rendered output of sections and partials, used when rendering with memoization
+    (see `ContextStack`).
+
+    Output is reused when the same section body or partial is rendered again in a sub-context with
+    equal values of the keys the body reads.
+    Entries are evicted in least-recently-used order when the cache grows over `maxsize` entries.
+    A cache may be shared by all renders (e.g. `outputs`) or created for a single render.
+
+    Bodies that cannot be memoized are counted in `skipped`, by (section name or partial path, reason)
+    where reason is one of:
+
+    * 'global' - body reads global context (`::` keys, or stack falls back to global context),
+    * 'outer' - body reads outer contexts (`..` keys),
+    * 'unhashable' - sub-context holds values that cannot be fingerprinted (e.g. callables or awaitables).
+    """
+    def __init__(self, maxsize=1024):
+        self._maxsize = maxsize
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # keys read by rendered trees, kept by renderer
+        self.analyses = {}
+        self.skipped = {}
+        self.hits, self.misses = 0, 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns output stored under given key, or None.
+        """
+        with self._lock:
+            output = self._entries.get(key)
+            if output is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return output
+
+    def put(self, key, output):
+        """Stores output under given key and returns it.
+        """
+        with self._lock:
+            self._entries[key] = output
+            if self._maxsize is not None:
+                while len(self._entries) > self._maxsize: self._entries.popitem(last=False)
+        return output
+
+    def skip(self, name, reason):
+        """Records that body of given section or partial was rendered without memoization.
+        """
+        with self._lock:
+            self.skipped[(name, reason)] = self.skipped.get((name, reason), 0) + 1
+
+    def invalidate(self):
+        """Clears the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.analyses.clear()
+
+    def stats(self):
+        """Returns a dictionary with cache statistics; `skipped` holds number of skipped renders by reason.
+        """
+        skipped = {}
+        for (name, reason), count in self.skipped.items(): skipped[reason] = skipped.get(reason, 0) + count
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self._maxsize, 'skipped': skipped}
+
+
+class MemoryStore:
+    """In-process store of rendered fragments (see `models.Fragment`), evicting least recently used
+    fragments when it grows over `maxsize` entries.
+    Expired fragments are dropped when they are looked up.
+    """
+    def __init__(self, maxsize=256, timer=time.monotonic):
+        self._maxsize = maxsize
+        self._timer = timer
+        # key -> (expiry time or None, output)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits, self.misses = 0, 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns output stored under given key, or None if there is none or it expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= self._timer():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, output, ttl=None):
+        """Stores output under given key for `ttl` seconds (or until it is evicted, if `ttl` is None).
+        """
+        with self._lock:
+            self._entries[key] = ((None if ttl is None else self._timer() + ttl), output)
+            self._entries.move_to_end(key)
+            if self._maxsize is not None:
+                while len(self._entries) > self._maxsize: self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns a dictionary with store statistics.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self._maxsize}
+
+
+class DbmStore:
+    """Store of rendered fragments kept in a `dbm` database on disk, so they survive restarts and
+    are shared by processes running on the same machine.
+    Fragments are not evicted, but expired ones are dropped when they are looked up.
+    """
+    def __init__(self, path, timer=time.time):
+        self._db = dbm.open(path, 'c')
+        self._timer = timer
+        self._lock = threading.Lock()
+        self.hits, self.misses = 0, 0
+
+    def get(self, key):
+        """Returns output stored under given key, or None if there is none or it expired.
+        """
+        with self._lock:
+            value = self._db.get(key.encode('utf-8'))
+            if value is not None:
+                expires, output = value.decode('utf-8').split('\n', 1)
+                if expires and float(expires) <= self._timer():
+                    del self._db[key.encode('utf-8')]
+                    value = None
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return output
+
+    def set(self, key, output, ttl=None):
+        """Stores output under given key for `ttl` seconds (or forever, if `ttl` is None).
+        """
+        expires = ('' if ttl is None else repr(self._timer() + ttl))
+        with self._lock:
+            self._db[key.encode('utf-8')] = (expires + '\n' + output).encode('utf-8')
+
+    def delete(self, key):
+        with self._lock:
+            if key.encode('utf-8') in self._db: del self._db[key.encode('utf-8')]
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._db.keys()): del self._db[key]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def stats(self):
+        """Returns a dictionary with store statistics.
+        """
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+# cache used by api.make()
+templates = TemplateCache(parser.parse)
+
+# cache of parsed partials used by renderer
+partials = PartialCache(parser.parse)
+
+# cache of output of sections and partials, used by api.make() with memoization
+outputs = OutputCache()
+
+# store of rendered fragments, used unless context stack is given another one
+fragments = MemoryStore()
@@ -0,0 +1,191 @@
+"""This module contains compiler turning assembled parse trees into Python code.
+
+Compiled templates render the same output as `renderer.render()` but do not
+dispatch on types of nodes during rendering - the tree is walked once, during compilation, and
+what is left is a single Python function appending strings to a list.
+"""
+
+from . import cache
+from . import parser
+from . import renderer
+from . import util
+from .models import *
+
+
+# how many sections may be nested inside single generated function;
+# Python refuses to compile functions with too many statically nested blocks
+MAX_NESTING = 16
+
+
+class Template:
+    """Class representing compiled template.
+
+    Source and code object of the template are generated from the tree unless
+    they are given (e.g. when the template is restored from a precompiled file).
+    """
+    def __init__(self, tree, source=None, code=None):
+        self._tree = tree
+        self._source = (generate(tree) if source is None else source)
+        self._code = (compile(self._source, '<muspyche>', 'exec') if code is None else code)
+        self._function = _load(self._code)
+
+    def __reduce__(self):
+        return (Template, (self._tree,))
+
+    def getsource(self):
+        return self._source
+
+    def gettree(self):
+        return self._tree
+
+    def write(self, append, context, lookup=(), missing=False, newline=None):
+        """Renders template, passing every chunk of the output to `append` callable.
+        """
+        self._function(context, lookup, missing, newline, append)
+
+    def render(self, context, lookup=(), missing=False, newline=None):
+        """Renders template against given ContextStack.
+        Parameters have the same meaning as for `renderer.render()`.
+        """
+        out = []
+        self._function(context, lookup, missing, newline, out.append)
+        return ''.join(out)
+
+    async def render_async(self, context, lookup=(), missing=False, newline=None):
+        """Renders template against given ContextStack, awaiting awaitable values of context when
+        they are reached.
+        Parameters have the same meaning as for `renderer.render_async()`.
+        """
+        await renderer.preload(self._tree, lookup, missing, partials)
+        return await renderer.awaiting(context, lambda: self.render(context, lookup, missing, newline))
+
+    def render_to(self, fileobj, context, lookup=(), missing=False, newline=None, buffersize=util.BUFFER_SIZE, encoding='utf-8'):
+        """Renders template into a file object.
+        Parameters have the same meaning as for `renderer.render_to()`.
+        """
+        writer = util.Writer(fileobj, buffersize, encoding)
+        self._function(context, lookup, missing, newline, writer.write)
+        writer.flush()
+        return writer.written
+
+
+class _Generator:
+    """Generator of Python source code from parse trees.
+    """
+    def __init__(self):
+        self._lines = []
+        self._functions = []
+
+    def _emit(self, depth, line):
+        self._lines.append('    ' * depth + line)
+
+    def _text(self, depth, run):
+        """Emits a run of adjacent text nodes as a single append.
+        """
+        parts, literal = [], ''
+        for el in run:
+            if type(el) is Newline:
+                if literal: parts.append(repr(literal))
+                literal = ''
+                parts.append('(newline if newline is not None else {0})'.format(repr(el._text)))
+            else:
+                literal += el._text
+        if literal: parts.append(repr(literal))
+        if parts: self._emit(depth, '_append({0})'.format(' + '.join(parts)))
+
+    def _body(self, tree, depth, nesting):
+        """Emits code for a list of nodes.
+        """
+        run = []
+        for el in tree:
+            if type(el) in (TextNode, Newline):
+                run.append(el)
+                continue
+            self._text(depth, run)
+            run = []
+            if type(el) is Variable:
+                self._emit(depth, '_append(_get(key={0}, escape={1}))'.format(repr(el._key), repr(el._escaped)))
+            elif type(el) in (Section, Inverted):
+                generator = ('_section' if type(el) is Section else '_inverted')
+                self._emit(depth, 'for _ in {0}(context, {1}):'.format(generator, repr(el.getname())))
+                if nesting < MAX_NESTING:
+                    n = len(self._lines)
+                    self._body(el._template, depth+1, nesting+1)
+                    if len(self._lines) == n: self._emit(depth+1, 'pass')
+                else:
+                    self._emit(depth+1, '{0}(context, lookup, missing, newline, _append)'.format(self._function(el._template)))
+            elif type(el) is Fragment:
+                self._emit(depth, '_append(_fragment({0}, {1}, {2}, context, lookup, missing, newline))'.format(repr(el.getname()), repr(renderer.digest(el._template)), self._function(el._template)))
+            elif type(el) is Partial:
+                self._emit(depth, '_partial({0}, context, lookup, missing, newline, _append)'.format(repr(el.getpath())))
+            else:
+                message = 'no suitable rendering engine for type {0} found'.format(type(el))
+                self._emit(depth, 'raise TypeError({0})'.format(repr(message)))
+        self._text(depth, run)
+
+    def _function(self, tree):
+        """Emits a function rendering given tree and returns its name.
+        """
+        index = len(self._functions)
+        name = '_render{0}'.format(index)
+        self._functions.append(None)
+        lines, self._lines = self._lines, []
+        self._emit(0, 'def {0}(context, lookup, missing, newline, _append):'.format(name))
+        self._emit(1, '_get = context.get')
+        self._body(tree, 1, 0)
+        self._functions[index] = '\n'.join(self._lines)
+        self._lines = lines
+        return name
+
+    def generate(self, tree):
+        """Returns source code of a module defining `render()` function for given tree.
+        """
+        name = self._function(tree)
+        return '\n\n'.join(self._functions) + '\n\nrender = {0}\n'.format(name)
+
+
+def generate(tree):
+    """Returns Python source code of a module rendering given tree.
+    """
+    return _Generator().generate(tree)
+
+
+def _partial(path, context, lookup, missing, newline, append):
+    """Renders partial found under given path.
+    """
+    partials.get(path, lookup, missing).write(append, context, lookup, missing, newline)
+
+
+def _fragment(name, body, function, context, lookup, missing, newline):
+    """Renders fragment whose body (with given digest) is rendered by given function.
+    """
+    def render():
+        out = []
+        function(context, lookup, missing, newline, out.append)
+        return ''.join(out)
+    return renderer.fragment(context, name, newline, render, body, lookup)
+
+
+def _load(code):
+    """Executes code object compiled from generated source and returns rendering function defined by it.
+    """
+    namespace = {'_section': renderer.section,
+                 '_inverted': renderer.inverted,
+                 '_partial': _partial,
+                 '_fragment': _fragment,
+                 }
+    exec(code, namespace)
+    return namespace['render']
+
+
+def load(template, lookup=(), missing=False):
+    """Parses and compiles template.
+    """
+    return Template(parser.parse(template, lookup, missing))
+
+
+# cache of compiled templates, used by api.make()
+templates = cache.TemplateCache(load)
+
+# cache of compiled partials
+partials = cache.PartialCache(load)
@@ -2,16 +2,56 @@
 """
 
 
-import html
+import collections
+import collections.abc
+import inspect
+import itertools
 import re
 import warnings
 
+from . import util
+
 
 # issue warnings?
 WARN = 0
 # print debugging message?
 DEBUG = 0
 
+# matches indexed access specifiers, e.g. `foo[0]`
+INDEXED = re.compile(r'([a-zA-Z-_]*)\[([0-9]*)\]')
+
+# how many parsed access paths are kept before the caches are cleared
+CACHE_SIZE = 4096
+
+# parsed access paths, interned so each path is parsed only once
+_parsed = {}
+# (path, parsed path, key, index) tuples for keys given to ContextStack.get()
+_accessors = {}
+
+# function escaping values of variables, used by stacks that are not given their own
+ESCAPE = util.escape
+
+# memoize escaped values during a render? (used by stacks that are not told otherwise)
+MEMO = 0
+
+# returned by next() for iterators that have no items
+_EXHAUSTED = object()
+
+# types of values that are used as they are, without checking if they must be resolved first
+PLAIN = frozenset([dict, list, str, int, float, bool, type(None)])
+
+def ismapping(value):
+    """Returns true if value is a dictionary or another mapping (e.g. a ChainMap or a mapping view of database row).
+    """
+    return type(value) is dict or (type(value) not in PLAIN and isinstance(value, collections.abc.Mapping))
+
+def streamable(value):
+    """Returns true if sections iterate over given value: it is a list or another iterable
+    (e.g. a generator or a database cursor) that is not a string or a mapping.
+    """
+    if type(value) is list: return True
+    if type(value) in PLAIN: return False
+    return isinstance(value, collections.abc.Iterable) and not isinstance(value, (str, bytes, collections.abc.Mapping))
 
 def parsepath(path):
     """Parses access path and
@@ -19,16 +59,15 @@ def parsepath(path):
     """
     parts = (path.split('.') if path else [])
     if path == '..': parts = ['..']
-    indexed = re.compile('([a-zA-Z-_]*)\[([0-9]*)\]')
     if ['', ''] == parts[:2]:
         parts = ['..'] + parts[2:]
     for i, part in enumerate(parts):
         if not part: parts[i] = '..'
     for i, part in enumerate(parts):
-        if indexed.match(part) is None:
+        if INDEXED.match(part) is None:
             parts[i] = (part, None)
         else:
-            match = indexed.match(part)
+            match = INDEXED.match(part)
             parts[i] = (match.group(1), int(match.group(2) if match.group(2) else 0))
     final = []
     for i, item in enumerate(parts):
@@ -38,6 +77,58 @@ def parsepath(path):
     parts = final[:]
     return parts
 
+def split(path):
+    """Splits context access path to namespace and key.
+    """
+    ns, key = '', ''
+    if path == '.':
+        key = '.'
+    else:
+        parts = path.split('.')
+        key = parts.pop(-1)
+        ns = '.'.join(parts)
+    if not ns and key.startswith('::'):
+        ns = '::'
+        key = key[2:]
+    return (ns, key)
+
+def _intern(cache, path, function):
+    """Returns value of function for given path, computing it only if it is not cached yet.
+    """
+    value = cache.get(path)
+    if value is None:
+        if len(cache) >= CACHE_SIZE: cache.clear()
+        value = cache[path] = function(path)
+    return value
+
+def _parse(path):
+    """Returns access path parsed to a tuple of specifiers.
+    """
+    return _intern(_parsed, path, lambda path: tuple(parsepath(path)))
+
+def _accessor(key):
+    """Returns tuple (path, parsed path, key, index) describing how to get value of given key.
+    """
+    def compile(key):
+        path, key = split(key)
+        key, index = parsepath(key)[0]
+        return (path, tuple(parsepath(path)), key, index)
+    return _intern(_accessors, key, compile)
+
+def reads(path, section=False):
+    """Returns key of current context read by given variable key (or section name, if `section` is true).
+    Returns '.' if current context is read as a whole, '::' if global context is read and '..' if
+    outer contexts are read.
+    """
+    if section: parts, key = _parse(path), None
+    else: path, parts, key, index = _accessor(path)
+    for part, index in parts:
+        if part == '..': return '..'
+        if part.startswith('::'): return '::'
+    if parts: return parts[0][0]
+    if key is None or key == '..': return '.'
+    return key
+
 def dumppath(parts):
     """Dumps parsed access path.
     """
@@ -50,49 +141,119 @@ def dumppath(parts):
     return path
 
 
+def _replay(taken, iterator):
+    """Yields items already taken from iterator, then takes the rest of them, adding them to `taken`.
+    """
+    i = 0
+    while True:
+        if i == len(taken):
+            item = next(iterator, _EXHAUSTED)
+            if item is _EXHAUSTED: return
+            taken.append(item)
+        yield taken[i]
+        i += 1
+
+
 class ContextStack:
     """Object implementing context stack.
+
+    Every stored adjustment pushes a frame holding the context it adjusted to, and
+    restoring pops it, so both are cheap no matter how deep the stack is.
+
+    Values of escaped variables are passed through `escape` function (`ESCAPE` by default).
+    If `memo` is true (default is `MEMO`), escaped values are remembered, so a value rendered many times
+    during one render is escaped only once.
+    If `outputs` (a `cache.OutputCache`) is given, output of sections and partials is memoized in it
+    by the renderer.
+    Rendered fragments are kept in `fragments` store (`cache.fragments` if it is not given).
+
+    Context may be any mapping and is used by reference, never copied.
+    If `base` mapping is given, global context is layered: keys are looked up in `context` first and then in `base`,
+    so a large context shared by many renders (e.g. site-wide values) can be combined with a small one
+    built for every render without copying either.
     """
-    def __init__(self, context, global_lookup=False):
-        self._global, self._current = {}, {}
-        self._stack = {}
-        self._adjusts, self._stacks = [], []
+    def __init__(self, context, global_lookup=False, escape=None, memo=None, outputs=None, fragments=None, base=None):
+        self._global = (context if base is None else collections.ChainMap(context, base))
         self._global_lookup = global_lookup
-        for k, v in context.items(): self._global[k] = v
-        self._toglobal()
+        self._escape = (ESCAPE if escape is None else escape)
+        # escaped strings by their unescaped values, or None if escaping is not memoized
+        self._escapes = ({} if (MEMO if memo is None else memo) else None)
+        self._outputs, self._fragments = outputs, fragments
+        self._current = self._global
+        # contexts the stack was adjusted to (global one is always at the bottom) and
+        # paths of adjustments that pushed them
+        self._frames, self._adjusts = [self._global], []
+        # awaited values (by id of the awaitable) and awaitables reached but not awaited yet,
+        # both are None unless the stack is used by asynchronous rendering
+        self._awaited, self._pending = None, None
+        # (callable, result) pairs of lazy values already evaluated, by id of the callable
+        self._called = {}
+        # (iterator, empty, iterable to use instead of it, items taken during asynchronous rendering or None) tuples
+        # of iterators already peeked, by id of the iterator
+        self._peeked = {}
 
     def __iter__(self):
         """Returns iterator for current context.
+        If current context is a list or another iterable (see `streamable()`), stacks for its items are
+        created one at a time, as the iterator is advanced.
         """
-        if type(self._current) == list:
-            l = []
-            for i, item in enumerate(self._current):
-                context = ContextStack(self._global)
-                context._current = item
-                context._adjusts = self._adjusts
-                l.append(context)
-        else:
-            l = self._current
-        return iter(l)
+        if streamable(self._current): return self._items()
+        return iter(self._current)
 
-    def _toglobal(self):
-        """Makes global context become current context.
+    def _items(self):
+        for item in self.peek(self._current)[1]:
+            context = ContextStack({}, escape=self._escape)
+            context._global = self._global
+            context._escapes, context._outputs, context._fragments = self._escapes, self._outputs, self._fragments
+            context._called, context._peeked = self._called, self._peeked
+            context._current = item
+            context._frames, context._adjusts = self._frames, self._adjusts
+            yield context
+
+    @property
+    def _stack(self):
+        """Returns values from all frames above the global one, merged into one dictionary.
+        """
+        stack = {}
+        for frame in self._frames[1:]:
+            if ismapping(frame): stack.update(frame)
+        return stack
+
+    def _resolve(self, value):
+        """Returns value that should be used in place of given one.
+        Callables (except classes) are lazy values: they are called without arguments when they are first reached, and
+        their results are used for the rest of the render.
+        During asynchronous rendering awaitables (including ones returned by lazy values) are replaced by their results;
+        awaitables that were not awaited yet are recorded as pending and replaced by empty strings.
         """
-        self._current = {}
-        for k, v in self._global.items(): self._current[k] = v
+        if callable(value) and not isinstance(value, type):
+            called = self._called.get(id(value))
+            if called is None: called = self._called[id(value)] = (value, value())
+            value = called[1]
+            if type(value) in PLAIN: return value
+        if self._awaited is None or not inspect.isawaitable(value): return value
+        if id(value) in self._awaited: return self._awaited[id(value)][1]
+        self._pending[id(value)] = value
+        return ''
 
-    def _updatestack(self):
-        """Inserts values from current to stack.
+    def peek(self, iterable):
+        """Returns tuple (empty, iterable to iterate instead of given one) for iterable reached by a section.
+        Iterators (e.g. generators or database cursors) do not know if they are empty, so their first item is taken
+        and chained back in front of the rest; the result is kept for the rest of the render, so an inverted section
+        and a section over the same iterator agree.
+        During asynchronous rendering template is rendered again after awaiting, so items taken from iterators
+        are kept and replayed to later passes.
+        Other iterables are empty if they are false (e.g. have zero length).
         """
-        try:
-            keys = []
-            for k, v in self._current.items():
-                if k not in self._stack: keys.append(k)
-                self._stack[k] = v
-        except AttributeError:
-            keys = []
-        finally:
-            self._stacks.append(keys)
+        if not isinstance(iterable, collections.abc.Iterator): return (not iterable, iterable)
+        peeked = self._peeked.get(id(iterable))
+        if peeked is None:
+            first = next(iterable, _EXHAUSTED)
+            empty = first is _EXHAUSTED
+            rest = (iterable if empty else itertools.chain((first,), iterable))
+            peeked = self._peeked[id(iterable)] = (iterable, empty, rest, ([] if self._awaited is not None else None))
+        if peeked[3] is None: return peeked[1:3]
+        return (peeked[1], _replay(peeked[3], peeked[2]))
 
     def current(self, stack=False):
         if stack:
@@ -107,52 +268,78 @@ class ContextStack:
         if DEBUG:
             print('adjusts:', self._adjusts)
             print(' * current:', self.current())
-        parts = parsepath(path)
+        self._current = self._walk(_parse(path), path, store, global_lookup)
+        if path and store:
+            self._frames.append(self._current)
+            self._adjusts.append(path)
+        return self
+
+    def _walk(self, parts, path, store=True, global_lookup=False):
+        """Follows already parsed access path, starting at current context, and
+        returns context it leads to.
+        """
         if DEBUG: print('parsed parts:', repr(path), '->', parts)
-        if parts == [('..', None)]: parts = [('::', None)] + parsepath('.'.join(self._adjusts))[:-1]
+        if parts == (('..', None),): parts = (('::', None),) + _parse('.'.join(self._adjusts))[:-1]
+        current = self._current
         for part, index in parts:
-            if type(self._current) == bool and store: break
+            if type(current) == bool and store: break
             if part.startswith('::'):
-                self._toglobal()
+                current = self._global
                 part = part[2:]
                 if not part: continue
-            if part in self._current:
-                self._current = (self._current[part] if index is None else self._current[part][index])
+            if part == '' and index is not None and type(current) is list:
+                # indexing lists directly, without scanning them for an empty string key first
+                current = current[index]
+            elif part == '' and index is not None and type(current) not in PLAIN:
+                # items of iterables streamed by sections (e.g. generators) cannot be indexed, and
+                # checking if a part is in them would consume them
+                current = self._item(current, index)
+            elif part in current:
+                current = current[part]
+                if index is not None:
+                    if type(current) not in PLAIN: current = self._resolve(current)
+                    current = current[index]
             elif part in self._global and (self._global_lookup or global_lookup):
-                self._current = self._global[part]
+                current = self._global[part]
             elif part == '' and index is not None:
-                self._current = self._current[index]
+                current = current[index]
             else:
                 if WARN: warnings.warn('path cannot be resolved: "{0}": invalid part: {1}'.format(path, part))
-                self._current = ''
+                current = ''
                 break
-        if path and store:
-            self._adjusts.append(path)
-        self._updatestack()
+            if type(current) not in PLAIN: current = self._resolve(current)
+        return current
+
+    def push(self, value, path):
+        """Pushes given value as current context, as if the stack was adjusted to it by given path.
+        Used for items of iterables, which cannot be reached by walking a path.
+        """
+        self._current = value
+        self._frames.append(value)
+        self._adjusts.append(path)
         return self
 
+    def _item(self, iterable, index):
+        """Returns item of iterable that is being iterated by a section, i.e. the frame pushed after it.
+        Other iterables are indexed.
+        """
+        for i in range(len(self._frames)-2, -1, -1):
+            if self._frames[i] is iterable: return self._frames[i+1]
+        return iterable[index]
+
     def restore(self):
         """Restores current context to previous state.
         """
-        if self._adjusts: self._adjusts.pop(-1)
-        path = '::' + '.'.join(self._adjusts)
-        if DEBUG: print('restoring to:', path)
-        self.adjust(path, store=False)
+        if self._adjusts:
+            self._adjusts.pop(-1)
+            self._frames.pop(-1)
+        if DEBUG: print('restoring to:', self._adjusts)
+        self._current = self._frames[-1]
 
     def split(self, path):
         """Splits context access path to namespace and key.
         """
-        ns, key = '', ''
-        if path == '.':
-            key = '.'
-        else:
-            parts = path.split('.')
-            key = parts.pop(-1)
-            ns = '.'.join(parts)
-        if not ns and key.startswith('::'):
-            ns = '::'
-            key = key[2:]
-        return (ns, key)
+        return split(path)
 
     def get(self, key, escape=True):
         """Returns value associated with given key.
@@ -160,29 +347,43 @@ class ContextStack:
         in such case an adjustemnt of context will be performed. Adjustemnts made by .get() are atomic to single call.
         Key may be just a single dot, in which case it will yield what is currently on top of _current context.
         Non-list, non-string values are automatically coerced to empty strings before being returned.
+        Numbers and booleans are converted to strings, and are never escaped as they cannot contain special characters;
+        neither are `util.SafeString` values.
         """
         value = ''
-        path, key = self.split(key)
+        path, parts, key, index = _accessor(key)
         if DEBUG: print('path:', repr(path))
-        if DEBUG: print('key:', repr(key), end=' -> ')
-        key, index = parsepath(key)[0]
-        if DEBUG: print(key, index)
+        if DEBUG: print('key:', repr(key), index)
         if DEBUG: print('current:', self.current())
+        current = self._current
         if path:
             if DEBUG: print('adjusting:', repr(path))
-            self.adjust(path)
-        if DEBUG: print('current:', self.current())
+            current = self._walk(parts, path)
+            # lookups with a path reset the stack to its top frame, just like restore() does
+            self._current = self._frames[-1]
+        if DEBUG: print('current:', current)
         if key == '.':
-            value = self._current
+            value = current
         else:
-            if type(self._current) is not dict:
-                value = self.current()
+            if type(current) is not dict and not ismapping(current):
+                value = current
             else:
-                value = (self._current[key] if key in self._current else '')
-                value = (value if index is None else value[index])
-        if type(value) in [bool, int, float]: value = str(value)
-        if type(value) is str and escape: value = html.escape(str(value))
-        if path: self.restore()
+                value = (current[key] if key in current else '')
+                if type(value) not in PLAIN: value = self._resolve(value)
+                if index is not None:
+                    value = value[index]
+                    if type(value) not in PLAIN: value = self._resolve(value)
+        if type(value) is str:
+            if escape:
+                escapes = self._escapes
+                if escapes is None: return self._escape(value)
+                escaped = escapes.get(value)
+                if escaped is None:
+                    if len(escapes) >= CACHE_SIZE: escapes.clear()
+                    escaped = escapes[value] = self._escape(value)
+                return escaped
+        elif type(value) in (bool, int, float):
+            value = str(value)
         return value
 
     def keys(self):
@@ -0,0 +1,155 @@
+"""This module contains flat, array-backed representation of parsed templates.
+
+Tree of node objects is stored in three parallel arrays holding, for every node in
+depth-first order:
+
+* its kind (one of the constants below),
+* index of its string (text, key, section name, partial path, or fragment name and digest of its body) in the string table,
+* index one past its last descendant; children of a section are the nodes between
+  the section and this index.
+
+Equal strings are stored in the string table only once, so all newlines of a template
+share a single entry.
+Flat trees take a fraction of memory of node trees and render the same output.
+
+Usage:
+
+    flattened = flat.templates.get(template, lookup)
+    output = flattened.render(ContextStack(context), lookup)
+"""
+
+import array
+
+from . import cache
+from . import models
+from . import parser
+from . import renderer
+from .models import *
+
+
+TEXT = 0
+NEWLINE = 1
+VARIABLE = 2
+LITERAL = 3
+SECTION = 4
+INVERTED = 5
+PARTIAL = 6
+# nodes that cannot be rendered (e.g. hooks without injection), string is name of their class
+UNSUPPORTED = 7
+FRAGMENT = 8
+
+
+class FlatTree:
+    """Class representing parsed template stored in parallel arrays.
+    """
+    __slots__ = ('kinds', 'strings', 'ends', 'table')
+
+    def __init__(self, kinds=None, strings=None, ends=None, table=None):
+        self.kinds = (array.array('B') if kinds is None else kinds)
+        self.strings = (array.array('I') if strings is None else strings)
+        self.ends = (array.array('I') if ends is None else ends)
+        self.table = ([] if table is None else table)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getstate__(self):
+        return (self.kinds, self.strings, self.ends, self.table)
+
+    def __setstate__(self, state):
+        self.kinds, self.strings, self.ends, self.table = state
+
+    def children(self, i):
+        """Returns range of indexes of children of node at given index.
+        """
+        return range(i+1, self.ends[i])
+
+    def _write(self, append, start, end, context, lookup, missing, newline):
+        kinds, strings, ends, table = self.kinds, self.strings, self.ends, self.table
+        i = start
+        while i < end:
+            kind = kinds[i]
+            if kind == TEXT:
+                append(table[strings[i]])
+            elif kind == NEWLINE:
+                append(table[strings[i]] if newline is None else newline)
+            elif kind == VARIABLE or kind == LITERAL:
+                append(context.get(key=table[strings[i]], escape=(kind == VARIABLE)))
+            elif kind == SECTION or kind == INVERTED:
+                generator = (renderer.section if kind == SECTION else renderer.inverted)
+                for _ in generator(context, table[strings[i]]):
+                    self._write(append, i+1, ends[i], context, lookup, missing, newline)
+                i = ends[i]
+                continue
+            elif kind == FRAGMENT:
+                def render(start=i+1, end=ends[i]):
+                    out = []
+                    self._write(out.append, start, end, context, lookup, missing, newline)
+                    return ''.join(out)
+                name, body = table[strings[i]].split('\n')
+                append(renderer.fragment(context, name, newline, render, body, lookup))
+                i = ends[i]
+                continue
+            elif kind == PARTIAL:
+                partials.get(table[strings[i]], lookup, missing).write(append, context, lookup, missing, newline)
+            else:
+                raise TypeError('no suitable rendering engine for type {0} found'.format(getattr(models, table[strings[i]])))
+            i += 1
+
+    def write(self, append, context, lookup=(), missing=False, newline=None):
+        """Renders template passing chunks of output to `append`.
+        """
+        self._write(append, 0, len(self.kinds), context, lookup, missing, newline)
+
+    def render(self, context, lookup=(), missing=False, newline=None):
+        """Renders template against given ContextStack.
+        """
+        out = []
+        self.write(out.append, context, lookup, missing, newline)
+        return ''.join(out)
+
+
+def flatten(tree):
+    """Converts tree of nodes into FlatTree.
+    """
+    flat = FlatTree()
+    index = {}
+    def intern(string):
+        i = index.get(string)
+        if i is None:
+            i = index[string] = len(flat.table)
+            flat.table.append(string)
+        return i
+    def walk(nodes):
+        for el in nodes:
+            t, i = type(el), len(flat.kinds)
+            if t is TextNode: kind, string = TEXT, el._text
+            elif t is Newline: kind, string = NEWLINE, el._text
+            elif t is Variable: kind, string = (VARIABLE if el._escaped else LITERAL), el._key
+            elif t is Section: kind, string = SECTION, el.getname()
+            elif t is Inverted: kind, string = INVERTED, el.getname()
+            # names of tags cannot contain newlines, so digest of the body is stored after one
+            elif t is Fragment: kind, string = FRAGMENT, el.getname() + '\n' + renderer.digest(el._template)
+            elif t is Partial: kind, string = PARTIAL, el.getpath()
+            else: kind, string = UNSUPPORTED, t.__name__
+            flat.kinds.append(kind)
+            flat.strings.append(intern(string))
+            flat.ends.append(i+1)
+            if kind == SECTION or kind == INVERTED or kind == FRAGMENT:
+                walk(el._template)
+                flat.ends[i] = len(flat.kinds)
+    walk(tree)
+    return flat
+
+
+def load(template, lookup=(), missing=False):
+    """Parses template and returns it as FlatTree.
+    """
+    return flatten(parser.parse(template, lookup, missing))
+
+
+# cache of flat templates
+templates = cache.TemplateCache(load)
+
+# cache of flat partials
+partials = cache.PartialCache(load)
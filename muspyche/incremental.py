@@ -0,0 +1,272 @@
+"""This module contains incremental parser of Muspyche, for editors and development servers
+that parse the same template after every change.
+
+Usage:
+
+    parsed = incremental.parse(template, lookup)
+    parsed = incremental.reparse(parsed, offset, removed, inserted)
+    renderer.render(parsed.tree, context, lookup)
+
+Trees produced by `reparse()` are equal to trees produced by `parser.parse()` of edited template.
+Template is kept split into lines (lists of nodes ending with a newline); only lines from the
+one containing the edit up to the first line after the edit at which scanning gets in sync with
+previous scan are scanned and cleaned again.
+If the template was assembled without problems, only the smallest list of sibling nodes
+enclosing the edit is assembled again, and sections around and after the edit are reused.
+Otherwise (e.g. while a section is being typed and is not closed yet) the whole template is assembled again.
+
+Nodes of previous result are reused by the new one (with their positions updated), so
+previous result must not be used after it is passed to `reparse()`, unless it raised an exception.
+"""
+
+import bisect
+import itertools
+
+from . import parser
+from .models import *
+
+
+# types of nodes holding nested nodes in assembled tree
+SECTIONS = (Section, Inverted, Fragment, Injection)
+
+
+class Parsed:
+    """Class representing result of incremental parsing.
+
+    `tree` is the parsed tree (the same as returned by `parser.parse()`), `template` is the parsed template.
+    """
+    def __init__(self, template, lookup=(), missing=False, strict=False):
+        self.template = template
+        self.tree = []
+        self.lookup, self.missing, self.strict = lookup, missing, strict
+        # normalized template (with CRLFs replaced)
+        self._text = ''
+        # nodes found by scanning, and number of nodes, length of text and number of cleaned nodes in every line
+        self._nodes, self._sizes, self._lengths, self._counts = [], [], [], []
+        # cleaned nodes of all lines
+        self._cleaned = []
+        # assembled tree, before injections were inserted
+        self._assembled = []
+        # whether assembling found problems, in which case the whole template is assembled after every edit
+        self._problems = False
+        # number of injections in assembled tree
+        self._injections = 0
+
+
+def _lines(nodes, breaks, start, end=None):
+    """Splits scanned nodes (starting at index `start` of template) into lines at given breaks.
+    Returns tuple (number of nodes in every line, length of every line).
+    Last line, which does not end with a newline and ends at index `end`, is included only if `end` is given.
+    """
+    sizes, lengths = [], []
+    count, position = 0, start
+    for n, i in breaks:
+        sizes.append(n-count)
+        lengths.append(i-position)
+        count, position = n, i
+    if end is not None:
+        sizes.append(len(nodes)-count)
+        lengths.append(end-position)
+    return (sizes, lengths)
+
+def _clean(nodes, sizes):
+    """Cleans nodes line by line.
+    Returns tuple (cleaned nodes, number of cleaned nodes in every line).
+    """
+    cleaned, counts, i = [], [], 0
+    for size in sizes:
+        line = parser._cleanline(nodes[i:i+size])
+        cleaned.extend(line)
+        counts.append(len(line))
+        i += size
+    return (cleaned, counts)
+
+def _injections(nodes):
+    return sum(1 for el in nodes if type(el) is Injection)
+
+def _finish(parsed):
+    """Sets tree of parsed template from its assembled tree, inserting injections.
+    """
+    if parsed._injections:
+        parsed.tree = parser.insertinjections(parsed._assembled, parsed.lookup, parsed.missing)
+    else:
+        parsed.tree = list(parsed._assembled)
+    return parsed
+
+
+def parse(template, lookup=(), missing=False, strict=False):
+    """Parses template and returns Parsed object that can be passed to `reparse()`.
+    Parameters have the same meaning as for `parser.parse()`.
+    """
+    parsed = Parsed(template, lookup, missing, strict)
+    parsed._text = template.replace('\r\n', '\n')
+    breaks = []
+    parser._scan(parsed._text, 0, 1, 0, parsed._nodes, breaks)
+    parsed._sizes, parsed._lengths = _lines(parsed._nodes, breaks, 0, len(parsed._text))
+    parsed._cleaned, parsed._counts = _clean(parsed._nodes, parsed._sizes)
+    parsed._assembled, problems = parser._assemble(parsed._cleaned)
+    parsed._problems, parsed._injections = bool(problems), _injections(parsed._assembled)
+    parser._report(problems, strict)
+    return _finish(parsed)
+
+
+def _bisect(nodes, pos, right=False):
+    """Returns index at which node at given position would be inserted into list of nodes
+    sorted by their positions.
+    """
+    lo, hi = 0, len(nodes)
+    while lo < hi:
+        middle = (lo+hi) // 2
+        if nodes[middle]._pos < pos or (right and nodes[middle]._pos == pos): lo = middle+1
+        else: hi = middle
+    return lo
+
+def _locate(nodes, cleaned, lo, hi, a, b):
+    """Finds sibling nodes covering cleaned nodes from `a` to `b`, which are replaced by an edit.
+    `nodes` are siblings covering cleaned nodes from `lo` to `hi`.
+
+    Returns list of (siblings, first, last, start, end) tuples, one for every level of the tree
+    down from `nodes`: siblings from `first` to `last` are replaced.
+    At all levels but the last one exactly one section is replaced (and the edit is inside its body),
+    at the last one replaced siblings cover cleaned nodes from `start` to `end`.
+    """
+    position = (cleaned[a]._pos if a < len(cleaned) else (float('inf'),))
+    first = _bisect(nodes, position, right=True) - 1
+    if first >= 0 and nodes[first]._pos < position:
+        # node starting before the edit is replaced only if it extends into it
+        following = (_bisect(cleaned, nodes[first+1]._pos) if first+1 < len(nodes) else hi)
+        if following <= a: first += 1
+    else:
+        first = max(first, 0)
+    last = (_bisect(nodes, cleaned[b]._pos) if b < hi else len(nodes))
+    if a == b and first < last and _bisect(cleaned, nodes[first]._pos) == a: last = first
+    if first == last: return [(nodes, first, last, a, b)]
+    start = _bisect(cleaned, nodes[first]._pos)
+    end = (_bisect(cleaned, nodes[last]._pos) if last < len(nodes) else hi)
+    if last-first == 1 and type(nodes[first]) in SECTIONS and start < a and b < end:
+        # edit is inside body of a single section, between its opening and closing tags
+        return [(nodes, first, last, start, end)] + _locate(nodes[first]._template, cleaned, start+1, end-1, a, b)
+    return [(nodes, first, last, start, end)]
+
+def _shift(nodes, lines):
+    """Moves sections of assembled tree given number of lines down.
+    Other nodes (including opening tags left unassembled, e.g. injections inside sections) are
+    moved with the scanned nodes.
+    """
+    for el in nodes:
+        if type(el) in SECTIONS and el.assembled:
+            el._pos = (el._pos[0]+lines, el._pos[1])
+            _shift(el._template, lines)
+
+def _move(nodes, lines):
+    """Moves scanned nodes given number of lines down.
+    """
+    for el in nodes: el._pos = (el._pos[0]+lines, el._pos[1])
+
+
+def _reassemble(previous, path, cleaned, a, b):
+    """Assembles cleaned nodes replacing cleaned nodes from `a` to `b` of previous template
+    in place located by `_locate()`.
+    Returns tuple (assembled tree, list of lists of reused nodes following the edit, change of number of injections),
+    or None if the nodes cannot be assembled separately from the rest of the template.
+    """
+    siblings, first, last, start, end = path[-1]
+    piece = previous._cleaned[start:a] + cleaned + previous._cleaned[b:end]
+    # injections are sections only at the top level
+    if len(path) > 1 and any(type(el) is Injection for el in piece): return None
+    assembled, problems = parser._assemble(piece)
+    if problems: return None
+    injections = (_injections(assembled) - _injections(siblings[first:last]) if len(path) == 1 else 0)
+    assembled = siblings[:first] + assembled + siblings[last:]
+    following = [siblings[last:]]
+    for siblings, first, last, start, end in reversed(path[:-1]):
+        section = siblings[first]
+        rebuilt = type(section)(section.getname(), assembled)
+        rebuilt.assembled, rebuilt._pos = True, section._pos
+        assembled = siblings[:first] + [rebuilt] + siblings[last:]
+        following.append(siblings[last:])
+    return (assembled, following, injections)
+
+
+def reparse(previous, offset, removed, inserted):
+    """Parses template edited by replacing `removed` characters at `offset` with `inserted` text.
+    `previous` is Parsed object of the template before the edit; new Parsed object is returned.
+    """
+    old = previous.template
+    template = old[:offset] + inserted + old[offset+removed:]
+    # edit is widened so that it does not split CRLFs, and translated to normalized template
+    if offset > 0 and old[offset-1] == '\r':
+        offset, removed, inserted = offset-1, removed+1, '\r' + inserted
+    if offset+removed < len(old) and old[offset+removed] == '\n':
+        removed, inserted = removed+1, inserted + '\n'
+    removed = len(old[offset:offset+removed].replace('\r\n', '\n'))
+    offset = offset - old.count('\r\n', 0, offset)
+    return _reparse(previous, template, offset, removed, inserted.replace('\r\n', '\n'))
+
+def _reparse(previous, template, offset, removed, inserted):
+    """Reparses template edited at given offset of normalized template.
+    """
+    text = previous._text
+    new = text[:offset] + inserted + text[offset+removed:]
+    delta = len(inserted) - removed
+    parsed = Parsed(template, previous.lookup, previous.missing, previous.strict)
+    parsed._text = new
+
+    # first line scanned again is the one containing character before the edit, as
+    # nodes at the end of a line depend on characters following them
+    ends = list(itertools.accumulate(previous._lengths))
+    first = (bisect.bisect_right(ends, offset-1) if offset > 0 else 0)
+    start = (ends[first-1] if first > 0 else 0)
+    # comments spanning many lines are valid only if a line starting with closing braces follows them,
+    # so if the edit changes where the last such line is, lines before the edit could be scanned differently
+    closing = (text.rfind('\n}}'), new.rfind('\n}}'))
+    if closing[0] != closing[1] and min(closing) < start:
+        return parse(template, previous.lookup, previous.missing, previous.strict)
+
+    # lines are scanned until scanning reaches a line that starts after the edit at the same place as before
+    nodes, breaks = [], []
+    line, linestart = new.count('\n', 0, start)+1, new.rfind('\n', 0, start)+1
+    last, oldstart = first, start
+    i, stop = start, max(start+1, offset+removed+delta)
+    while True:
+        i, line, linestart, done = parser._scan(new, i, line, linestart, nodes, breaks, stop)
+        if done:
+            last = len(previous._lengths)
+            break
+        while oldstart < i-delta and last < len(previous._lengths):
+            oldstart += previous._lengths[last]
+            last += 1
+        # scanning stops after a newline, and lines after it are reused if they started a line before too
+        if oldstart == i-delta and last < len(previous._lengths) and (oldstart == 0 or text[oldstart-1] == '\n'): break
+        stop = i+1
+    sizes, lengths = _lines(nodes, breaks, start, (len(new) if done else None))
+    cleaned, counts = _clean(nodes, sizes)
+
+    # ranges of scanned and cleaned nodes replaced
+    t0, a = sum(previous._sizes[:first]), sum(previous._counts[:first])
+    t1, b = t0 + sum(previous._sizes[first:last]), a + sum(previous._counts[first:last])
+    path = (None if previous._problems else _locate(previous._assembled, previous._cleaned, 0, len(previous._cleaned), a, b))
+
+    parsed._nodes = previous._nodes[:t0] + nodes + previous._nodes[t1:]
+    parsed._sizes = previous._sizes[:first] + sizes + previous._sizes[last:]
+    parsed._lengths = previous._lengths[:first] + lengths + previous._lengths[last:]
+    parsed._counts = previous._counts[:first] + counts + previous._counts[last:]
+    parsed._cleaned = previous._cleaned[:a] + cleaned + previous._cleaned[b:]
+
+    lines = inserted.count('\n') - text.count('\n', offset, offset+removed)
+    if lines: _move(previous._nodes[t1:], lines)
+    try:
+        reassembled = (None if path is None else _reassemble(previous, path, cleaned, a, b))
+        if reassembled is None:
+            parsed._assembled, problems = parser._assemble(parsed._cleaned)
+            parsed._problems, parsed._injections = bool(problems), _injections(parsed._assembled)
+            parser._report(problems, parsed.strict)
+        else:
+            parsed._assembled, parsed._injections = reassembled[0], previous._injections + reassembled[2]
+        _finish(parsed)
+    except BaseException:
+        if lines: _move(previous._nodes[t1:], -lines)
+        raise
+    if lines and reassembled is not None:
+        for following in reassembled[1]: _shift(following, lines)
+    return parsed
@@ -8,9 +8,16 @@ import html
 
 class Tag:
     """Base class for various tags.
+
+    Tags use `__slots__` so that large templates, which parse into hundreds of thousands
+    of nodes, do not pay for a dictionary in every one of them.
+    `_pos` holds (line, column) at which the tag was found in template, or None if unknown.
     """
+    __slots__ = ('_key', '_pos')
+
     def __init__(self, key):
         self._key = key
+        self._pos = None
 
     def render(self, engine, context):
         return engine(self).render(context)
@@ -19,8 +26,11 @@ class Tag:
 class Variable(Tag):
     """Class representing 'Variable' type of Mustache tag.
     """
+    __slots__ = ('_escaped', '_miss')
+
     def __init__(self, key, escape=True, miss=True):
         self._key = key
+        self._pos = None
         self._escaped = escape
         self._miss = miss
 
@@ -33,6 +43,8 @@ class Literal(Variable):
     It is a wrapper returning Variable objects with `escape` param
     set to False.
     """
+    __slots__ = ()
+
     def __new__(self, key):
         return Variable(key, escape=False)
 
@@ -40,7 +52,10 @@ class Literal(Variable):
 class Section(Tag):
     """Class representing 'Section' type of Mustache tag.
     """
+    __slots__ = ('_name', '_template', 'assembled')
+
     def __init__(self, name, tmplt, *args):
+        self._pos = None
         self._name = name
         self._template = tmplt
         self.assembled = False
@@ -48,7 +63,7 @@ class Section(Tag):
     def getname(self):
         return self._name
 
-    def render(self, engine, context, lookup=[], missing=False, newline=None):
+    def render(self, engine, context, lookup=(), missing=False, newline=None):
         return engine(self).render(context, lookup, missing, newline)
 
     def inline(self):
@@ -73,12 +88,14 @@ class Section(Tag):
 class Inverted(Section):
     """Class represetnting 'Inverted Section' type of Mustache tag.
     """
-    pass
+    __slots__ = ()
 
 
 class Injection(Section):
     """Class representing 'Section' type of Mustache tag.
     """
+    __slots__ = ()
+
     def getname(self):
         return self._name
 
@@ -89,10 +106,37 @@ class Injection(Section):
         return self._name.split(':', 1)[1]
 
 
+class Fragment(Section):
+    """Class representing cached fragment of template.
+
+    Its name consists of name of the fragment, keys of context whose values are part of the cache key
+    and optional `ttl=SECONDS` option, separated by whitespace, e.g. `nav user.id ::lang ttl=300`.
+    Fragment is closed by a tag with name of the fragment alone, e.g. `{{/nav}}`.
+    """
+    __slots__ = ()
+
+    def getfragment(self):
+        return (self._name.split(None, 1) or [''])[0]
+
+    def getkeys(self):
+        return [word for word in self._name.split()[1:] if not word.startswith('ttl=')]
+
+    def getttl(self):
+        """Returns number of seconds rendered fragment is kept for, or None if it is kept until evicted.
+        """
+        ttl = None
+        for word in self._name.split()[1:]:
+            if word.startswith('ttl='): ttl = float(word[4:])
+        return ttl
+
+
 class Close(Tag):
     """Class representing section closing tag.
     """
+    __slots__ = ('_name',)
+
     def __init__(self, name):
+        self._pos = None
         self._name = name
 
     def getname(self):
@@ -105,8 +149,10 @@ class Close(Tag):
 class Comment(Tag):
     """Class representing 'Comment' type of Mustache tag.
     """
+    __slots__ = ()
+
     def __init__(self):
-        pass
+        self._pos = None
 
     def render(self, *args, **kwargs):
         return ''
@@ -115,7 +161,10 @@ class Comment(Tag):
 class TextNode(Tag):
     """Class representing plain text node.
     """
+    __slots__ = ('_text',)
+
     def __init__(self, text):
+        self._pos = None
         self._text = text
 
 
@@ -123,24 +172,29 @@ class Newline(TextNode):
     """Separate class for newlines to make Windows/Linux compatibility, and
     formatting easier.
     """
-    pass
+    __slots__ = ()
 
 
 class Partial(Tag):
     """Class representing 'Partial' type of Mustache tag.
     """
+    __slots__ = ('_path',)
+
     def __init__(self, path):
+        self._pos = None
         self._path = path
 
     def getpath(self):
         return self._path
 
-    def render(self, engine, context, lookup=[], missing=False, newline=None):
+    def render(self, engine, context, lookup=(), missing=False, newline=None):
         return engine(self).resolve(lookup, missing).render(context, lookup, missing, newline)
 
 
 class Hook(Tag):
     """Class representing hook for injections.
     """
+    __slots__ = ()
+
     def getname(self):
         return self._key
@@ -0,0 +1,89 @@
+"""This module contains process-pool rendering of Muspyche templates.
+
+Rendering is pure Python code so threads do not make it any faster;
+this module spreads rendering of big batches of contexts over several processes instead.
+Compiled template is sent to every worker process only once, when the process is started, and
+contexts are sent in chunks.
+"""
+
+import itertools
+import multiprocessing
+import traceback
+
+from . import compiler, resolver
+from .context import ContextStack
+
+
+# default number of contexts sent to a worker in one task
+CHUNK_SIZE = 64
+
+
+class RenderError(Exception):
+    """Raised when rendering of a context fails in a worker process.
+
+    `index` is position of the failing context, `error` describes the original exception and
+    `traceback` holds its formatted traceback (as it was in the worker process).
+    """
+    def __init__(self, index, error, traceback=''):
+        super().__init__(index, error, traceback)
+        self.index = index
+        self.error = error
+        self.traceback = traceback
+
+    def __str__(self):
+        return 'rendering of context #{0} failed: {1}'.format(self.index, self.error)
+
+
+# state of worker process, set by _initialize()
+_worker = {}
+
+def _initialize(template, lookup, missing):
+    _worker['template'] = template
+    _worker['lookup'] = resolver.get(lookup)
+    _worker['missing'] = missing
+
+def _render(chunk):
+    """Renders a chunk of (index, context) pairs and returns list of (index, output) pairs.
+    """
+    template, lookup, missing = _worker['template'], _worker['lookup'], _worker['missing']
+    rendered = []
+    for index, context in chunk:
+        try:
+            rendered.append((index, template.render(ContextStack(context), lookup, missing)))
+        except Exception as e:
+            raise RenderError(index, '{0}: {1}'.format(type(e).__name__, e), traceback.format_exc())
+    return rendered
+
+def _chunks(contexts, chunksize):
+    """Splits contexts into lists of (index, context) pairs.
+    """
+    contexts = enumerate(contexts)
+    while True:
+        chunk = list(itertools.islice(contexts, chunksize))
+        if not chunk: break
+        yield chunk
+
+def _run(template, contexts, lookup, missing, workers, chunksize, ordered):
+    with multiprocessing.Pool(workers, initializer=_initialize, initargs=(template, tuple(lookup), missing)) as pool:
+        mapping = (pool.imap if ordered else pool.imap_unordered)
+        for rendered in mapping(_render, _chunks(contexts, chunksize)):
+            yield from rendered
+
+def render_many(template, contexts, workers=None, chunksize=CHUNK_SIZE, lookup=(), missing=False, stream=False):
+    """Renders one template against many contexts using a pool of worker processes.
+
+    * `template` - a string containing Mustache template,
+    * `contexts` - iterable of dictionaries, one for each rendering of the template (they must be picklable),
+    * `workers` - number of worker processes, by default number of CPUs,
+    * `chunksize` - number of contexts sent to a worker in one task,
+    * `lookup` and `missing` - have the same meaning as for `api.make()`,
+    * `stream` - boolean, if true a generator yielding (index, output) pairs is returned; pairs
+      are yielded as soon as their chunk is rendered so they may come out of order,
+
+    By default list of outputs in order of contexts is returned.
+    If rendering of any context fails RenderError carrying index of the context is raised.
+    """
+    template = compiler.templates.get(template, lookup, missing)
+    if stream:
+        return _run(template, contexts, lookup, missing, workers, chunksize, ordered=False)
+    return [output for _, output in _run(template, contexts, lookup, missing, workers, chunksize, ordered=True)]
@@ -1,23 +1,44 @@
-import os
 import re
+import warnings
 
 
 from .models import *
+from . import resolver
 from . import util
 
 
 WARN = 0
 DEBUG = 0
-QUICKTEST = 0
+
+
+LITERAL = re.compile('^({)(.*?)}}}')
+NORMAL = re.compile('^([@&#^/<>*]?)(.*?)}}')
+COMMENT = re.compile('^(!)(.*?)(.*\n)*}}')
+
+# matches places where text node must be broken: tag openings and newlines
+BREAK = re.compile('{{|\r?\n')
+
+TYPES = {'':  Variable,
+         '!': Comment,
+         '{': Literal,
+         '&': Literal,
+         '#': Section,
+         '^': Inverted,
+         '/': Close,
+         '>': Partial,
+         '<': Injection,
+         '@': Hook,
+         '*': Fragment,
+         }
 
 
 def gettag(s):
     """Returns a tuple: (tag-type, tag-name, whole-match).
     Searches from the very beginning of given string.
     """
-    literal = re.compile('^({)(.*?)}}}').search(s)
-    normal = re.compile('^([@&#^/<>]?)(.*?)}}').search(s)
-    comment = re.compile('^(!)(.*?)(.*\n)*}}').search(s)
+    literal = LITERAL.search(s)
+    normal = NORMAL.search(s)
+    comment = COMMENT.search(s)
     if comment is not None: match = comment
     elif literal is not None: match = literal
     elif normal is not None: match = normal
@@ -25,62 +46,98 @@ def gettag(s):
     if match is None: raise Exception(repr(s))
     return (match.group(1), match.group(2).strip(), match.group(0))
 
+def _next(template, s, i, found):
+    """Returns index of the first occurrence of `s` in template at or after `i` (or length of the template
+    if there is none).
+    Index is remembered in `found` dict and reused while it is not passed, so a scan calling this function
+    with growing `i` searches the template for `s` only once.
+    """
+    at = found.get(s)
+    if at is None or at < i:
+        at = template.find(s, i)
+        if at == -1: at = len(template)
+        found[s] = at
+    return at
+
+def _scantag(template, i, found=None):
+    """Scans tag starting at index `i` of template (just after the opening braces).
+    Returns a tuple: (tag-type, tag-name, end) where `end` is the index just after the tag.
+
+    Gives the same results as gettag(template[i:]) but does not copy the template.
+    Positions of newlines and closing braces are looked up with _next() in `found`, which should be
+    shared by all calls made in one scan, so cost of the whole scan stays linear even if the template
+    is a single long line.
+    """
+    if found is None: found = {}
+    newline = _next(template, '\n', i, found)
+    if template.startswith('!', i):
+        end = template.find('}}', i+1)
+        # comment may span many lines but then its closing braces must start a line
+        if end != -1 and (end < newline or _next(template, '\n}}', i+1, found) < len(template)):
+            return ('!', template[i+1:end].strip(), end+2)
+    if template.startswith('{', i):
+        end = _next(template, '}}}', i+1, found)
+        if end < newline: return ('{', template[i+1:end].strip(), end+3)
+    tagtype = template[i] if (i < len(template) and template[i] in '@&#^/<>*') else ''
+    end = template.find('}}', i+len(tagtype), newline)
+    if end == -1: raise Exception(repr(template[i:]))
+    return (tagtype, template[i+len(tagtype):end].strip(), end+2)
+
+def _scan(template, i, line, linestart, tree, breaks=None, stop=None):
+    """Scans (already normalized) template starting at index `i`, which lies at given line, and
+    appends nodes found to `tree`.
+
+    If `breaks` is a list, (number of nodes, index) pairs are appended to it after every newline node.
+    If `stop` is given, scanning stops at the first line starting at or after it.
+    Returns tuple (index, line, line start, done) where `done` is true if the whole template was scanned.
+    """
+    found = {}
+    match = BREAK.search(template, i)
+    while match is not None:
+        start = match.start()
+        if start > i:
+            tree.append( TextNode(template[i:start]) )
+            tree[-1]._pos = (line, i-linestart+1)
+        if match.group(0) != '{{':
+            # carriage return survives replacing of CRLFs only when doubled, and is a separate newline then
+            if match.group(0) == '\r\n':
+                tree.append( Newline('\r') )
+                tree[-1]._pos = (line, start-linestart+1)
+                if breaks is not None: breaks.append((len(tree), start+1))
+            tree.append( Newline('\n') )
+            tree[-1]._pos = (line, match.end()-linestart)
+            i = match.end()
+            line, linestart = line+1, i
+            if breaks is not None: breaks.append((len(tree), i))
+            if stop is not None and i >= stop: return (i, line, linestart, False)
+        else:
+            tagtype, tagname, i = _scantag(template, start+2, found)
+            if tagtype == '!':
+                tree.append( Comment() )
+            elif tagtype in ('#', '^', '<', '*'):
+                tree.append( TYPES[tagtype](tagname, []) )
+            else:
+                tree.append( TYPES[tagtype](tagname) )
+            tree[-1]._pos = (line, start-linestart+1)
+            if tagtype == '!':
+                # comments may span several lines
+                newlines = template.count('\n', start, i)
+                if newlines: line, linestart = line+newlines, template.rfind('\n', start, i)+1
+        match = BREAK.search(template, i)
+    if i < len(template):
+        tree.append( TextNode(template[i:]) )
+        tree[-1]._pos = (line, i-linestart+1)
+    return (len(template), line, linestart, True)
+
 def rawparse(template):
     """Split template into a list of nodes.
+
+    Template is scanned in a single pass; text between tags and newlines is
+    sliced out of the template instead of being built character by character.
+    Every node gets (line, column) position at which it starts in `_pos` attribute.
     """
-    types = {'':  Variable,
-             '!': Comment,
-             '{': Literal,
-             '&': Literal,
-             '#': Section,
-             '^': Inverted,
-             '/': Close,
-             '>': Partial,
-             '<': Injection,
-             '@': Hook,
-             }
     tree = []
-    text = ''
-    i = 0
-    opened = False
-    template = template.replace('\r\n', '\n')
-    while i < len(template):
-        if template[i:i+2] == '{{':
-            if text:
-                tree.append( TextNode(text) )
-                text = ''
-            i += 2
-            tagtype, tagname, whole = gettag(template[i:])
-            if tagtype == '!':
-                n = 1
-                while i+n < len(template):
-                    if template[i+n:].startswith('}}'):
-                        n += 2
-                        break
-                    n += 1
-                whole = ' ' * n
-            elif tagtype == '#':
-                tree.append( Section(tagname.strip(), []) )
-            elif tagtype == '^':
-                tree.append( Inverted(tagname.strip(), []) )
-            elif tagtype == '<':
-                tree.append( Injection(tagname.strip(), []) )
-            elif tagtype == '/':
-                tree.append( Close(tagname.strip()) )
-            else:
-                tree.append( types[tagtype](tagname.strip()) )
-            i += len(whole)-1
-        elif template[i] == '\n' or template[i:i+2] == '\r\n':
-            if text:
-                tree.append( TextNode(text) )
-                text = ''
-            tree.append( Newline(template[i]) )
-        else:
-            text += template[i]
-        i += 1
-    if text:
-        tree.append( TextNode(text) )
-        text = ''
+    _scan(template.replace('\r\n', '\n'), 0, 1, 0, tree)
     return tree
 
 def _findpath(partial, lookup, missing):
@@ -88,7 +145,7 @@ def _findpath(partial, lookup, missing):
     return path to it.
 
     :param partial: name of the partial or injection given in template
-    :param lookup: list of directories in which lookup for partials should be done
+    :param lookup: list of directories in which lookup for partials should be done (or a resolver.Resolver)
     :param missing: whether to allow missing partials or not
 
     Params explained:
@@ -103,39 +160,11 @@ def _findpath(partial, lookup, missing):
         If not missing partials are not allowed and a partial cannot be found
         an exception is raised.
 
-    Lookup sequence:
-
-    Let given path be named `partial_path`, and current lookup path be named `lookup_path`.
-    First lookup path is always '.' - current working directory.
-    The sequence consists of following steps and is repeated for every lookup path:
-
-        0.  lookup_path/partial_path
-        1.  lookup_path/partial_path.mustache
-        2.  lookup_path/partial_path/template.mustache
-
-    Iterating over lookup paths stops after first match is found.
+    Lookup sequence is described in `resolver.Resolver`.
+    Directories are indexed by shared resolvers, call `resolver.refresh()` after
+    adding or removing files in them.
     """
-    found, path = (False, partial)
-    lookup.insert(0, '.')
-    for base in lookup:
-        trypath = os.path.join(base, path)
-        if os.path.isfile(trypath):
-            path = trypath
-            found = True
-            break
-        trypath = '.'.join([os.path.join(base, path), 'mustache'])
-        if os.path.isfile(trypath):
-            path = trypath
-            found = True
-            break
-        trypath = os.path.join(base, path, 'template.mustache')
-        if os.path.isfile(trypath):
-            path = trypath
-            found = True
-            break
-    if not found and not missing:
-        raise OSError('partial or injection could not be resolved: invalid path: {0}'.format(path))
-    return (found, path)
+    return resolver.get(lookup).resolve(partial, missing)
 
 def _resolvepartial(element, lookup, missing):
     """This function tries to find a file matching given partial path and
@@ -148,9 +177,9 @@ def _resolvepartial(element, lookup, missing):
     found, path = _findpath(element.getpath(), lookup, missing)
     if found: template = util.read(path)
     else: template = ''
-    return expandpartials(rawparse(template), lookup, missing)
+    return expandpartials(clean(rawparse(template)), lookup, missing)
 
-def expandpartials(tree, lookup=[], missing=False):
+def expandpartials(tree, lookup=(), missing=False):
     """This function expands partials.
 
     :param tree: parse tree of Mustache nodes
@@ -166,31 +195,36 @@ def expandpartials(tree, lookup=[], missing=False):
     return expanded
 
 def _resolveinjection(element, lookup, missing):
-    """This function tries to find a file matching given partial path and
-    return it as a parsed list.
+    """This function tries to find a file matching given injection path and
+    return it as a parsed list, with hooks substituted with the body of the injection.
 
-    :param element: object representing Mustache partial element
-    :param lookup: list of directories in which lookup for partials should be done
-    :param missing: whether to allow missing partials or not
+    :param element: object representing Mustache injection element
+    :param lookup: list of directories in which lookup for injections should be done
+    :param missing: whether to allow missing injections or not
     """
     found, path = _findpath(element.getpath(), lookup, missing)
     if found: template = util.read(path)
     else: template = ''
-    return insertinjections(rawparse(template), lookup, missing)
+    return substituteHooks(parse(template, lookup, missing), element.gethookname(), element._template)
 
 def substituteHooks(tree, hook, tmplt):
     """Substitues hook with template.
+    Hooks are substituted also inside sections (which are copied, not modified).
     """
     new = []
     for i in tree:
         if type(i) == Hook and i.getname() == hook:
             new.extend(tmplt)
+        elif type(i) in (Section, Inverted, Injection, Fragment):
+            section = type(i)(i.getname(), substituteHooks(i._template, hook, tmplt))
+            section.assembled, section._pos = i.assembled, i._pos
+            new.append(section)
         else:
             new.append(i)
     return new
 
-def insertinjections(tree, lookup=[], missing=False):
-    """This function expands partials.
+def insertinjections(tree, lookup=(), missing=False):
+    """This function expands injections.
 
     :param tree: parse tree of Mustache nodes
     :param lookup: list of directories in which lookup for partials should be done
@@ -199,210 +233,202 @@ def insertinjections(tree, lookup=[], missing=False):
     inserted = []
     for el in tree:
         if type(el) == Injection:
-            injection = _resolveinjection(el, lookup, missing)
-            injection = substituteHooks(injection, el.gethookname(), el._template)
-            inserted.extend(injection)
+            inserted.extend(_resolveinjection(el, lookup, missing))
         else:
             inserted.append(el)
     return inserted
 
-def _getWrapHead(tree):
-    wrapper, name = None, ''
-    name = tree[0].getname()
-    origin = tree.pop(0)
-    wrapper = type(origin)
-    return (wrapper, origin, name, tree)
-
-def _wrap(tree, debug_prefix=''):
-    wrapper, origin, name, tree = _getWrapHead(tree)
-    sprefix = debug_prefix + ('^' if wrapper == Inverted else '#') + name + ':'
-    if DEBUG: print('{0} started wrapping (wrapper: {1})'.format(sprefix, wrapper))
-    n, wrapped = (0, [])
-    closed = False
-    while n < len(tree):
-        el = tree[n]
-        prefix = '{0} {1}:'.format(sprefix, n)
-        i = 1
-        if type(el) in (Section, Inverted):
-            i, part = _wrap(tree[n:], debug_prefix=(prefix+' -> '))
-        else:
-            part = el
-        wrapped.append(part)
-        n += i
-        last = wrapped[-1]
-        if type(last) == Close and last.getname() == name:
-            if DEBUG: print(prefix, 'closing after {0} elements(s)'.format(n))
-            closed = True
-            n += 1
-            break
-    if DEBUG: print('{0} finished wrapping'.format(sprefix))
-    if closed:
-        final = (n, wrapper(name, wrapped[:-1]))
-    else:
-        final = (1, origin)
-    return final
-
-def assemble(tree):
-    """Returns assembled tree.
-    Assembling includes, e.g. wrapping sections into single elements.
+class ParseError(Exception):
+    """Raised when template is malformed, e.g. contains unclosed sections.
     """
-    assembled = []
-    i = 0
-    while i < len(tree):
-        el = tree[i]
-        if type(el) in [Section, Inverted, Injection]:
-            n, part = _wrap(tree[i:])
-        else:
-            part = el
-            n = 1
-        assembled.append(part)
-        i += n
-    return assembled
+    pass
+
 
-def _isspace(s, empty=False):
-    """Returns true if string contains only space (` `) characters.
+def _describe(el):
+    """Returns description of a tag used in error messages.
     """
-    ok = (True if s else empty)
-    for i in s:
-        if not ok: break
-        if i != ' ': ok = False
-    return ok
-
-def _hasfrontpadding(s, only=False):
-    """Returns (bool, cut) tuple.
-    Bool is true string has front padding and cut is the index at which padding ends.
-    Padding without newline doesn't count.
+    description = '"{0}"'.format(el.getname())
+    if el._pos is not None: description += ' at line {0}, column {1}'.format(*el._pos)
+    return description
+
+def _closing(el):
+    """Returns name of the tag closing given section.
     """
-    n = s.find('\n')
-    n = (n if n != -1 else len(s)+1)
-    rn = s.find('\r\n')
-    rn = (rn if rn != -1 else len(s)+1)
-    has, cut = False, (n if n < rn else rn)
-    if cut > 0 and _isspace(s[:cut], empty=True) or cut == 0: has = True
-    if (cut == len(s)-1 and not only) or (cut > len(s)): has = False
-    return has
-
-def sreverse(s):
-    """Reverses order of characters in string.
+    return (el.getfragment() if type(el) is Fragment else el.getname())
+
+def _report(problems, strict):
+    """Reports problems found during assembling.
     """
-    s = list(s)
-    s.reverse()
-    return ''.join(s)
+    if not problems: return
+    if strict: raise ParseError('; '.join(problems))
+    if WARN:
+        for problem in problems: warnings.warn(problem)
 
-def _hasbackpadding(s, only=False):
-    """See _hasfrontpadding().
+class _Frame:
+    """Section opened, but not yet closed, during assembling.
     """
-    return _hasfrontpadding(s=sreverse(s), only=only)
+    def __init__(self, origin, start):
+        self.origin = origin
+        self.start = start
+        # assembled nodes and indexes (in flat tree) they begin at
+        self.nodes, self.indexes = [], []
+        # offsets of nodes that may have different meaning when the section turns out to be unclosed,
+        # i.e. closing tags and injections
+        self.special = []
+
+    def append(self, el, index):
+        if type(el) in (Close, Injection): self.special.append(len(self.nodes))
+        self.nodes.append(el)
+        self.indexes.append(index)
+
+    def extend(self, frame, cut):
+        """Appends opening node of unclosed frame and the nodes it wrapped (up to `cut`).
+        """
+        self.append(frame.origin, frame.start)
+        offset = len(self.nodes)
+        self.special.extend(offset+n for n in frame.special if n < cut)
+        self.nodes.extend(frame.nodes[:cut] if cut < len(frame.nodes) else frame.nodes)
+        self.indexes.extend(frame.indexes[:cut] if cut < len(frame.indexes) else frame.indexes)
+
+
+def assemble(tree, strict=False):
+    """Returns assembled tree.
+    Assembling includes, e.g. wrapping sections into single elements.
 
-def _isstandalone(tree, index):
-    """Returns tuple containing information about whether given index in given tree is a standalone tag.
-    Returned value is a 3-tuple: (standalone, where, cut)
+    The flat list of nodes is assembled in one pass, using a stack of open sections.
+    A closing tag closes only the innermost open section, and only if the names match;
+    otherwise it stays in the tree as a node (and is reported as mismatched).
+    A section that is never closed is left in the tree as a single, empty node and the nodes that
+    followed it are assembled as if it was not there (it is reported as unclosed).
 
-    - standalone: actual info about whether the index is standalone or not,
-    - where: where to use cut (useful only for standlone tags),
-    - cut: cut to apply to a text of item (defined by `where`, useful only for standalone tags),
+    If `strict` is true, ParseError is raised for unclosed and mismatched tags.
     """
-    standalone, where, cut = False, '', 0
-    if type(tree[index]) not in [Section, Close, Inverted]: return (standalone, where, cut)
-    prev = (tree[index-1] if index > 0 else None)
-    next = (tree[index+1] if index < len(tree)-1 else None)
-    report = ''
-    report += '[{0}, {1}] '.format(str(type(prev))[8:-2], str(type(next))[8:-2])
-    report += 'index: {0} and object: {1} '.format(index, tree[index])
-    if type(prev) is TextNode and type(next) is TextNode:
-        text = next._text
-        for i in range(len(text)):
-            if text[i] not in [' ', '\n']:
-                break
-            if text[i] == '\n':
-                standalone, where, cut = True, 'next', i+1
-                break
-        if not _hasbackpadding(prev._text) and not _hasfrontpadding(next._text):
-            standalone = False
-        if not _hasbackpadding(prev._text):
-            standalone = False
-        if not _hasfrontpadding(next._text):
-            standalone = False
-        if (tree[index].inline() if type(tree[index]) in [Section, Inverted] else True):
-            standalone = False
-        #if (prev._text[-1] != '\n' if prev._text else False) and not _hasbackpadding(prev._text): #_isspace(prev._text[prev._text.rfind('\n'):]):
-        #    if QUICKTEST: print('[{0}] standalone = false; (newline not in last index of preceding text node: {1})'.format(index, repr(prev._text)))
-        #    standalone = False
-        if index == 1 and _isspace(prev._text) and _hasfrontpadding(next._text):
-            if QUICKTEST: print('[{0}] standalone = true; (node is preceded only by indentation)'.format(index))
-            standalone = True
-            where = 'next,empty.prev'
-        #if '\n' not in prev._text and (tree[index].inline() if type(tree[index]) in [Section, Inverted] else True):
-        #    standalone = False
-        if (prev._text[-1] == '\n' if prev._text else False) and (next._text[0] == '\n' if next._text else False):
-            standalone = True
-        if _hasbackpadding(prev._text) and _hasfrontpadding(next._text):
+    assembled, problems = _assemble(tree)
+    _report(problems, strict)
+    return assembled
+
+def _assemble(tree):
+    """Assembles tree and returns tuple (assembled tree, list of problems found).
+    """
+    assembled = []
+    stack = []
+    # sections that were already assembled (keyed by index of opening node, values are (index after closing node, node)),
+    # and opening nodes that were found to be unclosed
+    closed, unclosed = {}, set()
+    # closing tags that did not close any section (keyed by index)
+    mismatched = {}
+    # index of the last closing tag for every name; sections opened after it cannot be closed
+    last = {}
+    for i, el in enumerate(tree):
+        if type(el) is Close: last[el.getname()] = i
+    problems = []
+    i = 0
+    while i < len(tree) or stack:
+        if i == len(tree):
+            frame = stack.pop()
+            unclosed.add(frame.start)
+            if not frame.origin.assembled: problems.append('unclosed section: {0}'.format(_describe(frame.origin)))
+            # nodes wrapped in unclosed section belong to its parent, up to the first
+            # node that has different meaning at parent's level: a tag closing the parent, or
+            # an injection (which opens a section only at top level)
+            cut = len(frame.nodes)
+            for n in frame.special:
+                el = frame.nodes[n]
+                if (type(el) is Close and stack and el.getname() == _closing(stack[-1].origin)) or (type(el) is Injection and not stack):
+                    cut = n
+                    break
+            if stack:
+                stack[-1].extend(frame, cut)
+            else:
+                assembled.append(frame.origin)
+                assembled.extend(frame.nodes[:cut])
+            i = (frame.indexes[cut] if cut < len(frame.nodes) else len(tree))
+            continue
+        el = tree[i]
+        openers = ((Section, Inverted, Fragment) if stack else (Section, Inverted, Fragment, Injection))
+        if type(el) in openers and i in closed:
+            after, el = closed[i]
+        elif type(el) in openers and i not in unclosed and last.get(_closing(el), -1) > i:
+            stack.append(_Frame(el, i))
+            i += 1
+            continue
+        elif stack and type(el) is Close and el.getname() == _closing(stack[-1].origin):
+            mismatched.pop(i, None)
+            frame = stack.pop()
+            el = type(frame.origin)(frame.origin.getname(), frame.nodes)
+            el.assembled = True
+            el._pos = frame.origin._pos
+            closed[frame.start] = (i+1, el)
+            i, after = frame.start, i+1
+        else:
+            if type(el) is Close:
+                mismatched[i] = el
+            elif type(el) in openers and i not in unclosed:
+                unclosed.add(i)
+                if not el.assembled: problems.append('unclosed section: {0}'.format(_describe(el)))
+            after = i+1
+        if stack: stack[-1].append(el, i)
+        else: assembled.append(el)
+        i = after
+    for i in sorted(mismatched): problems.append('mismatched closing tag: {0}'.format(_describe(mismatched[i])))
+    return (assembled, problems)
+
+# tags that may stand alone on a line, in which case the whole line is removed from template
+STANDALONE = (Section, Inverted, Fragment, Injection, Close, Comment)
+
+
+def _isstandalone(line):
+    """Returns true if given line (list of nodes, not including the newline ending it) is standalone, i.e.
+    contains at least one tag that may stand alone and nothing else except whitespace.
+    """
+    standalone = False
+    for el in line:
+        if type(el) is TextNode:
+            if el._text.strip(' \t'): return False
+        elif type(el) in STANDALONE:
             standalone = True
-            where = 'both'
-    elif prev is None and type(next) is TextNode:
-        report += '(appears to be the first element) '
-        text = next._text
-        for i in range(len(text)):
-            if text[i] not in [' ', '\n']:
-                break
-            if text[i] == '\n':
-                standalone, where, cut = True, 'next', i+1
-                break
-    elif type(prev) is TextNode and next is None:
-        report += '(appears to be the last element) '
-        text = prev._text
-        for i in range(1, len(text)):
-            i = -i
-            if text[i] not in [' ', '\n']:
-                break
-            if text[i] == '\n':
-                standalone, where, cut = True, 'prev', i
-                break
-    if QUICKTEST and standalone: print(report + ('standalone' if standalone else ''))
-    return (standalone, where, cut)
+        else:
+            return False
+    return standalone
+
+def _cleanline(line):
+    """Cleans single line of nodes (including the newline ending it, if any) the same way `clean()` does.
+    """
+    body, end = ((line[:-1], line[-1:]) if (line and type(line[-1]) is Newline) else (line, []))
+    if _isstandalone(body): return [el for el in body if type(el) in STANDALONE and type(el) is not Comment]
+    return [el for el in body if type(el) is not Comment] + end
 
 def clean(tree):
-    """Cleans tree from unneeded whitespace, newlines etc.
+    """Cleans flat list of nodes from unneeded whitespace, newlines etc.
     Call it eye-candy for code.
+
+    Lines containing only standalone tags (sections, closing tags, comments) and whitespace
+    are removed from the template, with exception of the tags.
+    Comments are removed from the tree.
+    Works in a single pass over the nodes, and does not modify them.
     """
-    cleaned = []
-    i = 0
-    while i < len(tree):
-        item = tree[i]
-        next = (tree[i+1] if i < len(tree)-1 else None)
-        prev = (tree[i-1] if i > 0 else None)
-        standalone, where, cut = _isstandalone(tree, i)
-        if standalone:
-            if where == 'prev':
-                if QUICKTEST: print('prev:', repr(prev._text), end=' -> ')
-                prev._text = prev._text[:cut]
-                if QUICKTEST: print(repr(prev._text))
-            elif where == 'next,empty.prev':
-                if QUICKTEST: print('next (with emptying prev):', repr(next._text), end=' -> ')
-                next._text = next._text[cut:]
-                prev._text = ''
-                if QUICKTEST: print(repr(next._text))
-            elif where == 'empty.prev':
-                prev._text = ''
-            elif where == 'both':
-                prev._text = prev._text.rstrip() + '\n'
-                next._text = next._text.lstrip()
-            else:
-                if QUICKTEST: print('next:', repr(next._text), end=' -> ')
-                next._text = next._text[cut:]
-                if QUICKTEST: print(repr(next._text))
-        cleaned.append(item)
-        i += 1
-    return cleaned
-
-def parse(template, lookup=[]):
-    curr = rawparse(template)
-    final = []
-    while True:
-        next = assemble(clean(curr))
-        next = insertinjections(next, lookup)
-        if curr == next:
-            final = next
-            break
-        curr = next
-    return final
+    cleaned, line = [], []
+    for el in tree:
+        if type(el) is not Newline:
+            line.append(el)
+            continue
+        if _isstandalone(line):
+            cleaned.extend(node for node in line if type(node) in STANDALONE)
+        else:
+            cleaned.extend(line)
+            cleaned.append(el)
+        line = []
+    if _isstandalone(line): line = [node for node in line if type(node) in STANDALONE]
+    cleaned.extend(line)
+    return [el for el in cleaned if type(el) is not Comment]
+
+def parse(template, lookup=(), missing=False, strict=False):
+    """Parses template into assembled tree of nodes with injections inserted.
+
+    :param template: string containing Mustache template
+    :param lookup: list of directories in which lookup for injections should be done
+    :param missing: whether to allow missing injections or not
+    :param strict: whether to raise ParseError for unclosed and mismatched tags
+    """
+    tree = assemble(clean(rawparse(template)), strict)
+    return insertinjections(tree, lookup, missing)
@@ -0,0 +1,184 @@
+"""This module contains on-disk format of precompiled templates.
+
+Precompiled file holds parse trees, generated sources and compiled code of all templates found in
+given directories, so short-lived processes do not have to parse and compile them at startup.
+
+File format:
+
+    MUSPYCHE\n
+    <header: JSON object with format version, Python cache tag and SHA-256 checksum of payload>\n
+    <payload: pickled dictionary>
+
+Payload maps absolute paths of template files to (mtime, size, tree, source, marshalled code) tuples.
+Templates are used only if mtime and size of their files still match, stale ones are
+parsed from source again.
+Code objects are used only by the Python version that wrote them, other versions
+compile templates from the stored trees.
+"""
+
+import hashlib
+import json
+import marshal
+import os
+import pickle
+import sys
+import threading
+import warnings
+
+from . import cache
+from . import compiler
+from . import parser
+from . import util
+from .models import Injection
+
+
+MAGIC = b'MUSPYCHE\n'
+
+# version of the format, bumped on every incompatible change
+VERSION = 2
+
+# suffix of template files gathered by `write()`
+SUFFIX = '.mustache'
+
+
+class FormatError(Exception):
+    """Raised when precompiled file is damaged or written in unsupported version of the format.
+    """
+    pass
+
+
+def find(directories, suffix=SUFFIX):
+    """Returns absolute paths of templates found (recursively) in given directories.
+    """
+    found = []
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            found.extend(os.path.abspath(os.path.join(root, name)) for name in sorted(files) if name.endswith(suffix))
+    return found
+
+
+def _hasinjections(tree):
+    return any(type(el) is Injection for el in tree)
+
+
+def write(directories, output, suffix=SUFFIX):
+    """Precompiles templates found in given directories and writes them to `output` file.
+
+    Templates using injections are not precompiled (freshness of injected files could not be
+    checked when loading) and are always parsed from source.
+    Returns tuple (number of written templates, list of paths of skipped templates).
+    """
+    templates, skipped = {}, []
+    for path in find(directories, suffix):
+        stamp = util.stamp(path)
+        tree = parser.assemble(parser.clean(parser.rawparse(util.read(path))))
+        if _hasinjections(tree):
+            skipped.append(path)
+            continue
+        template = compiler.Template(tree)
+        templates[path] = (stamp[0], stamp[1], template.gettree(), template.getsource(), marshal.dumps(template._code))
+    payload = pickle.dumps(templates, protocol=pickle.HIGHEST_PROTOCOL)
+    header = {'version': VERSION, 'cache_tag': sys.implementation.cache_tag, 'checksum': hashlib.sha256(payload).hexdigest()}
+    with open(output, 'wb') as ofstream:
+        ofstream.write(MAGIC)
+        ofstream.write(json.dumps(header).encode('utf-8') + b'\n')
+        ofstream.write(payload)
+    return (len(templates), skipped)
+
+
+def read(path):
+    """Reads precompiled file and returns Artifact with its templates.
+    FormatError is raised if the file is damaged or written in another version of the format.
+    """
+    with open(path, 'rb') as ifstream:
+        if ifstream.readline() != MAGIC: raise FormatError('not a precompiled templates file: {0}'.format(path))
+        try:
+            header = json.loads(ifstream.readline().decode('utf-8'))
+        except ValueError:
+            raise FormatError('damaged header of precompiled templates file: {0}'.format(path))
+        payload = ifstream.read()
+    if header.get('version') != VERSION:
+        raise FormatError('unsupported version of precompiled templates file: {0}: {1}'.format(path, header.get('version')))
+    if hashlib.sha256(payload).hexdigest() != header.get('checksum'):
+        raise FormatError('checksum mismatch in precompiled templates file: {0}'.format(path))
+    return Artifact(pickle.loads(payload), usecode=(header.get('cache_tag') == sys.implementation.cache_tag))
+
+
+class Artifact:
+    """Class representing templates read from precompiled file.
+    """
+    def __init__(self, templates, usecode=True):
+        self._templates = templates
+        self._usecode = usecode
+        # compiled templates already restored from the file
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._templates)
+
+    def __contains__(self, path):
+        return os.path.abspath(path) in self._templates
+
+    def _entry(self, path, stamp):
+        """Returns entry for template at given path, or None if
+        it is not in the file or is stale.
+        """
+        entry = self._templates.get(os.path.abspath(path))
+        if entry is None or stamp is None or (entry[0], entry[1]) != tuple(stamp): return None
+        return entry
+
+    def tree(self, path, stamp=None):
+        """Returns parse tree of template at given path, or None if it is not available or is stale.
+        If `stamp` is not given, it is taken from the file.
+        """
+        entry = self._entry(path, (util.stamp(path) if stamp is None else stamp))
+        return (entry[2] if entry is not None else None)
+
+    def template(self, path, stamp=None):
+        """Returns compiled template at given path, or None if it is not available or is stale.
+        If `stamp` is not given, it is taken from the file.
+        """
+        entry = self._entry(path, (util.stamp(path) if stamp is None else stamp))
+        if entry is None: return None
+        key = os.path.abspath(path)
+        with self._lock:
+            if self._compiled.get(key, (None,))[0] is not entry:
+                _, _, tree, source, code = entry
+                if self._usecode:
+                    template = compiler.Template(tree, source, marshal.loads(code))
+                else:
+                    template = compiler.Template(tree)
+                self._compiled[key] = (entry, template)
+            return self._compiled[key][1]
+
+    def load(self, path):
+        """Returns compiled template at given path; if it is not available from precompiled file or
+        is stale it is parsed and compiled from source.
+        """
+        template = self.template(path)
+        return (template if template is not None else compiler.Template(parser.parse(util.read(path))))
+
+
+def install(path):
+    """Makes partial caches (`cache.partials` and `compiler.partials`) use templates from
+    precompiled file.
+    Returns installed Artifact, or None if the file cannot be used (a warning is issued then and
+    templates are parsed from source as usual).
+    """
+    try:
+        artifact = read(path)
+    except (OSError, FormatError, pickle.UnpicklingError) as e:
+        warnings.warn('cannot use precompiled templates: {0}'.format(e))
+        return None
+    cache.partials.precompiled = artifact.tree
+    compiler.partials.precompiled = artifact.template
+    return artifact
+
+
+def uninstall():
+    """Makes partial caches stop using precompiled templates.
+    """
+    cache.partials.precompiled = None
+    compiler.partials.precompiled = None
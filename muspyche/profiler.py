@@ -0,0 +1,156 @@
+"""This module contains profiling renderer of Muspyche.
+
+Profiling renderer renders the same output as `renderer.render()` but measures time spent on
+every node and maps it back to lines of template (and partial) sources.
+It is a separate renderer, so normal rendering does not pay anything for profiling.
+
+Usage:
+
+    profiler = Profiler()
+    output = profiler.make(template, context, lookup)
+    print(profiler.report())
+    with open('template.folded', 'w') as ofstream: ofstream.write(profiler.collapsed())
+"""
+
+import time
+
+from . import cache
+from . import renderer
+from . import resolver
+from .context import ContextStack
+from .models import *
+
+
+def _describe(el):
+    """Returns short description of a node used in reports.
+    """
+    if type(el) is Variable: return '{{{{{0}{1}}}}}'.format(('' if el._escaped else '&'), el._key)
+    if type(el) is Section: return '{{{{#{0}}}}}'.format(el.getname())
+    if type(el) is Inverted: return '{{{{^{0}}}}}'.format(el.getname())
+    if type(el) is Fragment: return '{{{{*{0}}}}}'.format(el.getname())
+    if type(el) is Partial: return '{{{{>{0}}}}}'.format(el.getpath())
+    if type(el) is Newline: return 'newline'
+    return 'text'
+
+
+class Profiler:
+    """Class collecting profile of rendered templates.
+
+    Statistics are kept per (file, line) of template source and per partial file, and
+    accumulate over all renders done with the profiler.
+    Times are measured with `time.perf_counter()`.
+    """
+    def __init__(self, timer=time.perf_counter):
+        self._timer = timer
+        # (file, line) -> [calls, self time, cumulative time, output bytes]
+        self.lines = {}
+        # partial file -> [calls, self time, cumulative time, output bytes]
+        self.partials = {}
+        # stack of frames (tuple of strings) -> self time
+        self.stacks = {}
+        # time spent in children of nodes being rendered
+        self._children = []
+        # (file, line) pairs of nodes being rendered, used to not count time of nested nodes twice
+        self._active = {}
+
+    def _record(self, stats, key, selftime, elapsed, size, nested):
+        entry = stats.get(key)
+        if entry is None: entry = stats[key] = [0, 0.0, 0.0, 0]
+        entry[0] += 1
+        entry[1] += selftime
+        if not nested: entry[2] += elapsed
+        entry[3] += size
+
+    def _render(self, tree, context, lookup, missing, newline, name, stack):
+        out = []
+        for el in tree:
+            key = (name, (el._pos[0] if el._pos is not None else 0))
+            frame = '{0}:{1} {2}'.format(key[0], key[1], _describe(el)).replace(';', ',')
+            stack.append(frame)
+            nested = self._active.get(key, 0) > 0
+            self._active[key] = self._active.get(key, 0) + 1
+            self._children.append(0.0)
+            start = self._timer()
+            produced = 0
+            if type(el) in (Section, Inverted):
+                generator = (renderer.section if type(el) is Section else renderer.inverted)
+                for _ in generator(context, el.getname()):
+                    out.append(self._render(el._template, context, lookup, missing, newline, name, stack))
+            elif type(el) is Fragment:
+                out.append(renderer.fragment(context, el.getname(), newline, lambda: self._render(el._template, context, lookup, missing, newline, name, stack), renderer.digest(el._template), lookup))
+            elif type(el) is Partial:
+                found, path = resolver.get(lookup).resolve(el.getpath(), missing)
+                path = (path if found else el.getpath())
+                partial = cache.partials.get(el.getpath(), lookup, missing)
+                # recursive partials are counted only once in cumulative time
+                nestedpartial = self._active.get((path, None), 0) > 0
+                self._active[(path, None)] = self._active.get((path, None), 0) + 1
+                partialstart = self._timer()
+                rendered = self._render(partial, context, lookup, missing, newline, path, stack)
+                self._record(self.partials, path, 0.0, self._timer() - partialstart, len(rendered.encode('utf-8')), nestedpartial)
+                self._active[(path, None)] -= 1
+                out.append(rendered)
+            else:
+                engine = renderer.Engine(el)
+                rendered = (el.render(engine, newline) if type(el) is Newline else el.render(engine=engine, context=context))
+                produced = len(rendered.encode('utf-8'))
+                out.append(rendered)
+            elapsed = self._timer() - start
+            children = self._children.pop()
+            if self._children: self._children[-1] += elapsed
+            selftime = elapsed - children
+            self._record(self.lines, key, selftime, elapsed, produced, nested)
+            self.stacks[tuple(stack)] = self.stacks.get(tuple(stack), 0.0) + selftime
+            self._active[key] -= 1
+            stack.pop()
+        return ''.join(out)
+
+    def render(self, tree, context, lookup, missing=False, newline=None, name='<template>'):
+        """Renders tree like `renderer.render()` does, collecting profile.
+        `name` is used as file name of the template in reports.
+        """
+        return self._render(tree, context, lookup, missing, newline, name, [])
+
+    def make(self, template, context, lookup=(), missing=False, name='<template>'):
+        """Renders template like `api.make()` does, collecting profile.
+        """
+        lookup = resolver.get(lookup)
+        parsed = cache.templates.get(template, lookup, missing)
+        return self.render(parsed, ContextStack(context), lookup, missing, name=name)
+
+    def stats(self):
+        """Returns collected statistics as a dictionary with `lines` and `partials` lists.
+        """
+        # self time of a partial is the sum of self times of its lines
+        partials = {}
+        for (name, line), (calls, selftime, cumulative, size) in self.lines.items():
+            if name in self.partials: partials[name] = partials.get(name, 0.0) + selftime
+        lines = [{'file': name, 'line': line, 'calls': calls, 'self': selftime, 'cumulative': cumulative, 'bytes': size}
+                 for (name, line), (calls, selftime, cumulative, size) in sorted(self.lines.items())]
+        files = [{'file': name, 'calls': calls, 'self': partials.get(name, 0.0), 'cumulative': cumulative, 'bytes': size}
+                 for name, (calls, selftime, cumulative, size) in sorted(self.partials.items())]
+        return {'lines': lines, 'partials': files}
+
+    def report(self, sort='cumulative', limit=None):
+        """Returns profile formatted as a text table, sorted by given column (descending).
+        """
+        stats = self.stats()
+        rows = ['{0:>8} {1:>10} {2:>10} {3:>10}  {4}'.format('calls', 'self', 'cumulative', 'bytes', 'file:line')]
+        for entry in sorted(stats['lines'], key=lambda entry: entry[sort], reverse=True)[:limit]:
+            rows.append('{0:>8} {1:>10.6f} {2:>10.6f} {3:>10}  {4}:{5}'.format(entry['calls'], entry['self'], entry['cumulative'], entry['bytes'], entry['file'], entry['line']))
+        if stats['partials']:
+            rows.append('')
+            rows.append('{0:>8} {1:>10} {2:>10} {3:>10}  {4}'.format('calls', 'self', 'cumulative', 'bytes', 'partial'))
+            for entry in sorted(stats['partials'], key=lambda entry: entry[sort], reverse=True)[:limit]:
+                rows.append('{0:>8} {1:>10.6f} {2:>10.6f} {3:>10}  {4}'.format(entry['calls'], entry['self'], entry['cumulative'], entry['bytes'], entry['file']))
+        return '\n'.join(rows)
+
+    def collapsed(self):
+        """Returns profile in collapsed stack format (one `frame;frame;frame microseconds` line per stack),
+        accepted by flame graph tools.
+        """
+        lines = []
+        for stack, selftime in sorted(self.stacks.items()):
+            microseconds = int(round(selftime * 1e6))
+            if microseconds > 0: lines.append('{0} {1}'.format(';'.join(stack), microseconds))
+        return '\n'.join(lines) + ('\n' if lines else '')
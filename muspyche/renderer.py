@@ -1,8 +1,13 @@
 """This module holds the rendering code for Muspyche.
 """
 
+import asyncio
+import hashlib
+import itertools
+
+from . import cache
 from . import util
-from . import parser
+from .context import CACHE_SIZE, PLAIN, ismapping, reads, streamable
 from .models import *
 
 
@@ -44,37 +49,34 @@ class NewlineEngine(TextNode):
 
 
 class SectionEngine(BaseEngine):
+    def iterate(self, context, lookup, missing, newline):
+        """Yields chunks of rendered section.
+        """
+        outputs = context._outputs
+        for _ in section(context, self._el.getname()):
+            if outputs is None: yield from render_iter(self._el._template, context, lookup, missing, newline)
+            else: yield memoized(outputs, self._el, self._el.getname(), self._el._template, context, lookup, missing, newline)
+
     def render(self, context, lookup, missing, newline):
-        s = ''
-        name = self._el.getname()
-        context.adjust(name)
-        if context.current() == False or context.current() == []:
-            pass
-        elif type(context.current()) == list and len(context.current()) > 0:
-            listed = context.current()
-            for i in range(len(listed)):
-                context.adjust('[{}]'.format(i))
-                s += render(self._el._template, context, lookup, missing, newline)
-                context.restore()
-        elif type(context.current()) == dict:
-            s = render(self._el._template, context, lookup, missing, newline)
-        elif type(context.current()) is bool and context.current() == True:
-            s = render(self._el._template, context, lookup, missing, newline)
-        elif bool(context.current()) == False:
-            pass
-        else:
-            raise TypeError('invalid type for context: expected list or dict but got {0}'.format(type(context.current())))
-        context.restore()
-        return s
+        return ''.join(self.iterate(context, lookup, missing, newline))
 
 
 class InvertedEngine(SectionEngine):
+    def iterate(self, context, lookup, missing, newline):
+        outputs = context._outputs
+        for _ in inverted(context, self._el.getname()):
+            if outputs is None: yield from render_iter(self._el._template, context, lookup, missing, newline)
+            else: yield memoized(outputs, self._el, self._el.getname(), self._el._template, context, lookup, missing, newline)
+
+
+class FragmentEngine(BaseEngine):
+    """Engine used to render fragments, whose output is cached (see `fragment()`).
+    """
+    def iterate(self, context, lookup, missing, newline):
+        yield self.render(context, lookup, missing, newline)
+
     def render(self, context, lookup, missing, newline):
-        s = ''
-        context.adjust(self._el.getname())
-        if context.current() == False or context.current() == [] or context.current() == '': s = render(self._el._template, context, lookup, missing, newline)
-        context.restore()
-        return s
+        return fragment(context, self._el.getname(), newline, lambda: render(self._el._template, context, lookup, missing, newline), digest(self._el._template), lookup)
 
 
 class PartialEngine(BaseEngine):
@@ -82,14 +84,123 @@ class PartialEngine(BaseEngine):
     """
     def resolve(self, lookup, missing):
         """Resolves partial.
+        Parsed partials are taken from `cache.partials`.
         """
-        found, path = parser._findpath(self._el.getpath(), lookup, missing)
-        template = parser.parse((util.read(path) if found else ''))
-        self._el._template = template
+        self._template = cache.partials.get(self._el.getpath(), lookup, missing)
         return self
 
+    def iterate(self, context, lookup, missing, newline):
+        if context._outputs is not None:
+            return iter([memoized(context._outputs, self._template, self._el.getpath(), self._template, context, lookup, missing, newline)])
+        return render_iter(self._template, context, lookup, missing, newline)
+
     def render(self, context, lookup, missing, newline):
-        return render(self._el._template, context, lookup, missing, newline)
+        return render(self._template, context, lookup, missing, newline)
+
+
+def section(context, name):
+    """Generator adjusting context for rendering of a section.
+    It yields once for every time the body of the section should be rendered, with
+    context adjusted to the right element.
+    Iterables other than lists (e.g. generators) are consumed one item at a time, without copying them into lists.
+    """
+    context.adjust(name)
+    if context.current() == False or context.current() == []:
+        pass
+    elif type(context.current()) == list and len(context.current()) > 0:
+        listed = context.current()
+        for i in range(len(listed)):
+            context.adjust('[{}]'.format(i))
+            yield i
+            context.restore()
+    elif ismapping(context.current()):
+        yield None
+    elif type(context.current()) is bool and context.current() == True:
+        yield None
+    elif bool(context.current()) == False:
+        pass
+    elif streamable(context.current()):
+        # other iterables (e.g. generators) are consumed one item at a time
+        for i, item in enumerate(context.peek(context.current())[1]):
+            if type(item) not in PLAIN: item = context._resolve(item)
+            context.push(item, '[{}]'.format(i))
+            yield i
+            context.restore()
+    else:
+        raise TypeError('invalid type for context: expected list or dict but got {0}'.format(type(context.current())))
+    context.restore()
+
+
+def inverted(context, name):
+    """Generator adjusting context for rendering of an inverted section.
+    It yields once if the body of the section should be rendered.
+    """
+    context.adjust(name)
+    if context.current() == False or context.current() == [] or context.current() == '': yield None
+    # iterators are peeked at, so an empty generator renders the inverted section too
+    elif type(context.current()) not in PLAIN and streamable(context.current()) and context.peek(context.current())[0]: yield None
+    context.restore()
+
+
+# parsed names of fragments: name -> (fragment name, keys, ttl)
+_fragments = {}
+
+# digests of bodies of fragments: id of the body -> (body, digest)
+_digests = {}
+
+def _serialize(tree, out):
+    for el in tree:
+        out.append(type(el).__name__)
+        for cls in type(el).__mro__:
+            for slot in getattr(cls, '__slots__', ()):
+                if slot not in ('_pos', '_template', 'assembled'): out.append(repr(getattr(el, slot, None)))
+        if isinstance(el, Section):
+            out.append('[')
+            _serialize(el._template, out)
+            out.append(']')
+
+def digest(tree):
+    """Returns hex digest of given tree (body of a fragment), equal for trees parsed from the same source.
+    Digests are part of keys of stored fragments, so fragments with the same name in different templates
+    (or in different versions of a template) do not share output.
+    """
+    known = _digests.get(id(tree))
+    if known is not None and known[0] is tree: return known[1]
+    out = []
+    _serialize(tree, out)
+    digested = hashlib.sha1('\x1f'.join(out).encode('utf-8')).hexdigest()
+    if len(_digests) >= CACHE_SIZE: _digests.clear()
+    _digests[id(tree)] = (tree, digested)
+    return digested
+
+def _escaper(escape):
+    """Returns name identifying escaping function in keys of stored fragments.
+    Functions without a module-level name (e.g. lambdas) are told apart by their identity.
+    """
+    name = '{0}.{1}'.format(getattr(escape, '__module__', None), getattr(escape, '__qualname__', type(escape).__qualname__))
+    return (name if '<' not in name else '{0}#{1}'.format(name, id(escape)))
+
+def fragment(context, name, newline, render, body='', lookup=()):
+    """Returns output of fragment with given name (see `models.Fragment`) rendered in current context.
+    Output is taken from fragment store of the context (`cache.fragments` by default) if it is there;
+    otherwise it is rendered by calling `render()` and stored.
+    Stored output is keyed by name of the fragment, digest of its body (see `digest()`), lookup directories,
+    escaping function of the context and values of its keys.
+    Partials used by the body are not part of the key; stores are cleared by `watcher.Watcher` when files change.
+    """
+    spec = _fragments.get(name)
+    if spec is None:
+        if len(_fragments) >= CACHE_SIZE: _fragments.clear()
+        el = Fragment(name, [])
+        spec = _fragments[name] = (el.getfragment(), el.getkeys(), el.getttl())
+    key = '\x1f'.join([spec[0], body, '\x1e'.join(lookup), _escaper(context._escape)] + [str(context.get(each, escape=False)) for each in spec[1]] + ([] if newline is None else [newline]))
+    store = (cache.fragments if context._fragments is None else context._fragments)
+    output = store.get(key)
+    if output is None:
+        output = render()
+        # output rendered while awaitables are pending is incomplete
+        if not context._pending: store.set(key, output, spec[2])
+    return output
 
 
 def Engine(element):
@@ -110,19 +221,193 @@ def Engine(element):
         engine = InvertedEngine
     elif type(element) == Partial:
         engine = PartialEngine
+    elif type(element) == Fragment:
+        engine = FragmentEngine
     else:
         raise TypeError('no suitable rendering engine for type {0} found'.format(type(element)))
     return engine
 
 
+def render_iter(tree, context, lookup, missing=False, newline=None):
+    """Renders raw list of nodes, yielding chunks of output as the tree is walked.
+    """
+    for el in tree:
+        engine = Engine(el)
+        if type(el) in [Section, Inverted, Fragment]: yield from engine(el).iterate(context, lookup, missing, newline)
+        elif type(el) is Partial: yield from engine(el).resolve(lookup, missing).iterate(context, lookup, missing, newline)
+        elif type(el) is Newline: yield el.render(engine, newline)
+        else: yield el.render(engine=engine, context=context)
+
+
 def render(tree, context, lookup, missing=False, newline=None):
     """Renders string from raw list of nodes.
     """
-    s = ''
+    return ''.join(render_iter(tree, context, lookup, missing, newline))
+
+
+# reasons for not memoizing output, by key read from outside of current context
+REASONS = {'::': 'global', '..': 'outer'}
+
+# serial numbers of analysed trees, parts of keys of memoized output
+_serials = itertools.count()
+
+
+def _reads(tree, names, partials, lookup, missing):
+    """Adds keys of current context read by tree to `names` and (path, tree) pairs of partials used by it
+    to `partials`.
+    Returns reason for not memoizing output of the tree if it reads other contexts than the current one, None otherwise.
+    """
     for el in tree:
-        engine = Engine(el)
-        if type(el) in [Section, Inverted]: s += el.render(engine=engine, context=context, lookup=lookup, missing=missing, newline=newline)
-        elif type(el) is Partial: s += el.render(engine=engine, context=context, lookup=lookup, missing=missing, newline=newline)
-        elif type(el) is Newline: s += el.render(engine, newline)
-        else: s += el.render(engine=engine, context=context)
-    return s
+        if type(el) is Variable:
+            name = reads(el._key)
+        elif type(el) in (Section, Inverted):
+            name = reads(el.getname(), section=True)
+            # keys read by nested sections belong to their own contexts
+            reason = _reads(el._template, set(), partials, lookup, missing)
+            if reason is not None: return reason
+        elif type(el) is Fragment:
+            # fragments are rendered in the current context
+            reason = _reads(el._template, names, partials, lookup, missing)
+            if reason is not None: return reason
+            for each in el.getkeys():
+                name = reads(each)
+                if name in REASONS: return REASONS[name]
+                names.add(name)
+            continue
+        elif type(el) is Partial:
+            if any(path == el.getpath() for path, loaded in partials): continue
+            loaded = cache.partials.get(el.getpath(), lookup, missing)
+            partials.append((el.getpath(), loaded))
+            reason = _reads(loaded, names, partials, lookup, missing)
+            if reason is not None: return reason
+            continue
+        else:
+            continue
+        if name in REASONS: return REASONS[name]
+        names.add(name)
+    return None
+
+def _analyse(outputs, obj, tree, lookup, missing):
+    """Returns tuple (obj, serial, keys read by tree or None if whole context is read, reason for not memoizing it, partials).
+    Analyses are kept in `outputs` until partials used by the tree are reloaded.
+    """
+    key = (id(obj), tuple(lookup), bool(missing))
+    analysis = outputs.analyses.get(key)
+    if analysis is not None and analysis[0] is obj and all(cache.partials.get(path, lookup, missing) is loaded for path, loaded in analysis[4]):
+        return analysis
+    names, partials = set(), []
+    reason = _reads(tree, names, partials, lookup, missing)
+    analysis = (obj, next(_serials), (None if '.' in names else tuple(sorted(names))), reason, tuple(partials))
+    if len(outputs.analyses) >= CACHE_SIZE: outputs.analyses.clear()
+    outputs.analyses[key] = analysis
+    return analysis
+
+def _fingerprint(value):
+    t = type(value)
+    if t is str or t is int or t is bool or t is util.SafeString or value is None: return (t, value)
+    if t is float: return (t, repr(value))
+    if t is dict or t is list:
+        fingerprints = []
+        for item in (value.items() if t is dict else enumerate(value)):
+            each = _fingerprint(item[1])
+            if each is None: return None
+            fingerprints.append((item[0], each))
+        return (t, tuple(fingerprints))
+    return None
+
+def fingerprint(value, names=None):
+    """Returns hashable fingerprint of a value of context (or of given keys of it, if the value is a dictionary).
+    Values with equal fingerprints render the same output.
+    Returns None if value holds objects that cannot be fingerprinted (e.g. callables or objects of other classes).
+    """
+    if names is None or not ismapping(value): return _fingerprint(value)
+    fingerprints = []
+    for name in names:
+        each = (_fingerprint(value[name]) if name in value else ())
+        if each is None: return None
+        fingerprints.append(each)
+    return (None, tuple(fingerprints))
+
+def memoized(outputs, obj, name, tree, context, lookup, missing=False, newline=None):
+    """Renders tree (body of section or partial `obj`, named `name`) in current context, reusing output stored in
+    `outputs` cache if the tree was already rendered in a context with equal values of keys it reads.
+    """
+    analysis = _analyse(outputs, obj, tree, lookup, missing)
+    reason = analysis[3]
+    if reason is None and context._global_lookup: reason = 'global'
+    if reason is None:
+        fingerprinted = fingerprint(context.current(), analysis[2])
+        if fingerprinted is None: reason = 'unhashable'
+    if reason is not None:
+        outputs.skip(name, reason)
+        return render(tree, context, lookup, missing, newline)
+    key = (analysis[1], fingerprinted, context._escape, newline)
+    output = outputs.get(key)
+    if output is None: output = outputs.put(key, render(tree, context, lookup, missing, newline))
+    return output
+
+
+def render_to(fileobj, tree, context, lookup, missing=False, newline=None, buffersize=util.BUFFER_SIZE, encoding='utf-8'):
+    """Renders raw list of nodes into a file object.
+    Output is written in pieces of about `buffersize` characters so that
+    it is never held in memory as a whole.
+    Both text and binary streams are accepted, output written to binary ones is
+    encoded using given encoding.
+
+    Returns number of characters rendered.
+    """
+    writer = util.Writer(fileobj, buffersize, encoding)
+    for chunk in render_iter(tree, context, lookup, missing, newline):
+        writer.write(chunk)
+    writer.flush()
+    return writer.written
+
+
+def _partials(tree):
+    """Yields paths of partials used in a tree.
+    """
+    for el in tree:
+        if type(el) is Partial: yield el.getpath()
+        elif type(el) in (Section, Inverted, Fragment): yield from _partials(el._template)
+
+
+async def preload(tree, lookup, missing=False, partials=None):
+    """Loads partials used by a tree (and partials used by them) in executor threads, so
+    rendering does not block event loop reading them from disk.
+    Partials are loaded into `cache.partials` and, if given, also into `partials` cache.
+    """
+    loop = asyncio.get_running_loop()
+    loaded, paths = set(), set(_partials(tree))
+    while paths:
+        loaded.update(paths)
+        trees = await asyncio.gather(*[loop.run_in_executor(None, cache.partials.get, path, lookup, missing) for path in paths])
+        paths = set(path for each in trees for path in _partials(each)) - loaded
+    if partials is not None:
+        await asyncio.gather(*[loop.run_in_executor(None, partials.get, path, lookup, missing) for path in loaded])
+
+
+async def awaiting(context, render):
+    """Calls `render` until it completes without reaching awaitables that were not awaited yet, and
+    returns its result.
+    Every pass awaits (concurrently) all awaitables it reached, and their results are
+    used by the next one.
+    """
+    context._awaited, context._pending = {}, {}
+    try:
+        while True:
+            output = render()
+            if not context._pending: return output
+            pending, context._pending = list(context._pending.values()), {}
+            results = await asyncio.gather(*pending)
+            for awaitable, result in zip(pending, results):
+                context._awaited[id(awaitable)] = (awaitable, result)
+    finally:
+        context._awaited, context._pending = None, None
+
+
+async def render_async(tree, context, lookup, missing=False, newline=None):
+    """Renders string from raw list of nodes, awaiting awaitable values of context when
+    they are reached.
+    """
+    await preload(tree, lookup, missing)
+    return await awaiting(context, lambda: render(tree, context, lookup, missing, newline))
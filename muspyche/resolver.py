@@ -0,0 +1,157 @@
+"""This module contains resolver finding files of partials and injections in lookup directories.
+
+Instead of probing the filesystem for every possible file name of every partial,
+resolver lists each lookup directory once (with `os.scandir()`) and
+answers following queries from its index.
+"""
+
+import collections
+import os
+import threading
+
+
+# how many resolved names are kept by a resolver before they are cleared
+CACHE_SIZE = 4096
+
+# how many shared resolvers are kept, evicted in least-recently-used order
+MAXSIZE = 64
+
+
+class Resolver:
+    """Class resolving partial and injection names to paths of their files.
+
+    Lookup sequence:
+
+    Let given name be named `partial_path`, and current lookup path be named `lookup_path`.
+    First lookup path is always '.' - current working directory.
+    The sequence consists of following steps and is repeated for every lookup path:
+
+        0.  lookup_path/partial_path
+        1.  lookup_path/partial_path.mustache
+        2.  lookup_path/partial_path/template.mustache
+
+    Iterating over lookup paths stops after first match is found.
+
+    Directories are listed when they are first needed and the listings (and resolved names) are kept
+    until `refresh()` is called.
+    Names missing from the index are checked on the filesystem (see `probe()`) before they are reported
+    missing, and the index is refreshed if their file was created since; files removed after listing,
+    and files created in front of ones already found, are not noticed until refresh.
+    """
+    def __init__(self, lookup=()):
+        self._lookup = tuple(lookup)
+        # directory -> {entry name: true for files, false for directories}
+        self._listings = {}
+        # name -> path, or None for names that could not be found
+        self._paths = {}
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return iter(self._lookup)
+
+    def __repr__(self):
+        return 'Resolver({0})'.format(repr(list(self._lookup)))
+
+    def _list(self, directory):
+        """Returns index of entries of given directory.
+        """
+        if directory not in self._listings:
+            listing = {}
+            try:
+                with os.scandir(directory or '.') as entries:
+                    for entry in entries:
+                        if entry.is_file(): listing[entry.name] = True
+                        elif entry.is_dir(): listing[entry.name] = False
+            except OSError:
+                pass
+            self._listings[directory] = listing
+        return self._listings[directory]
+
+    def _isfile(self, path):
+        directory, name = os.path.split(path)
+        return self._list(directory).get(name) is True
+
+    def _isdir(self, path):
+        directory, name = os.path.split(path)
+        return (name in ('', '.', '..') and os.path.isdir(path)) or self._list(directory).get(name) is False
+
+    def _find(self, name, isfile, isdir):
+        for base in ('.',) + self._lookup:
+            trypath = os.path.join(base, name)
+            if isfile(trypath): return trypath
+            if isfile(trypath + '.mustache'): return trypath + '.mustache'
+            if isdir(trypath) and isfile(os.path.join(trypath, 'template.mustache')):
+                return os.path.join(trypath, 'template.mustache')
+        return None
+
+    def find(self, name):
+        """Returns path to the file of partial or injection with given name, or
+        None if it cannot be found.
+        """
+        with self._lock:
+            if name not in self._paths:
+                if len(self._paths) >= CACHE_SIZE: self._paths.clear()
+                self._paths[name] = self._find(name, self._isfile, self._isdir)
+            path = self._paths[name]
+            if path is None:
+                # file may have been created after its directory was listed
+                path = self._find(name, os.path.isfile, os.path.isdir)
+                if path is not None:
+                    self._listings.clear()
+                    self._paths.clear()
+                    self._paths[name] = path
+            return path
+
+    def probe(self, name):
+        """Returns path to the file of partial or injection with given name, or None if it cannot be found,
+        checking the filesystem directly instead of the index.
+        Index is not changed, so this is a cheap way to notice that a missing file was created.
+        """
+        return self._find(name, os.path.isfile, os.path.isdir)
+
+    def resolve(self, name, missing=False):
+        """Returns tuple (found, path) for partial or injection with given name.
+
+        If the file cannot be found and `missing` is false, OSError is raised; otherwise
+        (False, name) is returned.
+        """
+        path = self.find(name)
+        if path is None and not missing:
+            raise OSError('partial or injection could not be resolved: invalid path: {0}'.format(name))
+        return ((True, path) if path is not None else (False, name))
+
+    def refresh(self):
+        """Drops index of lookup directories so they are listed again when needed.
+        """
+        with self._lock:
+            self._listings.clear()
+            self._paths.clear()
+
+
+# resolvers shared by all parts of Muspyche, by lookup directories
+_resolvers = collections.OrderedDict()
+_lock = threading.Lock()
+
+def get(lookup=()):
+    """Returns resolver for given lookup directories.
+    Resolvers are shared, so directories are indexed only once for all templates using them;
+    at most MAXSIZE of them are kept.
+    If `lookup` already is a resolver it is returned unchanged.
+    """
+    if isinstance(lookup, Resolver): return lookup
+    key = tuple(lookup)
+    with _lock:
+        if key in _resolvers:
+            _resolvers.move_to_end(key)
+            return _resolvers[key]
+        found = _resolvers[key] = Resolver(key)
+        while len(_resolvers) > MAXSIZE: _resolvers.popitem(last=False)
+        return found
+
+def refresh():
+    """Refreshes all shared resolvers.
+    """
+    with _lock:
+        resolvers = list(_resolvers.values())
+    for each in resolvers:
+        each.refresh()
@@ -2,6 +2,37 @@
 used across Muspyche modules.
 """
 
+import html
+import io
+import os
+
+
+# default number of characters buffered before rendered output is written to a file
+BUFFER_SIZE = 64 * 1024
+
+# translation table used by `translate()`, escapes the same characters as `html.escape()`
+ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;'})
+
+
+class SafeString(str):
+    """String that is already safe to put in HTML.
+    Values of this type are never escaped when rendered.
+    """
+    __slots__ = ()
+
+
+# default escaper, returns string with HTML special characters escaped
+escape = html.escape
+
+
+def translate(string):
+    """Escaper using `str.translate()`, producing the same output as `escape()`.
+    On CPython it is slower than `escape()` for typical strings; it is provided as an alternative
+    for implementations where it is not.
+    """
+    return string.translate(ESCAPES)
+
+
 def read(path, encoding='utf-8'):
     """Reads a file and returns a string.
 
@@ -11,3 +42,51 @@ def read(path, encoding='utf-8'):
     string = ifstream.read().decode(encoding)
     ifstream.close()
     return string
+
+
+def stamp(path):
+    """Returns (mtime, size) stamp of given file, or None if the file does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime, stat.st_size)
+
+
+def isbinary(fileobj):
+    """Returns true if given file object accepts bytes instead of strings.
+    """
+    if isinstance(fileobj, io.TextIOBase): return False
+    if isinstance(fileobj, (io.RawIOBase, io.BufferedIOBase)): return True
+    return 'b' in getattr(fileobj, 'mode', '')
+
+
+class Writer:
+    """Buffered writer of rendered output.
+
+    Chunks are collected until at least `buffersize` characters are waiting and
+    written to the file object together.
+    Chunks written to binary file objects are encoded.
+    """
+    def __init__(self, fileobj, buffersize=BUFFER_SIZE, encoding='utf-8'):
+        self._fileobj = fileobj
+        self._buffersize = buffersize
+        self._encoding = (encoding if isbinary(fileobj) else None)
+        self._chunks = []
+        self._size = 0
+        self.written = 0
+
+    def write(self, chunk):
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+        if self._size >= self._buffersize: self.flush()
+
+    def flush(self):
+        """Writes buffered chunks to the file object.
+        """
+        if not self._chunks: return
+        output = ''.join(self._chunks)
+        self._fileobj.write(output if self._encoding is None else output.encode(self._encoding))
+        self.written += self._size
+        self._chunks, self._size = [], 0
@@ -0,0 +1,182 @@
+"""This module contains watcher of lookup directories, which invalidates cached templates and
+partials when their files change, so caches can be kept on while templates are edited or deployed.
+
+Usage:
+
+    watching = watcher.watch(lookup, interval=1.0)
+    ...
+    watching.stop()
+
+Watcher polls (with `os.walk()` and `os.stat()`) all files in lookup directories every `interval` seconds and,
+when some of them are modified, created or removed, drops from caches:
+
+* partials loaded from modified or removed files,
+* templates and partials that inject (directly or through other injections) modified or removed files,
+* templates and partials whose injections resolve to a different file than before (e.g. because an injection
+  was created in a lookup directory searched earlier than the one it was found in).
+
+Partials are resolved when templates are rendered, so templates using an edited partial pick up the
+new version as soon as the partial is dropped from cache.
+Stores of rendered fragments are cleared whenever any file changes, since fragments may use partials.
+Shared resolvers are refreshed when files are created or removed.
+
+Files found through the current working directory are watched only if it is one of the lookup directories.
+With a watcher running, revalidation of partials may be turned off (`cache.partials.revalidate = False`).
+"""
+
+import os
+import threading
+
+from . import cache
+from . import compiler
+from . import flat
+from . import parser
+from . import resolver
+from . import util
+from .models import Injection
+
+
+def _injections(template):
+    """Returns names of injections used by template.
+    """
+    assembled, problems = parser._assemble(parser.clean(parser.rawparse(template)))
+    return [el.getpath() for el in assembled if type(el) is Injection]
+
+
+def dependencies(template, lookup=(), missing=False):
+    """Returns set of (normalized) paths of files injected into template when it is parsed,
+    including files injected into injections.
+    """
+    finder = resolver.get(lookup)
+    paths, pending = set(), [template]
+    while pending:
+        try:
+            names = _injections(pending.pop())
+        except Exception:
+            # malformed injection, it will fail to parse when template is loaded again
+            continue
+        for name in names:
+            path = finder.find(name)
+            if path is None or os.path.normpath(path) in paths: continue
+            paths.add(os.path.normpath(path))
+            try:
+                pending.append(util.read(path))
+            except OSError:
+                pass
+    return paths
+
+
+def _partialdependencies(path):
+    """Returns set of paths of files used by partial loaded from given path.
+    Partials are parsed without lookup directories, so their injections are resolved in the current working directory.
+    """
+    try:
+        template = util.read(path)
+    except OSError:
+        return {os.path.normpath(path)}
+    return {os.path.normpath(path)} | dependencies(template)
+
+
+class Watcher:
+    """Class watching lookup directories and invalidating entries of template and partial caches.
+
+    By default `cache`, `compiler` and `flat` caches and `cache.fragments` store are invalidated; other
+    caches can be given as `templates` (TemplateCache objects), `partials` (PartialCache objects) and
+    `fragments` (stores of rendered fragments, e.g. cache.DbmStore objects).
+    """
+    def __init__(self, lookup=(), interval=1.0, templates=None, partials=None, fragments=None):
+        self.lookup = tuple(lookup)
+        self.interval = interval
+        self.templates = ([cache.templates, compiler.templates, flat.templates] if templates is None else list(templates))
+        self.partials = ([cache.partials, compiler.partials, flat.partials] if partials is None else list(partials))
+        self.fragments = ([cache.fragments] if fragments is None else list(fragments))
+        # cache entry -> set of paths of files it was loaded from
+        self._used = {}
+        self._stamps = self._scan()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def _scan(self):
+        """Returns stamps of all files in watched directories, by normalized path.
+        """
+        stamps = {}
+        for directory in self.lookup:
+            for root, directories, files in os.walk(directory or '.'):
+                for name in files:
+                    path = os.path.normpath(os.path.join(root, name))
+                    stamp = util.stamp(path)
+                    if stamp is not None: stamps[path] = stamp
+        return stamps
+
+    def _isstale(self, key, load, changed, moved):
+        """Returns true if entry with given key uses a changed file.
+        If files were created or removed, files used by the entry are found again and the entry
+        is stale also if they differ from the ones found before.
+        """
+        used = self._used.get(key)
+        stale = False
+        if used is None or moved:
+            current = load()
+            stale = used is not None and current != used
+            used = self._used[key] = current
+        return stale or not used.isdisjoint(changed)
+
+    def invalidate(self, changed, moved=True):
+        """Invalidates cache entries using any of given files.
+        `moved` tells whether files were created or removed (and not only modified).
+        """
+        changed = set(os.path.normpath(path) for path in changed)
+        if moved: resolver.refresh()
+        verdicts = {}
+        def isstale(key, load):
+            if key not in verdicts: verdicts[key] = self._isstale(key, load, changed, moved)
+            return verdicts[key]
+        for templates in self.templates:
+            for key in templates.keys():
+                if isstale(('template',) + key, lambda: dependencies(*key)): templates.discard(key)
+        for partials in self.partials:
+            if moved: partials.refresh()
+            for path in partials.paths():
+                if isstale(('partial', path), lambda: _partialdependencies(path)): partials.invalidate(path)
+        # files used by entries that were dropped (or evicted) are found again when they are loaded
+        self._used = {key: used for key, used in self._used.items() if verdicts.get(key) is False}
+        for store in self.fragments: store.clear()
+
+    def poll(self):
+        """Checks watched directories once, invalidating entries that use changed files.
+        Returns set of paths of modified, created and removed files.
+        """
+        stamps = self._scan()
+        changed = set(path for path in (stamps.keys() | self._stamps.keys()) if stamps.get(path) != self._stamps.get(path))
+        moved = stamps.keys() != self._stamps.keys()
+        self._stamps = stamps
+        if changed: self.invalidate(changed, moved)
+        return changed
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.poll()
+
+    def start(self):
+        """Starts polling in a daemon thread.
+        """
+        if self._thread is not None: return self
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='muspyche-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops polling thread and waits for it to finish.
+        """
+        if self._thread is None: return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+
+def watch(lookup=(), interval=1.0, fragments=None):
+    """Starts and returns a Watcher of given lookup directories, invalidating default caches
+    (and given stores of rendered fragments).
+    """
+    return Watcher(lookup, interval, fragments=fragments).start()
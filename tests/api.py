@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+"""Tests for high-level API of Muspyche.
+"""
+
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import types
+import unittest
+
+import muspyche
+
+
+TEMPLATE = 'Hello {{name}}!{{#items}} {{.}}{{/items}}'
+CONTEXTS = [{'name': 'Joe', 'items': ['a', 'b']}, {'name': '<Jim>', 'items': []}, {}]
+
+
+class BatchRenderingTests(unittest.TestCase):
+    def testRenderingMany(self):
+        expected = [muspyche.api.make(TEMPLATE, context) for context in CONTEXTS]
+        self.assertEqual(expected, muspyche.api.render_many(TEMPLATE, CONTEXTS))
+        self.assertEqual(expected, muspyche.api.render_many(TEMPLATE, CONTEXTS, compiled=False))
+
+    def testStreamingResults(self):
+        rendered = muspyche.api.render_many(TEMPLATE, iter(CONTEXTS), stream=True)
+        self.assertIsInstance(rendered, types.GeneratorType)
+        self.assertEqual('Hello Joe! a b', next(rendered))
+        self.assertEqual(['Hello &lt;Jim&gt;!', 'Hello !'], list(rendered))
+
+    def testParsingOnce(self):
+        muspyche.compiler.templates.invalidate()
+        before = muspyche.compiler.templates.stats()
+        muspyche.api.render_many(TEMPLATE, CONTEXTS)
+        after = muspyche.compiler.templates.stats()
+        self.assertEqual((1, 0), (after['misses'] - before['misses'], after['hits'] - before['hits']))
+
+
+class AsyncRenderingTests(unittest.TestCase):
+    def setUp(self):
+        self.awaited = []
+
+    def value(self, name, value, delay=0):
+        async def coroutine():
+            self.awaited.append(name)
+            await asyncio.sleep(delay)
+            return value
+        return coroutine()
+
+    def make(self, template, context, **kwargs):
+        return asyncio.run(muspyche.api.make_async(template, context, **kwargs))
+
+    def testAwaitingValues(self):
+        for compiled in (False, True):
+            context = {'name': self.value('name', '<Joe>'), 'user': self.value('user', {'id': self.value('id', 42)})}
+            self.assertEqual('&lt;Joe&gt; 42', self.make('{{name}} {{#user}}{{id}}{{/user}}', context, compiled=compiled))
+
+    def testAwaitingWithGenerators(self):
+        def rows():
+            for n in range(3): yield {'n': n, 'label': self.value('label', 'L{0}'.format(n))}
+        template = '{{title}}:{{^rows}}none{{/rows}}{{#rows}}[{{n}} {{label}}]{{/rows}}{{#empty}}x{{/empty}}{{^empty}}none{{/empty}}'
+        for compiled in (False, True):
+            context = {'title': self.value('title', 'T'), 'rows': rows(), 'empty': iter([])}
+            self.assertEqual('T:[0 L0][1 L1][2 L2]none', self.make(template, context, compiled=compiled))
+
+    def testAwaitingOnlyReachedValues(self):
+        unused = self.value('unused', 'x')
+        context = {'flag': False, 'used': self.value('used', 'y'), 'hidden': unused}
+        self.assertEqual('y', self.make('{{used}}{{#flag}}{{hidden}}{{/flag}}', context))
+        self.assertEqual(['used'], self.awaited)
+        unused.close()
+
+    def testAwaitingConcurrently(self):
+        context = {'a': self.value('a', 'A', 0.2), 'b': self.value('b', 'B', 0.2), 'c': self.value('c', 'C', 0.2)}
+        start = time.monotonic()
+        self.assertEqual('ABC', self.make('{{a}}{{b}}{{c}}', context))
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def testAwaitingListsAndSections(self):
+        context = {'items': self.value('items', [{'n': self.value('n0', 0)}, {'n': 1}])}
+        self.assertEqual('0,1,', self.make('{{#items}}{{n}},{{/items}}', context))
+
+    def testLoadingPartials(self):
+        directory = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(directory, 'outer.mustache'), 'w') as ofstream: ofstream.write('[{{> inner}}]')
+            with open(os.path.join(directory, 'inner.mustache'), 'w') as ofstream: ofstream.write('{{x}}')
+            context = {'x': self.value('x', 'X')}
+            self.assertEqual('[X]', self.make('{{> outer}}', context, lookup=[directory]))
+            context = {'x': self.value('x', 'X')}
+            self.assertEqual('[X]', self.make('{{> outer}}', context, lookup=[directory], compiled=True))
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+
+"""Tests for benchmark suite.
+"""
+
+import unittest
+
+import muspyche.bench
+
+
+class BenchmarkSuiteTests(unittest.TestCase):
+    def testRunningScenarios(self):
+        results = muspyche.bench.run(['render_flat', 'partials_loop'], repeat=2, scale=0.01)
+        self.assertEqual(['partials_loop', 'render_flat'], sorted(results['results']))
+        self.assertEqual(2, results['results']['render_flat']['repeat'])
+
+    def testComparingWithBaseline(self):
+        baseline = {'results': {'a': {'best': 1.0}, 'b': {'best': 1.0}, 'gone': {'best': 1.0}}}
+        results = {'results': {'a': {'best': 1.05}, 'b': {'best': 1.5}, 'new': {'best': 1.0}}}
+        compared = muspyche.bench.compare(results, baseline, threshold=0.1)
+        self.assertEqual([('a', False), ('b', True)], [(name, regressed) for name, _, _, _, regressed in compared])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+
+"""Tests for caches used by Muspyche.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import muspyche
+
+
+class TemplateCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.parsed = []
+        def loader(template, lookup, missing):
+            self.parsed.append(template)
+            return muspyche.parser.parse(template, lookup, missing)
+        self.cache = muspyche.cache.TemplateCache(loader, maxsize=2)
+
+    def testParsingOnlyOnce(self):
+        first = self.cache.get('{{foo}}')
+        second = self.cache.get('{{foo}}')
+        self.assertIs(first, second)
+        self.assertEqual(['{{foo}}'], self.parsed)
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+
+    def testLookupAndMissingArePartOfKey(self):
+        self.cache.get('{{foo}}')
+        self.cache.get('{{foo}}', lookup=['./tests'])
+        self.cache.get('{{foo}}', missing=True)
+        self.assertEqual(3, len(self.parsed))
+
+    def testEvictingLeastRecentlyUsed(self):
+        self.cache.get('a')
+        self.cache.get('b')
+        self.cache.get('a')
+        self.cache.get('c')
+        self.assertIn('a', self.cache)
+        self.assertNotIn('b', self.cache)
+        self.assertIn('c', self.cache)
+
+    def testResizing(self):
+        self.cache.get('a')
+        self.cache.get('b')
+        self.cache.resize(1)
+        self.assertEqual(1, len(self.cache))
+        self.assertIn('b', self.cache)
+
+    def testDisabledCache(self):
+        self.cache.resize(0)
+        self.cache.get('a')
+        self.cache.get('a')
+        self.assertEqual(['a', 'a'], self.parsed)
+
+    def testInvalidating(self):
+        self.cache.get('a')
+        self.cache.get('a', missing=True)
+        self.cache.get('b')
+        self.cache.invalidate('a')
+        self.assertNotIn('a', self.cache)
+        self.assertIn('b', self.cache)
+        self.cache.invalidate()
+        self.assertEqual(0, len(self.cache))
+
+    def testStats(self):
+        self.cache.get('a')
+        self.cache.get('a')
+        self.assertEqual({'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 2}, self.cache.stats())
+
+    def testMakeUsesCache(self):
+        muspyche.cache.templates.invalidate()
+        before = muspyche.cache.templates.stats()
+        self.assertEqual('bar', muspyche.api.make('{{foo}}', {'foo': 'bar'}))
+        self.assertEqual('baz', muspyche.api.make('{{foo}}', {'foo': 'baz'}))
+        after = muspyche.cache.templates.stats()
+        self.assertEqual(1, after['misses'] - before['misses'])
+        self.assertEqual(1, after['hits'] - before['hits'])
+
+
+class PartialCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.parsed = []
+        def loader(template):
+            self.parsed.append(template)
+            return muspyche.parser.parse(template)
+        self.cache = muspyche.cache.PartialCache(loader, interval=0)
+        self.write('foo', 'Foo')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text, mtime=None):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as ofstream: ofstream.write(text)
+        if mtime is not None: os.utime(path, (mtime, mtime))
+
+    def testLoadingOnlyOnce(self):
+        first = self.cache.get('foo', [self.directory])
+        second = self.cache.get('foo', [self.directory])
+        self.assertIs(first, second)
+        self.assertEqual(['Foo'], self.parsed)
+
+    def testReloadingChangedPartial(self):
+        self.write('foo', 'Foo', mtime=1000)
+        self.cache.get('foo', [self.directory])
+        self.write('foo', 'Bar', mtime=2000)
+        self.cache.get('foo', [self.directory])
+        self.write('foo', 'Bar!', mtime=2000)
+        self.cache.get('foo', [self.directory])
+        self.cache.get('foo', [self.directory])
+        self.assertEqual(['Foo', 'Bar', 'Bar!'], self.parsed)
+        self.assertEqual(2, self.cache.reloads)
+
+    def testNotRevalidating(self):
+        self.cache.revalidate = False
+        self.cache.get('foo', [self.directory])
+        self.write('foo', 'Changed')
+        self.cache.get('foo', [self.directory])
+        self.assertEqual(['Foo'], self.parsed)
+        self.cache.invalidate()
+        self.cache.get('foo', [self.directory])
+        self.assertEqual(['Foo', 'Changed'], self.parsed)
+
+    def testRevalidatingInIntervals(self):
+        self.cache.interval = 3600
+        self.write('foo', 'Foo', mtime=1000)
+        self.cache.get('foo', [self.directory])
+        self.write('foo', 'Bar', mtime=2000)
+        self.cache.get('foo', [self.directory])
+        self.assertEqual(['Foo'], self.parsed)
+
+    def testMissingPartialAppearing(self):
+        self.assertEqual([], self.cache.get('bar', [self.directory], missing=True))
+        self.write('bar', 'Bar')
+        self.cache.get('bar', [self.directory], missing=True)
+        self.assertEqual(['', 'Bar'], self.parsed)
+
+    def testMissingPartialDoesNotRefreshIndex(self):
+        finder = muspyche.resolver.get([self.directory])
+        self.cache.get('bar', [self.directory], missing=True)
+        finder.find('foo')
+        refreshed = []
+        finder.refresh = lambda: refreshed.append(True)
+        try:
+            for _ in range(10): self.cache.get('bar', [self.directory], missing=True)
+        finally:
+            del finder.refresh
+        self.assertEqual([], refreshed)
+        self.assertEqual(10, self.cache.hits)
+
+    def testEvictingLeastRecentlyUsed(self):
+        self.cache = muspyche.cache.PartialCache(muspyche.parser.parse, interval=0, maxsize=2)
+        self.write('bar', 'Bar')
+        for name in ('foo', 'bar', 'foo', 'a', 'b', 'c'):
+            self.cache.get(name, [self.directory], missing=True)
+        self.assertEqual(2, len(self.cache))
+        self.assertEqual(2, len(self.cache._paths))
+        self.assertEqual(['b', 'c'], self.cache.paths())
+
+    def testStats(self):
+        self.cache.get('foo', [self.directory])
+        self.cache.get('foo', [self.directory])
+        self.assertEqual({'hits': 1, 'misses': 1, 'reloads': 0, 'size': 1}, self.cache.stats())
+
+    def testRenderingLoopLoadsPartialOnce(self):
+        muspyche.cache.partials.invalidate()
+        before = muspyche.cache.partials.stats()
+        context = {'rows': [{'n': i} for i in range(10000)]}
+        output = muspyche.api.make('{{#rows}}{{> foo}}{{/rows}}', context, lookup=[self.directory])
+        self.assertEqual('Foo' * 10000, output)
+        after = muspyche.cache.partials.stats()
+        self.assertEqual(1, after['misses'] - before['misses'])
+        self.assertEqual(9999, after['hits'] + after['reloads'] - before['hits'] - before['reloads'])
+
+
+class OutputCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.outputs = muspyche.cache.OutputCache()
+        self.rendered = []
+        self.context = {'site': 'S', 'items': [{'id': i, 'price': i % 2, 'tag': muspyche.util.SafeString('<b>')} for i in range(6)]}
+
+    def render(self, template, context=None, lookup=(), outputs=True):
+        tree = muspyche.cache.templates.get(template, lookup)
+        stack = muspyche.context.ContextStack((self.context if context is None else context), outputs=(self.outputs if outputs else None))
+        return muspyche.renderer.render(tree, stack, lookup)
+
+    def testReusingOutputOfEqualSubContexts(self):
+        template = '{{#items}}<i>{{price}}{{{tag}}}</i>{{/items}}'
+        self.assertEqual(self.render(template, outputs=False), self.render(template))
+        # items differ only in keys the body does not read
+        self.assertEqual({'hits': 4, 'misses': 2, 'skipped': {}}, {key: value for key, value in self.outputs.stats().items() if key in ('hits', 'misses', 'skipped')})
+
+    def testTypesArePartOfFingerprint(self):
+        template = '{{#items}}{{v}},{{/items}}'
+        context = {'items': [{'v': 1}, {'v': 1.0}, {'v': True}, {'v': '1'}, {'v': muspyche.util.SafeString('1')}]}
+        self.assertEqual('1,1.0,True,1,1,', self.render(template, context))
+        self.assertEqual(0, self.outputs.hits)
+
+    def testSkippingBodiesReadingOtherContexts(self):
+        template = '{{#items}}{{::site}}{{/items}}{{#items}}{{#..}}x{{/..}}{{/items}}'
+        self.assertEqual(self.render(template, outputs=False), self.render(template))
+        self.assertEqual({('items', 'global'): 6, ('items', 'outer'): 6}, self.outputs.skipped)
+
+    def testSkippingUnhashableSubContexts(self):
+        self.assertEqual('aa', self.render('{{#items}}{{d.x}}{{/items}}', {'items': [{'d': {'f': len, 'x': 'a'}}] * 2}))
+        self.assertEqual({'unhashable': 2}, self.outputs.stats()['skipped'])
+
+    def testMemoizingPartials(self):
+        directory = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(directory, 'row.mustache'), 'w') as ofstream: ofstream.write('<tr>{{price}}</tr>')
+            template = '{{#items}}{{> row}}{{/items}}'
+            self.assertEqual('<tr>0</tr><tr>1</tr>' * 3, self.render(template, lookup=[directory]))
+            self.assertEqual(4, self.outputs.hits)
+        finally:
+            shutil.rmtree(directory)
+
+    def testEvicting(self):
+        self.outputs = muspyche.cache.OutputCache(maxsize=1)
+        self.render('{{#items}}{{id}}{{/items}}')
+        self.assertEqual(1, len(self.outputs))
+
+    def testMakeWithMemoization(self):
+        template = '{{#items}}<i>{{price}}</i>{{/items}}'
+        self.assertEqual(muspyche.api.make(template, self.context), muspyche.api.make(template, self.context, memoize=self.outputs))
+        self.assertEqual(4, self.outputs.hits)
+        for memoize in (0, None, False):
+            self.assertEqual(muspyche.api.make(template, self.context), muspyche.api.make(template, self.context, memoize=memoize))
+        self.assertEqual(4, self.outputs.hits)
+
+
+class FragmentTests(unittest.TestCase):
+    TEMPLATE = '<ul>\n{{*nav user ttl=60}}\n{{#items}}<li>{{::user}} {{name}}</li>\n{{/items}}\n{{/nav}}\n</ul>\n'
+
+    def setUp(self):
+        self.now = 0
+        self.store = muspyche.cache.MemoryStore(maxsize=2, timer=lambda: self.now)
+        self.context = {'user': 'joe', 'items': [{'name': 'a'}, {'name': 'b'}]}
+
+    def testParsingFragments(self):
+        tree = muspyche.parser.parse(self.TEMPLATE, strict=True)
+        fragment = tree[2]
+        self.assertIs(muspyche.models.Fragment, type(fragment))
+        self.assertEqual(('nav', ['user'], 60.0), (fragment.getfragment(), fragment.getkeys(), fragment.getttl()))
+
+    def testCachingRenderedFragments(self):
+        expected = '<ul>\n<li>joe a</li>\n<li>joe b</li>\n</ul>\n'
+        self.assertEqual(expected, muspyche.api.make(self.TEMPLATE, self.context, fragments=self.store))
+        self.context['items'].append({'name': 'c'})
+        self.assertEqual(expected, muspyche.api.make(self.TEMPLATE, self.context, fragments=self.store))
+        self.assertEqual(expected, muspyche.api.make(self.TEMPLATE, self.context, compiled=True, fragments=self.store))
+        flat = muspyche.flat.load(self.TEMPLATE)
+        self.assertEqual(expected, flat.render(muspyche.context.ContextStack(self.context, fragments=self.store)))
+        self.assertEqual({'hits': 3, 'misses': 1, 'size': 1, 'maxsize': 2}, self.store.stats())
+
+    def testKeysAreValuesOfContext(self):
+        muspyche.api.make(self.TEMPLATE, self.context, fragments=self.store)
+        self.context['user'] = 'ann'
+        self.assertIn('<li>ann a</li>', muspyche.api.make(self.TEMPLATE, self.context, fragments=self.store))
+        self.assertEqual(2, len(self.store))
+
+    def testBodiesArePartOfKey(self):
+        self.store = muspyche.cache.MemoryStore()
+        self.assertEqual('<A 1>', muspyche.api.make('{{*nav}}<A {{n}}>{{/nav}}', {'n': 1}, fragments=self.store))
+        self.assertEqual('<B 1>', muspyche.api.make('{{*nav}}<B {{n}}>{{/nav}}', {'n': 1}, fragments=self.store))
+        self.assertEqual('<B 1>', muspyche.api.make('{{*nav}}<B {{n}}>{{/nav}}', {'n': 1}, compiled=True, fragments=self.store))
+        self.assertEqual(2, len(self.store))
+
+    def testLookupAndEscapingArePartOfKey(self):
+        self.store = muspyche.cache.MemoryStore()
+        first, second = tempfile.mkdtemp(), tempfile.mkdtemp()
+        try:
+            for directory in (first, second):
+                with open(os.path.join(directory, 'p.mustache'), 'w') as ofstream: ofstream.write(os.path.basename(directory))
+            template = '{{*foot}}{{>p}}{{/foot}}'
+            for compiled in (False, True):
+                self.assertEqual(os.path.basename(first), muspyche.api.make(template, {}, lookup=[first], compiled=compiled, fragments=self.store))
+                self.assertEqual(os.path.basename(second), muspyche.api.make(template, {}, lookup=[second], compiled=compiled, fragments=self.store))
+        finally:
+            shutil.rmtree(first)
+            shutil.rmtree(second)
+        template = '{{*nav}}{{name}}{{/nav}}'
+        self.assertEqual('&lt;a&gt;', muspyche.api.make(template, {'name': '<a>'}, fragments=self.store))
+        self.assertEqual('<A>', muspyche.api.make(template, {'name': '<a>'}, escape=str.upper, fragments=self.store))
+
+    def testExpiring(self):
+        muspyche.api.make(self.TEMPLATE, self.context, fragments=self.store)
+        self.context['items'] = []
+        self.now = 59
+        self.assertIn('<li>', muspyche.api.make(self.TEMPLATE, self.context, fragments=self.store))
+        self.now = 60
+        self.assertEqual('<ul>\n</ul>\n', muspyche.api.make(self.TEMPLATE, self.context, fragments=self.store))
+
+    def testEvictingLeastRecentlyUsed(self):
+        for key in 'abac': self.store.set(key, key)
+        self.assertEqual(['a', None, 'c'], [self.store.get(key) for key in 'abc'])
+
+    def testDbmStore(self):
+        directory = tempfile.mkdtemp()
+        try:
+            store = muspyche.cache.DbmStore(os.path.join(directory, 'fragments'), timer=lambda: self.now)
+            store.set('key', 'z\u00f3\u0142w\n')
+            store.set('short', 'lived', ttl=10)
+            self.now = 10
+            self.assertEqual(('z\u00f3\u0142w\n', None), (store.get('key'), store.get('short')))
+            store.close()
+            store = muspyche.cache.DbmStore(os.path.join(directory, 'fragments'))
+            self.assertEqual('z\u00f3\u0142w\n', store.get('key'))
+            store.close()
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+"""Tests for compiler of parse trees.
+Compiled templates must render exactly the same output as the tree-walking renderer.
+"""
+
+import json
+import os
+import pickle
+import unittest
+
+import muspyche
+
+
+atoms = os.path.join(os.path.split(__file__)[0], 'atoms')
+
+
+def interpret(template, context, lookup=[], newline=None):
+    tree = muspyche.parser.parse(template, lookup)
+    return muspyche.renderer.render(tree, muspyche.context.ContextStack(context), list(lookup), missing=True, newline=newline)
+
+def compiled(template, context, lookup=[], newline=None):
+    tree = muspyche.parser.parse(template, lookup)
+    compiled = muspyche.compiler.Template(tree)
+    return compiled.render(muspyche.context.ContextStack(context), list(lookup), missing=True, newline=newline)
+
+
+class CompilerTests(unittest.TestCase):
+    def assertSameOutput(self, template, context, lookup=[]):
+        for newline in [None, '\r\n']:
+            self.assertEqual(interpret(template, context, lookup, newline), compiled(template, context, lookup, newline))
+
+    def testVariables(self):
+        self.assertSameOutput('{{foo}} {{{foo}}} {{&foo}} {{bar.baz}}', {'foo': '<b>', 'bar': {'baz': 42}})
+
+    def testSections(self):
+        context = {'list': [{'name': 'a'}, {'name': 'b'}], 'flag': True, 'empty': [], 'dict': {'name': 'c'}}
+        self.assertSameOutput('{{#list}}\n* {{name}}\n{{/list}}\n{{#flag}}yes{{/flag}}{{^empty}}none{{/empty}}{{#dict}}{{name}}{{/dict}}', context)
+
+    def testDeepNesting(self):
+        depth = muspyche.compiler.MAX_NESTING * 2
+        template = ''.join('{{{{#s{0}}}}}{{{{n}}}}'.format(i) for i in range(depth)) + ''.join('{{{{/s{0}}}}}'.format(i) for i in reversed(range(depth)))
+        context = {'n': 0}
+        inner = context
+        for i in range(depth):
+            inner['s{0}'.format(i)] = {'n': i+1}
+            inner = inner['s{0}'.format(i)]
+        self.assertSameOutput(template, context)
+
+    def testAtoms(self):
+        for name in sorted(os.listdir(atoms)):
+            td = os.path.join(atoms, name)
+            template = muspyche.util.read(os.path.join(td, 'template.mustache'))
+            context = json.loads(muspyche.util.read(os.path.join(td, 'context.json')))
+            self.assertSameOutput(template, context, [td])
+
+    def testUnrenderableNodesRaiseOnlyWhenReached(self):
+        self.assertEqual('', compiled('{{#no}}{{/stray}}{{/no}}', {}))
+        self.assertRaises(TypeError, compiled, '{{/stray}}', {})
+
+    def testPickling(self):
+        template = muspyche.compiler.Template(muspyche.parser.parse('{{#a}}{{.}}{{/a}}'))
+        copied = pickle.loads(pickle.dumps(template))
+        self.assertEqual(template.getsource(), copied.getsource())
+        self.assertEqual('12', copied.render(muspyche.context.ContextStack({'a': [1, 2]})))
+
+    def testMakingCompiled(self):
+        self.assertEqual('Hello World!', muspyche.api.make('Hello {{what}}!', {'what': 'World'}, compiled=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,10 @@
 """Tests for context stack implementation.
 """
 
+import asyncio
+import collections
+import io
+import types
 import unittest
 
 import muspyche
@@ -79,6 +83,29 @@ class ContextStackTests(unittest.TestCase):
         self.assertEqual('/', stack.get('::home'))
         self.assertEqual('~', stack.get('home'))
 
+    def testRestoringInsideBooleanContext(self):
+        context = {'flag': True, 'a': {'b': 'c'}}
+        stack = muspyche.context.ContextStack(context)
+        stack.adjust('flag').adjust('a').adjust('b')
+        self.assertEqual(True, stack.current())
+        stack.restore()
+        stack.restore()
+        self.assertEqual(True, stack.current())
+        stack.restore()
+        self.assertEqual(context, stack.current())
+
+    def testRestoringIndexedAdjustments(self):
+        context = {'items': [{'n': 0}, {'n': 1}]}
+        stack = muspyche.context.ContextStack(context)
+        stack.adjust('items[1]')
+        stack.adjust('::items')
+        stack.adjust('[0]')
+        self.assertEqual('0', stack.get('n'))
+        stack.restore()
+        stack.restore()
+        self.assertEqual({'n': 1}, stack.current())
+        self.assertEqual('1', stack.get('n'))
+
     def testStackBuilding(self):
         context = {'c': {'three': 3}, 'a': {'one': 1}, 'd': {'four': 4}, 'b': {'two': 2}, 'e': {'five': 5}}
         stack = muspyche.context.ContextStack(context)
@@ -125,5 +152,115 @@ class ContextStackTests(unittest.TestCase):
         self.assertEqual(context, stack.adjust('foo').adjust('..').current())
 
 
+class EscapingTests(unittest.TestCase):
+    def testEscaping(self):
+        stack = muspyche.context.ContextStack({'a': '<&>"\'', 'n': 3, 'f': 2.5, 'b': True})
+        self.assertEqual('&lt;&amp;&gt;&quot;&#x27;', stack.get('a'))
+        self.assertEqual('<&>"\'', stack.get('a', escape=False))
+        self.assertEqual(['3', '2.5', 'True'], [stack.get(key) for key in ('n', 'f', 'b')])
+
+    def testSafeStringsAreNotEscaped(self):
+        safe = muspyche.util.SafeString('<b>bold</b>')
+        stack = muspyche.context.ContextStack({'a': safe})
+        self.assertEqual('<b>bold</b>', stack.get('a'))
+        self.assertEqual('<b>bold</b>', muspyche.api.make('{{a}}', {'a': safe}))
+
+    def testCustomEscaper(self):
+        stack = muspyche.context.ContextStack({'a': '<&>"\''}, escape=muspyche.util.translate)
+        self.assertEqual(muspyche.util.escape('<&>"\''), stack.get('a'))
+        stack = muspyche.context.ContextStack({'a': 'x', 'items': [{'b': 'y'}]}, escape=str.upper)
+        self.assertEqual('X', stack.get('a'))
+        self.assertEqual(['Y'], [item.get('b') for item in stack.adjust('items')])
+
+    def testMemoizedEscaping(self):
+        calls = []
+        def escape(value):
+            calls.append(value)
+            return muspyche.util.escape(value)
+        stack = muspyche.context.ContextStack({'a': '<a>', 'b': '<a>', 'c': '<c>'}, escape=escape, memo=True)
+        self.assertEqual(['&lt;a&gt;', '&lt;a&gt;', '&lt;c&gt;', '&lt;a&gt;'], [stack.get(key) for key in 'abca'])
+        self.assertEqual(['<a>', '<c>'], calls)
+
+    def testEscapingOptionsOfApi(self):
+        calls = []
+        def escape(value):
+            calls.append(value)
+            return value.upper()
+        template, context = '{{a}} {{#items}}{{.}}{{/items}} {{{a}}}', {'a': 'x<', 'items': ['x<', 'y']}
+        self.assertEqual('X< X<Y x<', muspyche.api.make(template, context, escape=escape, memo=True))
+        self.assertEqual(['x<', 'y'], calls)
+        self.assertEqual('X< X<Y x<', muspyche.api.make(template, context, compiled=True, escape=escape))
+        self.assertEqual(['X< X<Y x<'], muspyche.api.render_many(template, [context], escape=escape))
+        self.assertEqual('X< X<Y x<', ''.join(muspyche.api.stream(template, context, escape=escape)))
+        output = io.StringIO()
+        muspyche.api.render_to(output, template, context, escape=escape)
+        self.assertEqual('X< X<Y x<', output.getvalue())
+        self.assertEqual('X< X<Y x<', asyncio.run(muspyche.api.make_async(template, context, escape=escape)))
+
+
+class LazyValueTests(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def lazy(self, name, value):
+        def evaluate():
+            self.calls.append(name)
+            return value
+        return evaluate
+
+    def testValuesAreEvaluatedOnlyIfReached(self):
+        context = {'flag': False, 'hidden': self.lazy('hidden', 'x'), 'name': self.lazy('name', 'Joe')}
+        self.assertEqual('Joe', muspyche.api.make('{{#flag}}{{hidden}}{{/flag}}{{name}}', context))
+        self.assertEqual(['name'], self.calls)
+
+    def testValuesAreEvaluatedOncePerRender(self):
+        template = '{{#items}}{{n}}{{::name}} {{/items}}{{name}}{{#items}}{{n}}{{/items}}'
+        context = {'items': self.lazy('items', [{'n': 1}, {'n': 2}]), 'name': self.lazy('name', 'J')}
+        for compiled in (False, True):
+            self.assertEqual('1J 2J J12', muspyche.api.make(template, context, compiled=compiled))
+        self.assertEqual(['items', 'name'] * 2, self.calls)
+
+    def testNestedValuesAndIndexing(self):
+        stack = muspyche.context.ContextStack({'a': self.lazy('a', {'b': self.lazy('b', ['x', 'y'])})})
+        self.assertEqual('y', stack.get('a.b[1]'))
+        self.assertEqual(['x', 'y'], [item.get('.') for item in stack.adjust('a.b')])
+        self.assertEqual(['a', 'b'], self.calls)
+
+    def testClassesAreNotCalled(self):
+        self.assertIs(dict, muspyche.context.ContextStack({'a': dict}).get('a'))
+
+    def testAwaitableResults(self):
+        async def fetch():
+            self.calls.append('fetch')
+            return 'fetched'
+        output = asyncio.run(muspyche.api.make_async('{{a}} {{a}}', {'a': fetch}))
+        self.assertEqual('fetched fetched', output)
+        self.assertEqual(['fetch'], self.calls)
+
+
+class MappingTests(unittest.TestCase):
+    def testContextIsNotCopied(self):
+        context = {'a': 'x'}
+        stack = muspyche.context.ContextStack(context)
+        context['a'] = 'y'
+        self.assertEqual('y', stack.get('a'))
+
+    def testAnyMapping(self):
+        context = types.MappingProxyType({'a': 'x', 'd': types.MappingProxyType({'b': '<y>'})})
+        stack = muspyche.context.ContextStack(context)
+        self.assertEqual(('x', '&lt;y&gt;'), (stack.get('a'), stack.get('d.b')))
+        for compiled in (False, True):
+            self.assertEqual('x<y>', muspyche.api.make('{{a}}{{#d}}{{{b}}}{{/d}}', context, compiled=compiled))
+
+    def testLayeredContext(self):
+        base = {'site': {'name': 'Site'}, 'user': 'nobody'}
+        template = '{{user}}@{{#site}}{{name}}{{/site}}{{::site.name}}'
+        self.assertEqual(['joe@SiteSite', 'nobody@SiteSite'], muspyche.api.render_many(template, [{'user': 'joe'}, {}], base=base))
+        stack = muspyche.context.ContextStack({'user': 'ann'}, base=base)
+        self.assertIsInstance(stack.current(), collections.ChainMap)
+        self.assertIs(base, stack.current().maps[1])
+        self.assertEqual('ann', muspyche.api.make('{{user}}', {'user': 'ann'}, base=base))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+"""Tests for flat trees.
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import muspyche
+from muspyche.context import ContextStack
+from muspyche.models import *
+
+
+class FlatTreeTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'row.mustache'), 'w') as ofstream: ofstream.write('<{{x}}>\n')
+
+    def tearDown(self):
+        muspyche.flat.partials.invalidate()
+        shutil.rmtree(self.directory)
+
+    def testLayout(self):
+        flat = muspyche.flat.flatten(muspyche.parser.parse('a\n{{#s}}{{x}}{{^t}}{{{y}}}{{/t}}{{/s}}{{>p}}\n'))
+        kinds = muspyche.flat
+        self.assertEqual([kinds.TEXT, kinds.NEWLINE, kinds.SECTION, kinds.VARIABLE, kinds.INVERTED, kinds.LITERAL, kinds.PARTIAL, kinds.NEWLINE], list(flat.kinds))
+        self.assertEqual(range(3, 6), flat.children(2))
+        self.assertEqual(range(5, 6), flat.children(4))
+        self.assertEqual(['a', '\n', 's', 'x', 't', 'y', 'p'], flat.table)
+        self.assertEqual(flat.strings[1], flat.strings[7])
+
+    def testRenderingIsTheSame(self):
+        template = 'head\n{{#items}}\n{{> row}}{{^x}}none{{/x}}\n{{/items}}\n{{&raw}} {{raw}}\n'
+        context = {'items': [{'x': 1}, {'x': 0}], 'raw': '<b>'}
+        tree = muspyche.parser.parse(template)
+        expected = muspyche.renderer.render(tree, ContextStack(context), [self.directory])
+        rendered = muspyche.flat.templates.get(template).render(ContextStack(context), [self.directory])
+        self.assertEqual(expected, rendered)
+        self.assertEqual(expected.replace('\n', '\r\n'), muspyche.flat.flatten(tree).render(ContextStack(context), [self.directory], newline='\r\n'))
+
+    def testPickling(self):
+        flat = muspyche.flat.flatten(muspyche.parser.parse('{{#a}}{{b}}{{/a}}'))
+        restored = pickle.loads(pickle.dumps(flat))
+        self.assertEqual(list(flat.kinds), list(restored.kinds))
+        self.assertEqual('1', restored.render(ContextStack({'a': {'b': 1}})))
+
+    def testUnsupportedNodes(self):
+        flat = muspyche.flat.flatten([Hook('h')])
+        self.assertRaises(TypeError, flat.render, ContextStack({}))
+
+    def testModelsHaveNoDictionary(self):
+        for el in muspyche.parser.rawparse('a\n{{x}}{{#s}}{{^i}}{{/s}}{{>p}}{{!c}}{{@h}}{{<j:k}}'):
+            self.assertFalse(hasattr(el, '__dict__'), type(el).__name__)
+            self.assertIsNotNone(el._pos)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+"""Tests for incremental parser.
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import muspyche
+from muspyche.models import *
+
+
+def describe(tree):
+    """Returns description of a tree including positions of nodes.
+    """
+    described = []
+    for el in tree:
+        if type(el) in (TextNode, Newline): described.append((type(el).__name__, el._pos, el._text))
+        elif type(el) is Variable: described.append(('Variable', el._pos, el._key, el._escaped))
+        elif type(el) is Partial: described.append(('Partial', el._pos, el.getpath()))
+        elif type(el) in (Section, Inverted, Injection): described.append((type(el).__name__, el._pos, el.getname(), el.assembled, describe(el._template)))
+        else: described.append((type(el).__name__, el._pos, el.getname()))
+    return described
+
+
+PIECES = ['foo', ' ', '\n', '\n', '\r\n', '\r', '\t', '{', '}}', '{{', 'x', '#', '!',
+          '{{x}}', '{{{x}}}', '{{&x}}', '{{ x }}', '{{.}}', '{{a.b}}', '{{>p}}', '{{! c }}', '{{! multi\nline }}', '\n}}',
+          '{{#a}}', '{{/a}}', '{{^a}}', '{{#b}}', '{{/b}}', '{{^b}}', '{{#a}}\n', '{{/a}}\n', '  {{#b}}\n', '  {{/b}}\n',
+          '{{<layout:h}}', '{{/layout:h}}']
+
+
+class IncrementalParsingTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'layout.mustache'), 'w') as ofstream: ofstream.write('<{{@h}}>\n{{#a}}{{@h}}{{/a}}\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def parse(self, template, strict=False):
+        try:
+            return describe(muspyche.parser.parse(template, [self.directory], True, strict))
+        except Exception as e:
+            return type(e)
+
+    def reparse(self, parsed, offset, removed, inserted):
+        try:
+            parsed = muspyche.incremental.reparse(parsed, offset, removed, inserted)
+        except Exception as e:
+            return (type(e), parsed)
+        return (describe(parsed.tree), parsed)
+
+    def testParsing(self):
+        template = 'a\r\n{{#s}}\n  {{x}}\n{{/s}}\n{{<layout:h}}{{y}}{{/layout:h}}\n'
+        parsed = muspyche.incremental.parse(template, [self.directory])
+        self.assertEqual(self.parse(template), describe(parsed.tree))
+
+    def testUnchangedSectionsAreReused(self):
+        template = '{{#a}}\n{{x}}\n{{/a}}\n{{#b}}\n{{y}}\n{{/b}}\n{{#c}}\n{{z}}\n{{/c}}\n'
+        previous = muspyche.incremental.parse(template)
+        a, b, c = previous.tree
+        parsed = muspyche.incremental.reparse(previous, template.index('{{y}}'), 0, 'foo\n')
+        self.assertEqual(self.parse(template.replace('{{y}}', 'foo\n{{y}}')), describe(parsed.tree))
+        self.assertIs(a, parsed.tree[0])
+        self.assertIsNot(b, parsed.tree[1])
+        self.assertIs(c, parsed.tree[2])
+        self.assertEqual((8, 1), c._pos)
+
+    def testRandomEdits(self):
+        rnd = random.Random(0)
+        for strict in (False, True):
+            for _ in range(60):
+                template = ''.join(rnd.choice(PIECES) for _ in range(rnd.randint(0, 30)))
+                try:
+                    parsed = muspyche.incremental.parse(template, [self.directory], True, strict)
+                except Exception:
+                    continue
+                for _ in range(20):
+                    offset = rnd.randint(0, len(template))
+                    removed = rnd.randint(0, min(len(template)-offset, rnd.choice([0, 1, 3, 10])))
+                    inserted = ''.join(rnd.choice(PIECES) for _ in range(rnd.choice([0, 1, 1, 2])))
+                    edited = template[:offset] + inserted + template[offset+removed:]
+                    before = describe(parsed.tree)
+                    expected = self.parse(edited, strict)
+                    reparsed, result = self.reparse(parsed, offset, removed, inserted)
+                    self.assertEqual(expected, reparsed, repr((template, offset, removed, inserted)))
+                    if type(expected) is list:
+                        template, parsed = edited, result
+                    else:
+                        # failed reparse leaves previous result intact
+                        self.assertEqual(before, describe(parsed.tree))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+
+"""Tests for process-pool rendering.
+"""
+
+import unittest
+
+import muspyche
+
+
+TEMPLATE = '{{#user}}{{name}} ({{id}}){{/user}}'
+CONTEXTS = [{'user': {'name': 'user #{0}'.format(i), 'id': i}} for i in range(50)]
+
+
+class ParallelRenderingTests(unittest.TestCase):
+    def testRenderingInOrder(self):
+        expected = muspyche.api.render_many(TEMPLATE, CONTEXTS)
+        self.assertEqual(expected, muspyche.parallel.render_many(TEMPLATE, CONTEXTS, workers=2, chunksize=7))
+
+    def testStreamingPairs(self):
+        pairs = list(muspyche.parallel.render_many(TEMPLATE, iter(CONTEXTS), workers=2, chunksize=5, stream=True))
+        self.assertEqual(list(enumerate(muspyche.api.render_many(TEMPLATE, CONTEXTS))), sorted(pairs))
+
+    def testErrorsCarryIndexOfContext(self):
+        contexts = CONTEXTS[:10] + [{'user': 42}] + CONTEXTS[10:]
+        with self.assertRaises(muspyche.parallel.RenderError) as caught:
+            muspyche.parallel.render_many(TEMPLATE, contexts, workers=2, chunksize=3)
+        self.assertEqual(10, caught.exception.index)
+        self.assertIn('TypeError', caught.exception.error)
+
+    def testEmptyBatch(self):
+        self.assertEqual([], muspyche.parallel.render_many(TEMPLATE, [], workers=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
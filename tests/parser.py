@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+"""Tests for Muspyche parser.
+"""
+
+import unittest
+
+import muspyche
+from muspyche.models import *
+
+
+def describe(tree):
+    """Returns simplified description of a list of nodes.
+    """
+    described = []
+    for el in tree:
+        if type(el) in (TextNode, Newline): described.append((type(el).__name__, el._text))
+        elif type(el) is Variable: described.append(('Variable', el._key, el._escaped))
+        elif type(el) is Partial: described.append(('Partial', el.getpath()))
+        elif type(el) is Hook: described.append(('Hook', el.getname()))
+        elif type(el) is Comment: described.append(('Comment',))
+        else: described.append((type(el).__name__, el.getname(), describe(getattr(el, '_template', []))))
+    return described
+
+
+class RawParsingTests(unittest.TestCase):
+    def testTextAndNewlines(self):
+        self.assertEqual([('TextNode', 'foo'), ('Newline', '\n'), ('Newline', '\n'), ('TextNode', 'bar')],
+                         describe(muspyche.parser.rawparse('foo\r\n\nbar')))
+
+    def testTags(self):
+        expected = [('Variable', 'a', True),
+                    ('Variable', 'b', False),
+                    ('Variable', 'c', False),
+                    ('Section', 'd', []),
+                    ('Inverted', 'e', []),
+                    ('Close', 'f', []),
+                    ('Partial', 'g'),
+                    ('Injection', 'h:i', []),
+                    ('Hook', 'j'),
+                    ]
+        self.assertEqual(expected, describe(muspyche.parser.rawparse('{{ a }}{{{b}}}{{& c}}{{#d}}{{^e}}{{/f}}{{>g}}{{<h:i}}{{@j}}')))
+
+    def testComments(self):
+        self.assertEqual([('TextNode', 'a'), ('Comment',), ('Comment',), ('TextNode', 'b')], describe(muspyche.parser.rawparse('a{{! one }}{{!\ntwo\n}}b')))
+
+    def testUnclosedTripleMustacheIsVariable(self):
+        self.assertEqual([('Variable', '{foo', True)], describe(muspyche.parser.rawparse('{{{foo}}')))
+
+    def testBracesInText(self):
+        self.assertEqual([('TextNode', '{ '), ('Variable', 'a', True), ('TextNode', ' }}')], describe(muspyche.parser.rawparse('{ {{a}} }}')))
+
+    def testPositions(self):
+        tree = muspyche.parser.rawparse('ab{{x}}\n  {{#s}}\ntail')
+        self.assertEqual([(1, 1), (1, 3), (1, 8), (2, 1), (2, 3), (2, 9), (3, 1)], [el._pos for el in tree])
+
+    def testUnclosedTagRaises(self):
+        self.assertRaises(Exception, muspyche.parser.rawparse, 'foo {{bar\n}}')
+
+    def testGettingTags(self):
+        self.assertEqual(('#', 'foo', '#foo}}'), muspyche.parser.gettag('#foo}} bar'))
+
+
+class AssemblingTests(unittest.TestCase):
+    def assemble(self, template, strict=False):
+        return describe(muspyche.parser.assemble(muspyche.parser.rawparse(template), strict))
+
+    def testNestedSections(self):
+        expected = [('Section', 'a', [('Inverted', 'b', [('Variable', 'c', True)]), ('TextNode', 'x')])]
+        self.assertEqual(expected, self.assemble('{{#a}}{{^b}}{{c}}{{/b}}x{{/a}}'))
+
+    def testUnclosedSectionIsLeftAsNode(self):
+        expected = [('Section', 'a', [('Section', 'b', []), ('TextNode', 'x')])]
+        self.assertEqual(expected, self.assemble('{{#a}}{{#b}}x{{/a}}'))
+
+    def testMismatchedClosingTagIsLeftAsNode(self):
+        expected = [('Section', 'a', [('Close', 'b', [])])]
+        self.assertEqual(expected, self.assemble('{{#a}}{{/b}}{{/a}}'))
+
+    def testClosingTagClosesOnlyInnermostSection(self):
+        expected = [('Section', 'a', [('Section', 'b', [('Close', 'a', [])])])]
+        self.assertEqual(expected, self.assemble('{{#a}}{{#b}}{{/a}}{{/b}}{{/a}}'))
+
+    def testInjectionsAreAssembledOnlyAtTopLevel(self):
+        expected = [('Injection', 'i:h', [('Section', 'a', [('Injection', 'j:h', [])])])]
+        self.assertEqual(expected, self.assemble('{{<i:h}}{{#a}}{{<j:h}}{{/a}}{{/i:h}}'))
+
+    def testDeepNesting(self):
+        depth = 5000
+        tree = muspyche.parser.assemble(muspyche.parser.rawparse('{{#a}}' * depth + '{{/a}}' * depth))
+        for i in range(depth):
+            self.assertEqual(1, len(tree))
+            tree = tree[0]._template
+        self.assertEqual([], tree)
+
+    def testStrictModeReportsPositions(self):
+        with self.assertRaises(muspyche.parser.ParseError) as context:
+            self.assemble('foo\n  {{#a}}\n{{/b}}', strict=True)
+        self.assertIn('"a" at line 2, column 3', str(context.exception))
+        self.assertIn('"b" at line 3, column 1', str(context.exception))
+
+    def testStrictModeAcceptsWellFormedTemplates(self):
+        self.assertEqual([('Section', 'a', [])], self.assemble('{{#a}}{{/a}}', strict=True))
+
+
+class StandaloneLinesTests(unittest.TestCase):
+    def render(self, template, context={'boolean': True}, newline=None):
+        tree = muspyche.parser.parse(template)
+        return muspyche.renderer.render(tree, muspyche.context.ContextStack(context), [], newline=newline)
+
+    def testStandaloneLines(self):
+        self.assertEqual('| This Is\n|\n| A Line\n', self.render('| This Is\n{{#boolean}}\n|\n{{/boolean}}\n| A Line\n'))
+
+    def testIndentedStandaloneLines(self):
+        self.assertEqual('| This Is\n|\n| A Line\n', self.render('| This Is\n  {{#boolean}}\n|\n  {{/boolean}}\n| A Line\n'))
+
+    def testStandaloneLineEndings(self):
+        self.assertEqual('|\r\n|', self.render('|\r\n{{#boolean}}\r\n{{/boolean}}\r\n|', newline='\r\n'))
+
+    def testStandaloneWithoutPreviousLine(self):
+        self.assertEqual('#\n/', self.render('  {{#boolean}}\n#{{/boolean}}\n/'))
+
+    def testStandaloneWithoutNewline(self):
+        self.assertEqual('#\n/\n', self.render('#{{#boolean}}\n/\n  {{/boolean}}'))
+
+    def testInlineTagsAreNotStandalone(self):
+        self.assertEqual(' | \t|\t | \n', self.render(' | {{#boolean}}\t|\t{{/boolean}} | \n'))
+        self.assertEqual(' YES\n GOOD\n', self.render(' {{#boolean}}YES{{/boolean}}\n {{#boolean}}GOOD{{/boolean}}\n'))
+
+    def testStandaloneComments(self):
+        self.assertEqual('Begin.\nEnd.\n', self.render('Begin.\n{{! Comment Block! }}\nEnd.\n'))
+        self.assertEqual('Begin.\nEnd.\n', self.render('Begin.\n  {{!\nSomething is going on here...\n}}\nEnd.\n'))
+
+    def testVariablesAreNeverStandalone(self):
+        self.assertEqual('  \n', self.render('  {{missing}}\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
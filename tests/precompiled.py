@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+"""Tests for precompiled templates.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+
+import muspyche
+import muspyche.__main__
+from muspyche.context import ContextStack
+
+
+class PrecompiledTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.artifact = os.path.join(self.directory, 'templates.muspyche')
+        self.write('page.mustache', '{{#items}}<{{name}}>{{/items}}', mtime=1000)
+        self.write(os.path.join('sub', 'row.mustache'), '{{x}}\n', mtime=1000)
+        self.write('injecting.mustache', '{{<page:h}}{{/page:h}}', mtime=1000)
+
+    def tearDown(self):
+        muspyche.precompiled.uninstall()
+        muspyche.cache.partials.invalidate()
+        muspyche.compiler.partials.invalidate()
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text, mtime=None):
+        path = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as ofstream: ofstream.write(text)
+        if mtime is not None: os.utime(path, (mtime, mtime))
+        return path
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def testWritingAndReading(self):
+        written, skipped = muspyche.precompiled.write([self.directory], self.artifact)
+        self.assertEqual(2, written)
+        self.assertEqual([self.path('injecting.mustache')], skipped)
+        artifact = muspyche.precompiled.read(self.artifact)
+        template = artifact.template(self.path('page.mustache'))
+        self.assertEqual('<a><b>', template.render(ContextStack({'items': [{'name': 'a'}, {'name': 'b'}]})))
+        self.assertIs(template, artifact.template(self.path('page.mustache')))
+
+    def testStaleTemplatesAreParsedFromSource(self):
+        muspyche.precompiled.write([self.directory], self.artifact)
+        self.write('page.mustache', '{{#items}}[{{name}}]{{/items}}', mtime=2000)
+        artifact = muspyche.precompiled.read(self.artifact)
+        self.assertIsNone(artifact.template(self.path('page.mustache')))
+        self.assertIsNone(artifact.tree(self.path('page.mustache')))
+        self.assertEqual('[a]', artifact.load(self.path('page.mustache')).render(ContextStack({'items': [{'name': 'a'}]})))
+
+    def testDamagedFile(self):
+        muspyche.precompiled.write([self.directory], self.artifact)
+        with open(self.artifact, 'rb') as ifstream: data = ifstream.read()
+        with open(self.artifact, 'wb') as ofstream: ofstream.write(data[:-1] + bytes([data[-1] ^ 1]))
+        self.assertRaises(muspyche.precompiled.FormatError, muspyche.precompiled.read, self.artifact)
+
+    def testUnsupportedVersion(self):
+        muspyche.precompiled.write([self.directory], self.artifact)
+        with unittest.mock.patch.object(muspyche.precompiled, 'VERSION', muspyche.precompiled.VERSION + 1):
+            self.assertRaises(muspyche.precompiled.FormatError, muspyche.precompiled.read, self.artifact)
+            with self.assertWarns(UserWarning):
+                self.assertIsNone(muspyche.precompiled.install(self.artifact))
+
+    def testPartialsUseInstalledTemplates(self):
+        muspyche.precompiled.write([self.directory], self.artifact)
+        artifact = muspyche.precompiled.install(self.artifact)
+        for compiled in (False, True):
+            output = muspyche.api.make('{{> sub/row}}', {'x': 'X'}, lookup=[self.directory], compiled=compiled)
+            self.assertEqual('X\n', output)
+        path = self.path(os.path.join('sub', 'row.mustache'))
+        self.assertIs(artifact.tree(path), muspyche.cache.partials.get('sub/row', [self.directory]))
+        self.assertIs(artifact.template(path), muspyche.compiler.partials.get('sub/row', [self.directory]))
+
+    def testCommandLine(self):
+        with unittest.mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            self.assertEqual(0, muspyche.__main__.main(['compile', '-o', self.artifact, self.directory]))
+        self.assertIn('2 template(s)', stdout.getvalue())
+        self.assertEqual(2, len(muspyche.precompiled.read(self.artifact)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""Tests for profiling renderer.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import muspyche
+
+
+class ProfilerTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'row.mustache'), 'w') as ofstream: ofstream.write('<{{x}}>\n')
+        self.template = 'head\n{{#items}}\n{{> row}}\n{{/items}}\n'
+        self.context = {'items': [{'x': 1}, {'x': 2}, {'x': 3}]}
+
+    def tearDown(self):
+        muspyche.cache.partials.invalidate()
+        shutil.rmtree(self.directory)
+
+    def testOutputIsTheSame(self):
+        profiler = muspyche.profiler.Profiler()
+        expected = muspyche.api.make(self.template, self.context, lookup=[self.directory])
+        self.assertEqual(expected, profiler.make(self.template, self.context, lookup=[self.directory]))
+
+    def testLineStatistics(self):
+        profiler = muspyche.profiler.Profiler()
+        profiler.make(self.template, self.context, lookup=[self.directory])
+        lines = {(entry['file'], entry['line']): entry for entry in profiler.stats()['lines']}
+        self.assertEqual(1, lines[('<template>', 2)]['calls'])
+        # partial tag and newline after it, for each of three items
+        self.assertEqual(6, lines[('<template>', 3)]['calls'])
+        row = os.path.join(self.directory, 'row.mustache')
+        self.assertEqual(len('<1>\n<2>\n<3>\n'), sum(entry['bytes'] for key, entry in lines.items() if key[0] == row))
+
+    def testPartialStatistics(self):
+        profiler = muspyche.profiler.Profiler()
+        profiler.make(self.template, self.context, lookup=[self.directory])
+        partials = profiler.stats()['partials']
+        self.assertEqual([os.path.join(self.directory, 'row.mustache')], [entry['file'] for entry in partials])
+        self.assertEqual(3, partials[0]['calls'])
+        self.assertEqual(len('<1>\n<2>\n<3>\n'), partials[0]['bytes'])
+        self.assertLessEqual(partials[0]['self'], partials[0]['cumulative'])
+
+    def testCollapsedStacks(self):
+        ticks = iter(range(0, 10**9, 1000))
+        profiler = muspyche.profiler.Profiler(timer=lambda: next(ticks) / 1e6)
+        profiler.make(self.template, self.context, lookup=[self.directory])
+        lines = profiler.collapsed().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            frames, microseconds = line.rsplit(' ', 1)
+            self.assertTrue(frames.startswith('<template>:'))
+            self.assertGreater(int(microseconds), 0)
+        self.assertTrue(any(';{0}:1 {{{{x}}}}'.format(os.path.join(self.directory, 'row.mustache')) in line for line in lines))
+
+
+if __name__ == '__main__':
+    unittest.main()
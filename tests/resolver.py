@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+"""Tests for resolver of partials and injections.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import muspyche
+
+
+class ResolverTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.other = tempfile.mkdtemp()
+        self.write(self.directory, 'plain')
+        self.write(self.directory, 'suffixed.mustache')
+        self.write(self.directory, os.path.join('nested', 'template.mustache'))
+        self.write(self.directory, os.path.join('sub', 'dir.mustache'))
+        self.write(self.other, 'plain')
+        self.write(self.other, 'other')
+        self.resolver = muspyche.resolver.Resolver([self.directory, self.other])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        shutil.rmtree(self.other)
+
+    def write(self, directory, name):
+        path = os.path.join(directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as ofstream: ofstream.write(name)
+
+    def testResolvingRules(self):
+        self.assertEqual(os.path.join(self.directory, 'plain'), self.resolver.find('plain'))
+        self.assertEqual(os.path.join(self.directory, 'suffixed.mustache'), self.resolver.find('suffixed'))
+        self.assertEqual(os.path.join(self.directory, 'nested', 'template.mustache'), self.resolver.find('nested'))
+        self.assertEqual(os.path.join(self.directory, 'sub', 'dir.mustache'), self.resolver.find('sub/dir'))
+
+    def testLookupOrder(self):
+        self.assertEqual(os.path.join(self.directory, 'plain'), self.resolver.find('plain'))
+        self.assertEqual(os.path.join(self.other, 'other'), self.resolver.find('other'))
+
+    def testMissing(self):
+        self.assertEqual((False, 'nope'), self.resolver.resolve('nope', missing=True))
+        self.assertRaises(OSError, self.resolver.resolve, 'nope')
+
+    def testRefreshing(self):
+        self.assertEqual(os.path.join(self.other, 'other'), self.resolver.find('other'))
+        self.write(self.directory, 'other.mustache')
+        self.assertEqual(os.path.join(self.other, 'other'), self.resolver.find('other'))
+        self.resolver.refresh()
+        self.assertEqual(os.path.join(self.directory, 'other.mustache'), self.resolver.find('other'))
+
+    def testFindingCreatedFiles(self):
+        self.assertIsNone(self.resolver.find('new'))
+        self.write(self.other, 'new.mustache')
+        self.assertEqual(os.path.join(self.other, 'new.mustache'), self.resolver.find('new'))
+        self.assertRaises(OSError, muspyche.api.make, '{{> created}}', {}, lookup=[self.other])
+        self.write(self.other, 'created.mustache')
+        self.assertEqual('created.mustache', muspyche.api.make('{{> created}}', {}, lookup=[self.other]))
+        self.write(self.other, 'lay.mustache')
+        self.assertEqual('lay.mustache', muspyche.api.make('{{<lay:h}}x{{/lay:h}}', {}, lookup=[self.other]))
+
+    def testProbingDoesNotChangeIndex(self):
+        self.assertIsNone(self.resolver.find('new'))
+        self.write(self.other, 'new.mustache')
+        self.assertEqual(os.path.join(self.other, 'new.mustache'), self.resolver.probe('new'))
+        self.assertEqual({'new': None}, self.resolver._paths)
+
+    def testSharedResolversAreBounded(self):
+        first = muspyche.resolver.get([self.directory])
+        for i in range(muspyche.resolver.MAXSIZE):
+            muspyche.resolver.get([self.directory, str(i)])
+        self.assertEqual(muspyche.resolver.MAXSIZE, len(muspyche.resolver._resolvers))
+        self.assertIsNot(first, muspyche.resolver.get([self.directory]))
+
+    def testLookupListIsNotModified(self):
+        lookup = [self.directory]
+        muspyche.parser._findpath('plain', lookup, False)
+        muspyche.parser.expandpartials(muspyche.parser.rawparse('{{> nope}}'), lookup, missing=True)
+        self.assertEqual([self.directory], lookup)
+
+    def testSharedResolvers(self):
+        self.assertIs(muspyche.resolver.get([self.directory]), muspyche.resolver.get((self.directory,)))
+        self.assertIs(self.resolver, muspyche.resolver.get(self.resolver))
+
+    def testMakeWithResolver(self):
+        self.assertEqual('plain', muspyche.api.make('{{> plain}}', {}, lookup=self.resolver))
+
+
+if __name__ == '__main__':
+    unittest.main()
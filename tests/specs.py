@@ -30,6 +30,9 @@ SHOW_FAILS = '--show-fails' in sys.argv
 REPR = '--repr' in sys.argv
 PRINT_PARSED = '--print-parsed' in sys.argv or '-P' in sys.argv
 
+# Rendering flags
+COMPILED = '--compiled' in sys.argv
+
 # Test coverage flags
 NO_SKIP = '--no-skip' in sys.argv
 NO_DROP = '--no-drop' in sys.argv
@@ -95,6 +98,10 @@ for path, case in required:
     for test in case['tests']:
         partials = (test['partials'] if 'partials' in test else {})
         for key, value in partials.items(): dump(os.path.join(tmp, key), value)
+        # partials of previous tests were rewritten, do not let cached ones be used
+        muspyche.cache.partials.invalidate()
+        muspyche.compiler.partials.invalidate()
+        muspyche.resolver.refresh()
         title = '{0}: {1}: "{2}"'.format(path, test['name'], test['desc'])
         if not QUIET: print('testing: {0}'.format(title), end='')
         n = len(title) + len('testing: ')
@@ -111,7 +118,11 @@ for path, case in required:
             continue
         parsed = muspyche.parser.parse(template=test['template'])
         context = muspyche.context.ContextStack(context=test['data'], global_lookup=(test['name'] == 'Deeply Nested Contexts'))
-        got = muspyche.renderer.render(parsed, context, lookup=[tmp], missing=True, newline=('\r\n' if r'\r\n' in test['desc'] else '\n'))
+        newline = ('\r\n' if r'\r\n' in test['desc'] else '\n')
+        if COMPILED:
+            got = muspyche.compiler.Template(parsed).render(context, lookup=[tmp], missing=True, newline=newline)
+        else:
+            got = muspyche.renderer.render(parsed, context, lookup=[tmp], missing=True, newline=newline)
         ok = got == test['expected']
         information = (dewhitespace(got) == dewhitespace(test['expected']))
         if not QUIET or not ok: print('{0}: {1}'.format(('OK' if ok else ('FAIL' if not information else 'FORMATTING_FAIL')), title))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+"""Tests for streaming rendering.
+"""
+
+import io
+import unittest
+
+import muspyche
+
+
+TEMPLATE = '{{#rows}}<li>{{name}}</li>\n{{/rows}}'
+CONTEXT = {'rows': [{'name': 'row #{0}'.format(i)} for i in range(100)]}
+
+
+class ChunkCounter(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, s):
+        self.writes += 1
+        return super().write(s)
+
+
+class StreamingTests(unittest.TestCase):
+    def testStreamMatchesMake(self):
+        self.assertEqual(muspyche.api.make(TEMPLATE, CONTEXT), ''.join(muspyche.api.stream(TEMPLATE, CONTEXT)))
+
+    def testStreamIsLazy(self):
+        chunks = muspyche.api.stream('{{x}}{{#y}}{{/y}}', {'x': 'first', 'y': 42})
+        self.assertEqual('first', next(chunks))
+        self.assertRaises(TypeError, next, chunks)
+
+    def testRenderingToTextStream(self):
+        stream = io.StringIO()
+        written = muspyche.api.render_to(stream, TEMPLATE, CONTEXT)
+        self.assertEqual(muspyche.api.make(TEMPLATE, CONTEXT), stream.getvalue())
+        self.assertEqual(len(stream.getvalue()), written)
+
+    def testRenderingToBinaryStream(self):
+        stream = io.BytesIO()
+        muspyche.api.render_to(stream, '{{x}}', {'x': 'zażółć'})
+        self.assertEqual('zażółć'.encode('utf-8'), stream.getvalue())
+
+    def testBufferSize(self):
+        stream = ChunkCounter()
+        muspyche.api.render_to(stream, TEMPLATE, CONTEXT, buffersize=100)
+        self.assertGreater(stream.writes, 10)
+        self.assertEqual(muspyche.api.make(TEMPLATE, CONTEXT), stream.getvalue())
+        stream = ChunkCounter()
+        muspyche.api.render_to(stream, TEMPLATE, CONTEXT)
+        self.assertEqual(1, stream.writes)
+
+    def testCompiledRenderingToStream(self):
+        stream = ChunkCounter()
+        muspyche.api.render_to(stream, TEMPLATE, CONTEXT, compiled=True, buffersize=100)
+        self.assertGreater(stream.writes, 10)
+        self.assertEqual(muspyche.api.make(TEMPLATE, CONTEXT), stream.getvalue())
+
+
+class IterableSectionTests(unittest.TestCase):
+    def rows(self, n, consumed):
+        for i in range(n):
+            consumed.append(i)
+            yield {'name': 'row #{0}'.format(i), 'sub': {'x': 'x'}}
+
+    def testGeneratorsMatchLists(self):
+        template = TEMPLATE + '{{#more}}{{#sub}}{{#..}}({{name}}){{/..}}{{/sub}}{{/more}}{{#t}}{{.}}{{/t}}{{#r}}{{.}}{{/r}}'
+        expected = muspyche.api.make(template, {'rows': list(self.rows(3, [])), 'more': list(self.rows(2, [])), 't': ['a', 'b'], 'r': [0, 1]})
+        for compiled in (False, True):
+            context = {'rows': self.rows(3, []), 'more': self.rows(2, []), 't': ('a', 'b'), 'r': range(2)}
+            self.assertEqual(expected, muspyche.api.make(template, context, compiled=compiled))
+
+    def testItemsAreConsumedOneAtATime(self):
+        consumed = []
+        chunks = muspyche.api.stream(TEMPLATE, {'rows': self.rows(1000, consumed)})
+        self.assertEqual('<li>', next(chunks))
+        self.assertEqual([0], consumed)
+
+    def testEmptyIterables(self):
+        template = '{{#e}}x{{/e}}{{^e}}empty{{/e}}'
+        self.assertEqual('empty', muspyche.api.make(template, {'e': ()}))
+        self.assertEqual('empty', muspyche.api.make(template, {'e': range(0)}))
+        for compiled in (False, True):
+            self.assertEqual('empty', muspyche.api.make(template, {'e': iter([])}, compiled=compiled))
+            self.assertEqual('empty', muspyche.api.make(template, {'e': self.rows(0, [])}, compiled=compiled))
+
+    def testPeekedItemsAreRendered(self):
+        template = '{{^rows}}no rows{{/rows}}{{#rows}}({{name}}){{/rows}}{{^rows}}no rows{{/rows}}'
+        for compiled in (False, True):
+            consumed = []
+            output = muspyche.api.make(template, {'rows': self.rows(2, consumed)}, compiled=compiled)
+            self.assertEqual('(row #0)(row #1)', output)
+            self.assertEqual([0, 1], consumed)
+
+    def testIteratingStacks(self):
+        stack = muspyche.context.ContextStack({'rows': self.rows(3, [])}).adjust('rows')
+        self.assertEqual(['row #0', 'row #1', 'row #2'], [item.get('name') for item in stack])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+"""Tests for watcher of lookup directories.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import muspyche
+
+
+class WatcherTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.templates = muspyche.cache.TemplateCache(muspyche.parser.parse)
+        self.partials = muspyche.cache.PartialCache(lambda template: muspyche.parser.parse(template), revalidate=False)
+        self.write('layout.mustache', '<main>{{@body}}</main>', mtime=1000)
+        self.write('row.mustache', '<tr>{{n}}</tr>', mtime=1000)
+        self.write('other.mustache', 'other', mtime=1000)
+        self.watcher = muspyche.watcher.Watcher([self.directory], templates=[self.templates], partials=[self.partials])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        muspyche.resolver.refresh()
+
+    def write(self, name, text, mtime=2000):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as ofstream: ofstream.write(text)
+        os.utime(path, (mtime, mtime))
+
+    def render(self, template, lookup=None, missing=False):
+        tree = self.templates.get(template, ([self.directory] if lookup is None else lookup), missing)
+        return ''.join(el.render(engine=muspyche.renderer.Engine(el), context=muspyche.context.ContextStack({'n': 1}))
+                       for el in tree if type(el) is not muspyche.models.Partial)
+
+    def testNothingChanged(self):
+        self.templates.get('{{<layout:body}}x{{/layout:body}}', [self.directory])
+        self.partials.get('row', [self.directory])
+        self.assertEqual(set(), self.watcher.poll())
+        self.assertEqual(1, len(self.templates))
+        self.assertEqual(1, len(self.partials))
+
+    def testEditedPartialIsInvalidated(self):
+        first = self.partials.get('row', [self.directory])
+        self.partials.get('other', [self.directory])
+        self.write('row.mustache', '<tr class="row">{{n}}</tr>')
+        self.assertEqual({os.path.join(self.directory, 'row.mustache')}, self.watcher.poll())
+        self.assertEqual(1, len(self.partials))
+        self.assertIsNot(first, self.partials.get('row', [self.directory]))
+
+    def testTemplatesUsingEditedInjectionAreInvalidated(self):
+        template = '{{<layout:body}}x{{/layout:body}}'
+        self.assertEqual('<main>x</main>', self.render(template))
+        self.templates.get('{{> row}}', [self.directory])
+        self.write('layout.mustache', '<body>{{@body}}</body>')
+        self.watcher.poll()
+        self.assertEqual(['{{> row}}'], [key[0] for key in self.templates.keys()])
+        self.assertEqual('<body>x</body>', self.render(template))
+
+    def testNestedInjections(self):
+        self.write('page.mustache', '{{<layout:body}}[{{@content}}]{{/layout:body}}', mtime=1000)
+        self.watcher.poll()
+        template = '{{<page:content}}x{{/page:content}}'
+        self.assertEqual('<main>[x]</main>', self.render(template))
+        self.write('layout.mustache', '<body>{{@body}}</body>')
+        self.watcher.poll()
+        self.assertEqual('<body>[x]</body>', self.render(template))
+
+    def testCreatedInjectionIsFound(self):
+        template = '{{<missing:body}}x{{/missing:body}}'
+        self.templates.get(template, [self.directory], missing=True)
+        self.templates.get('{{> row}}', [self.directory])
+        self.write('missing.mustache', '<p>{{@body}}</p>')
+        self.watcher.poll()
+        self.assertEqual(['{{> row}}'], [key[0] for key in self.templates.keys()])
+        self.assertEqual('<p>x</p>', self.render(template, missing=True))
+
+    def testShadowingInjectionIsFound(self):
+        shadowing = os.path.join(self.directory, 'shadowing')
+        os.mkdir(shadowing)
+        template = '{{<layout:body}}x{{/layout:body}}'
+        self.templates.get(template, [shadowing, self.directory])
+        self.watcher.poll()
+        self.write(os.path.join('shadowing', 'layout.mustache'), '<div>{{@body}}</div>')
+        self.watcher.poll()
+        self.assertEqual(0, len(self.templates))
+        self.assertEqual('<div>x</div>', self.render(template, [shadowing, self.directory]))
+
+    def testRemovedPartialIsNotFound(self):
+        self.partials.get('other', [self.directory])
+        os.remove(os.path.join(self.directory, 'other.mustache'))
+        self.watcher.poll()
+        self.assertEqual(0, len(self.partials))
+        self.assertRaises(OSError, self.partials.get, 'other', [self.directory])
+
+    def testFragmentStoresAreCleared(self):
+        store = muspyche.cache.MemoryStore()
+        self.watcher = muspyche.watcher.Watcher([self.directory], templates=[self.templates], partials=[self.partials], fragments=[store])
+        store.set('nav', '<nav>')
+        self.watcher.poll()
+        self.assertEqual(1, len(store))
+        self.write('row.mustache', '<tr class="row">{{n}}</tr>')
+        self.watcher.poll()
+        self.assertEqual(0, len(store))
+
+    def testPollingThread(self):
+        self.watcher.interval = 0.01
+        self.partials.get('row', [self.directory])
+        self.watcher.start()
+        try:
+            self.write('row.mustache', '<tr class="row">{{n}}</tr>')
+            for _ in range(500):
+                if not len(self.partials): break
+                time.sleep(0.01)
+        finally:
+            self.watcher.stop()
+        self.assertEqual(0, len(self.partials))
+
+
+if __name__ == '__main__':
+    unittest.main()